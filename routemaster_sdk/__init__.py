@@ -1,6 +1,9 @@
 """Python SDK around the routemaster HTTP API."""
 
-from routemaster_sdk.api import Json, RoutemasterAPI
+from routemaster_sdk.api import Json, BulkResult, RoutemasterAPI
+from routemaster_sdk.cache import CacheStats, LabelCache
+from routemaster_sdk.index import LabelIndex
+from routemaster_sdk.retry import RetryBudget, RetryPolicy
 from routemaster_sdk.types import (
     Label,
     State,
@@ -9,12 +12,28 @@ from routemaster_sdk.types import (
     LabelName,
     StateMachine,
 )
+from routemaster_sdk.watch import LabelChange, LabelWatcher
+from routemaster_sdk.buffer import LabelUpdateBuffer
+from routemaster_sdk.outbox import MutationOutbox
+from routemaster_sdk.circuit import CircuitBreaker
+from routemaster_sdk.compact import CompactLabel
+from routemaster_sdk.hedging import HedgingPolicy
+from routemaster_sdk.sessions import PoolStats
+from routemaster_sdk.snapshot import LabelSnapshot
+from routemaster_sdk.ratelimit import RateLimiter
 from routemaster_sdk.exceptions import (
+    CircuitOpen,
     DeletedLabel,
     UnknownLabel,
     LabelAlreadyExists,
     UnknownStateMachine,
 )
+from routemaster_sdk.instrumentation import (
+    CallObserver,
+    StatsdObserver,
+    MetricsCollector,
+    CompositeObserver,
+)
 
 __all__ = (
     'Json',
@@ -23,10 +42,31 @@ __all__ = (
     'LabelRef',
     'Metadata',
     'LabelName',
+    'PoolStats',
+    'BulkResult',
+    'CacheStats',
+    'LabelCache',
+    'LabelIndex',
+    'RetryBudget',
+    'CircuitOpen',
+    'RetryPolicy',
+    'RateLimiter',
+    'LabelChange',
     'DeletedLabel',
     'StateMachine',
     'UnknownLabel',
+    'CompactLabel',
+    'LabelWatcher',
+    'CallObserver',
+    'LabelSnapshot',
+    'HedgingPolicy',
+    'CircuitBreaker',
     'RoutemasterAPI',
+    'MutationOutbox',
+    'StatsdObserver',
+    'MetricsCollector',
+    'CompositeObserver',
+    'LabelUpdateBuffer',
     'LabelAlreadyExists',
     'UnknownStateMachine',
 )
@@ -0,0 +1,107 @@
+"""Command line tools for the routemaster API."""
+
+import sys
+import argparse
+from typing import List
+
+from routemaster_sdk.api import DEFAULT_MAX_IN_FLIGHT
+from routemaster_sdk.backfill import FORMATS, DEFAULT_BATCH_SIZE, backfill
+
+
+def _backfill(args: argparse.Namespace) -> int:
+    results = backfill(
+        api_url=args.api_url,
+        path=args.path,
+        checkpoint_dir=args.checkpoint_dir,
+        format=args.format,
+        workers=args.workers,
+        node=args.node,
+        nodes=args.nodes,
+        max_in_flight=args.max_in_flight,
+        batch_size=args.batch_size,
+        upsert=not args.no_upsert,
+        rate=args.rate,
+    )
+
+    print('{0:>5} {1:>9} {2:>9} {3:>9} {4:>9}'.format(
+        'shard',
+        'created',
+        'updated',
+        'skipped',
+        'failed',
+    ))
+    for result in results:
+        print('{0:>5} {1:>9} {2:>9} {3:>9} {4:>9}'.format(*result))
+
+    return 1 if any(result.failed for result in results) else 0
+
+
+def main(argv: List[str] = sys.argv[1:]) -> int:
+    """Run a command line tool."""
+    parser = argparse.ArgumentParser(
+        prog='routemaster-sdk',
+        description=__doc__.strip(),
+    )
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    backfill_parser = commands.add_parser(
+        'backfill',
+        help="Create labels in bulk from a JSONL or CSV file.",
+    )
+    backfill_parser.set_defaults(func=_backfill)
+    backfill_parser.add_argument('api_url')
+    backfill_parser.add_argument('path')
+    backfill_parser.add_argument(
+        '--checkpoint-dir',
+        required=True,
+        help="Where progress is kept, to resume interrupted runs.",
+    )
+    backfill_parser.add_argument('--format', choices=FORMATS)
+    backfill_parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Processes, each handling one shard of the records.",
+    )
+    backfill_parser.add_argument(
+        '--node',
+        type=int,
+        default=0,
+        help="The index of this host, when running on several.",
+    )
+    backfill_parser.add_argument(
+        '--nodes',
+        type=int,
+        default=1,
+        help="The number of hosts running the backfill.",
+    )
+    backfill_parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help="Concurrent requests per worker.",
+    )
+    backfill_parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Records between checkpoints.",
+    )
+    backfill_parser.add_argument(
+        '--rate',
+        type=float,
+        help="Requests per second allowed to each worker.",
+    )
+    backfill_parser.add_argument(
+        '--no-upsert',
+        action='store_true',
+        help="Skip, rather than update, labels which already exist.",
+    )
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
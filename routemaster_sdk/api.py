@@ -1,10 +1,40 @@
 """Python interface to the routemaster HTTP API."""
 
+import time
+import threading
+import collections
 import urllib.parse
-from typing import Any, Dict, List, NewType
+import concurrent.futures
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    List,
+    Tuple,
+    Union,
+    Mapping,
+    NewType,
+    TypeVar,
+    Callable,
+    Hashable,
+    Iterable,
+    Iterator,
+    Optional,
+    cast,
+)
 
+import urllib3
 import requests
 
+try:
+    import contextvars
+except ImportError:  # pragma: no cover
+    contextvars = None  # type: ignore
+
+from routemaster_sdk.cache import LabelCache, validators_from_headers
+from routemaster_sdk.calls import Call
+from routemaster_sdk.codec import JSONCodec, StdlibCodec
+from routemaster_sdk.retry import RetryPolicy, parse_retry_after
 from routemaster_sdk.types import (
     Label,
     State,
@@ -13,28 +43,173 @@ from routemaster_sdk.types import (
     LabelName,
     StateMachine,
 )
+from routemaster_sdk.routes import Routes
+from routemaster_sdk.circuit import CircuitBreaker
+from routemaster_sdk.compact import CompactLabel
+from routemaster_sdk.hedging import HedgingPolicy
+from routemaster_sdk.sessions import (
+    DEFAULT_POOL_SIZE,
+    DEFAULT_MAX_RETRIES,
+    PoolStats,
+    build_session,
+    connection_pool_stats,
+)
+from routemaster_sdk.ratelimit import RateLimiter
+from routemaster_sdk.streaming import iter_json_array
 from routemaster_sdk.exceptions import (
     DeletedLabel,
     UnknownLabel,
     LabelAlreadyExists,
     UnknownStateMachine,
 )
+from routemaster_sdk.singleflight import SingleFlight
+from routemaster_sdk.instrumentation import (
+    NULL_OBSERVATION,
+    Observation,
+    CallObserver,
+    NullObservation,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from routemaster_sdk.index import LabelIndex
+    from routemaster_sdk.watch import LabelChange
+    from routemaster_sdk.snapshot import ExportResult
 
 Json = NewType('Json', Dict[str, Any])
 
+T = TypeVar('T')
+R = TypeVar('R')
+
+# The result of one entry in a bulk operation: either the value the single
+# call would have returned, or the exception it would have raised.
+BulkResult = Union[R, Exception]
+
+# Validators alongside the state machines they were sent with.
+_CachedStateMachines = Tuple[Dict[str, str], List[StateMachine]]
+
+DEFAULT_MAX_IN_FLIGHT = 10
+
+DEFAULT_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Threads sending the requests of hedged calls, per API wrapper.
+DEFAULT_HEDGING_WORKERS = 32
+
+
+def _run_bulk(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_in_flight: int,
+) -> List[BulkResult]:
+    """
+    Call ``func`` on each item using up to ``max_in_flight`` worker threads.
+
+    Results are returned in the order of the items. Items are consumed lazily,
+    so at most a couple of windows' worth of calls are queued at once. Where
+    supported, each call runs in a copy of the caller's context (e.g. so that
+    it is traced as part of the caller's trace).
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    def call(item: T) -> BulkResult:
+        try:
+            return func(item)
+        except Exception as e:
+            return e
+
+    results = []  # type: List[BulkResult]
+    pending = collections.deque()  # type: collections.deque
+
+    with concurrent.futures.ThreadPoolExecutor(max_in_flight) as executor:
+        for item in items:
+            if len(pending) >= max_in_flight * 2:
+                results.append(pending.popleft().result())
+            if contextvars is not None:
+                future = executor.submit(contextvars.copy_context().run, call, item)
+            else:  # pragma: no cover
+                future = executor.submit(call, item)
+            pending.append(future)
+
+        while pending:
+            results.append(pending.popleft().result())
+
+    return results
+
+
+def _close_response(future: concurrent.futures.Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _first_response(
+    futures: List[concurrent.futures.Future],
+) -> requests.Response:
+    """
+    The first successful response of several requests for the same thing.
+
+    The other responses are closed once they arrive. If every request fails,
+    the error of the last to fail is raised.
+    """
+    pending = set(futures)
+
+    while True:
+        done, pending = concurrent.futures.wait(
+            pending,
+            return_when=concurrent.futures.FIRST_COMPLETED,
+        )
+
+        for future in done:
+            if future.exception() is None or not pending:
+                for other in futures:
+                    if other is not future:
+                        other.add_done_callback(_close_response)
+                return future.result()
 
-class RoutemasterAPI:
-    """Wrapper around an instance of the routemaster HTTP API."""
 
-    def __init__(self, api_url: str, session: requests.Session) -> None:
-        """Create a new api wrapper around a given session and api base url."""
+def _request_not_sent(error: Exception) -> bool:
+    """Whether a connection error means the request never reached the server."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, urllib3.exceptions.NewConnectionError)
+
+
+class BaseRoutemasterAPI:
+    """Behaviour shared between the sync and async API wrappers."""
+
+    def __init__(
+        self,
+        api_url: str,
+        cache: Optional[LabelCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        codec: Optional[JSONCodec] = None,
+        compact_labels: bool = False,
+        observer: Optional[CallObserver] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        single_flight: bool = False,
+        rate_limiter: Optional[RateLimiter] = None,
+        index: Optional['LabelIndex'] = None,
+    ) -> None:
+        """Create a new api wrapper around a given api base url."""
         self._api_url = api_url
-        self._session = session
+        self.routes = Routes(api_url)
+        self.cache = cache
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.codec = codec if codec is not None else StdlibCodec()
+        self.compact_labels = compact_labels
+        self.observer = observer
+        self.hedging = hedging
+        self.single_flight = single_flight
+        self.rate_limiter = rate_limiter
+        self.index = index
 
-        self.delete = session.delete
-        self.get = session.get
-        self.patch = session.patch
-        self.post = session.post
+        # Validators and result of the last ``get_state_machines`` call, if the
+        # response carried any validators and caching is enabled.
+        self._state_machines = None  # type: Optional[_CachedStateMachines]
 
     def build_url(self, endpoint: str) -> str:
         """Build the url to the given endpoint for the wrapped API instance."""
@@ -42,76 +217,724 @@ class RoutemasterAPI:
 
     def build_label_url(self, label: LabelRef) -> str:
         """Build the url for a label in the wrapped API instance."""
-        return self.build_url('state-machines/{0}/labels/{1}'.format(
-            label.state_machine,
-            label.name,
-        ))
+        return self.routes.label(label)
 
     def build_state_machine_url(self, state_machine: StateMachine) -> str:
         """Build the url for a state machine in the wrapped API instance."""
-        return self.build_url(
-            'state-machines/{0}/labels'.format(state_machine),
+        return self.routes.state_machine(state_machine)
+
+    def _json_body(self, value: Any) -> Dict[str, Any]:
+        """Request keyword arguments to send a value as a JSON body."""
+        return {
+            'data': self.codec.dumps(value),
+            'headers': {'Content-Type': self.codec.content_type},
+        }
+
+    def _observe(self, call: Call) -> Union[Observation, NullObservation]:
+        """Context manager reporting a call to the observer, if there is one."""
+        if self.observer is None:
+            return NULL_OBSERVATION
+        return Observation(self.observer, call)
+
+    def _prepare_headers(
+        self,
+        call: Call,
+        headers: Optional[Mapping[str, str]],
+    ) -> Dict[str, str]:
+        """Headers for the requests of a call, with any the observer adds."""
+        prepared = dict(headers or {})
+        if self.observer is not None:
+            self.observer.prepare_headers(call, prepared)
+        return prepared
+
+    def _decode(self, call: Call, content: bytes) -> Any:
+        """Decode a response body for a call."""
+        start = time.perf_counter()
+        try:
+            return self.codec.loads(content)
+        finally:
+            call.decode_time += time.perf_counter() - start
+
+    def _build_label(self, call: Call, label: LabelRef, data: Any) -> Label:
+        """Build a label from its decoded JSON representation."""
+        start = time.perf_counter()
+
+        if self.compact_labels:
+            # Compact labels are used in place of ``Label``, which they mimic.
+            # The response was decoded in full for its state, so the metadata
+            # is encoded again; slicing it from the body in Python is slower
+            # than a round trip through the codec.
+            result = cast(Label, CompactLabel(
+                label,
+                self.codec.dumps(data['metadata']),
+                data['state'],
+                self.codec,
+            ))
+        else:
+            result = Label(
+                ref=label,
+                metadata=data['metadata'],
+                state=State(data['state']),
+            )
+
+        call.build_time += time.perf_counter() - start
+        return result
+
+    def _build_label_refs(
+        self,
+        call: Call,
+        state_machine: StateMachine,
+        labels: Iterable[Dict[str, Any]],
+    ) -> List[LabelRef]:
+        """Build references to labels from their decoded JSON representation."""
+        start = time.perf_counter()
+
+        result = [
+            LabelRef(
+                name=LabelName(data['name']),
+                state_machine=state_machine,
+            )
+            for data in labels
+        ]
+
+        call.build_time += time.perf_counter() - start
+        return result
+
+    def _may_hedge(self, call: Call, kwargs: Dict[str, Any]) -> bool:
+        """Whether the requests of a call may be hedged."""
+        if self.hedging is None or not self.hedging.applies(call.operation):
+            return False
+
+        if kwargs.get('stream'):
+            return False
+
+        self.hedging.on_request()
+        return True
+
+    def _rate_limit(self, call: Call) -> float:
+        """Seconds to wait before sending a request for the given call."""
+        if self.rate_limiter is None:
+            return 0.0
+        return self.rate_limiter.acquire(call.state_machine)
+
+    def _rate_limit_now(self, call: Call) -> bool:
+        """Whether an optional request for the given call may be sent now."""
+        if self.rate_limiter is None:
+            return True
+        return self.rate_limiter.try_acquire(call.state_machine)
+
+    def _before_request(self, call: Call) -> None:
+        """Check that a request may be sent for the given call."""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.before_request(call.state_machine)
+
+    def _abandon_request(self, call: Call) -> None:
+        """Record that a request was abandoned (e.g. cancelled) unfinished."""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.release(call.state_machine)
+
+    def _after_request(
+        self,
+        call: Call,
+        status: Optional[int],
+        elapsed: float,
+    ) -> None:
+        """Record the outcome of a request, with no status if it failed."""
+        call.status = status
+        call.network_time += elapsed
+
+        if self.observer is not None:
+            self.observer.request_finished(call, status, elapsed)
+
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(
+                call.state_machine,
+                success=status is not None and status < 500,
+            )
+
+    def _after_response(
+        self,
+        call: Call,
+        status: int,
+        headers: Mapping[str, str],
+    ) -> None:
+        """Let the rate limiter adapt to a response."""
+        if self.rate_limiter is not None:
+            self.rate_limiter.record(
+                call.state_machine,
+                status,
+                retry_after=parse_retry_after(headers.get('Retry-After')),
+            )
+
+    def _cached_label(self, label: LabelRef) -> Optional[Label]:
+        """Get a label from the cache, if there is one."""
+        if self.cache is None:
+            return None
+        return self.cache.get(label)
+
+    def _label_validators(self, label: LabelRef) -> Dict[str, str]:
+        """Conditional request headers for fetching the given label."""
+        if self.cache is None:
+            return {}
+        return self.cache.validators(label)
+
+    def _revalidated_label(self, label: LabelRef) -> Optional[Label]:
+        """Get the cached label after the API confirmed it is unchanged."""
+        if self.cache is None:
+            return None
+        return self.cache.revalidated(label)
+
+    def _record_label(
+        self,
+        label: Label,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        """Record the current value of a label, as returned by the API."""
+        if self.cache is not None:
+            self.cache.put(
+                label,
+                validators_from_headers(headers) if headers else None,
+            )
+        if self.index is not None:
+            self.index.add(label)
+
+    def _state_machines_validators(self) -> Dict[str, str]:
+        """Conditional request headers for listing the state machines."""
+        if self._state_machines is None:
+            return {}
+        return self._state_machines[0]
+
+    def _record_state_machines(
+        self,
+        state_machines: List[StateMachine],
+        headers: Mapping[str, str],
+    ) -> None:
+        """Record the state machines known to the API, for revalidation."""
+        if self.cache is None:
+            return
+
+        validators = validators_from_headers(headers)
+        self._state_machines = (
+            (validators, list(state_machines)) if validators else None
+        )
+
+    def _record_deletion(self, label: LabelRef) -> None:
+        """Record that a label has been deleted or is not known."""
+        if self.cache is not None:
+            self.cache.invalidate(label)
+        if self.index is not None:
+            self.index.remove(label)
+
+
+class RoutemasterAPI(BaseRoutemasterAPI):
+    """Wrapper around an instance of the routemaster HTTP API."""
+
+    def __init__(
+        self,
+        api_url: str,
+        session: requests.Session,
+        cache: Optional[LabelCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        codec: Optional[JSONCodec] = None,
+        compact_labels: bool = False,
+        observer: Optional[CallObserver] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        single_flight: bool = False,
+        rate_limiter: Optional[RateLimiter] = None,
+        index: Optional['LabelIndex'] = None,
+    ) -> None:
+        """
+        Create a new api wrapper around a given session and api base url.
+
+        If a ``LabelCache`` is given, ``get_label`` is served from it where
+        possible, and it is kept up to date by this wrapper's label mutations.
+
+        If a ``RetryPolicy`` is given, transient failures are retried according
+        to it rather than being raised immediately.
+
+        If a ``CircuitBreaker`` is given, calls concerning a state machine (or
+        the API as a whole) which is failing raise ``CircuitOpen`` rather than
+        waiting on further failing requests.
+
+        A ``JSONCodec`` may be given to encode and decode bodies with a faster
+        library than the standard library's ``json``, see
+        ``routemaster_sdk.codec.fastest_codec``.
+
+        With ``compact_labels``, labels are returned as ``CompactLabel``s,
+        which hold their metadata encoded until it is read and share their
+        state names. They behave like ``Label``s, and suit holding many labels
+        in memory of which mostly the state is read. They save memory, not
+        time: each response is still decoded in full, and its metadata
+        encoded again to be held.
+
+        A ``CallObserver`` may be given to be told of every call made and the
+        time it spent on the network, decoding JSON and building labels, see
+        ``routemaster_sdk.instrumentation``.
+
+        If a ``HedgingPolicy`` is given, reads which are slow to be answered
+        are sent a second time, and the first response is used. The requests
+        of hedged calls are made from a pool of worker threads.
+
+        With ``single_flight``, concurrent ``get_label`` calls for the same
+        label which are not answered from the cache, and concurrent
+        ``get_labels`` calls for the same state machine, share one request
+        and its result or exception.
+
+        If a ``RateLimiter`` is given, requests block until it allows them to
+        be sent, and it adapts to the 429 responses received.
+
+        If a ``LabelIndex`` is given, it is kept up to date with the labels
+        this wrapper reads, creates, updates and deletes.
+        """
+        super().__init__(
+            api_url,
+            cache=cache,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            codec=codec,
+            compact_labels=compact_labels,
+            observer=observer,
+            hedging=hedging,
+            single_flight=single_flight,
+            rate_limiter=rate_limiter,
+            index=index,
+        )
+        self._session = session
+        self._flights = SingleFlight() if single_flight else None
+        self._hedging_executor = None  # type: Optional[concurrent.futures.Executor]
+        self._hedging_lock = threading.Lock()
+
+        self.delete = session.delete
+        self.get = session.get
+        self.patch = session.patch
+        self.post = session.post
+
+    @classmethod
+    def from_url(
+        cls,
+        api_url: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pool_block: bool = False,
+        keepalive: bool = True,
+        max_retries: Optional[int] = None,
+        thread_local: bool = False,
+        http2: bool = False,
+        **kwargs: Any
+    ) -> 'RoutemasterAPI':
+        """
+        Create a new api wrapper with its own tuned session.
+
+        See ``routemaster_sdk.sessions.build_session`` for the meaning of the
+        connection pool options. ``pool_size`` should be at least the number of
+        threads which will use the wrapper concurrently (including the
+        ``max_in_flight`` of bulk operations). With ``thread_local``, each
+        thread gets a session of its own over the shared connection pools, and
+        processes forked from this one open connections of their own. With
+        ``http2``, requests are multiplexed over HTTP/2 where the server
+        supports it. Other keyword arguments are passed to the constructor.
+
+        ``max_retries`` defaults to ``DEFAULT_MAX_RETRIES`` connection-level
+        retries, or to none if a ``retry_policy`` is given: the adapter's
+        retries happen within each of the policy's attempts and are not
+        charged to its budget, so the two would multiply.
+        """
+        if max_retries is None:
+            has_policy = kwargs.get('retry_policy') is not None
+            max_retries = 0 if has_policy else DEFAULT_MAX_RETRIES
+
+        session = build_session(
+            pool_size=pool_size,
+            pool_block=pool_block,
+            keepalive=keepalive,
+            max_retries=max_retries,
+            thread_local=thread_local,
+            http2=http2,
         )
+        return cls(api_url, session, **kwargs)
+
+    def connection_pool_stats(self) -> List[PoolStats]:
+        """Point in time usage of the wrapped session's connection pools."""
+        return connection_pool_stats(self._session)
+
+    def close(self) -> None:
+        """Close the wrapped session and its pooled connections."""
+        if self._hedging_executor is not None:
+            self._hedging_executor.shutdown(wait=False)
+        self._session.close()
+
+    def _send(
+        self,
+        call: Call,
+        method: str,
+        url: str,
+        **kwargs: Any
+    ) -> requests.Response:
+        """
+        Send the request for a call, retrying according to the retry policy.
+
+        Raises ``CircuitOpen`` if the circuit breaker refuses the request.
+        ``method`` names one of the ``get``, ``post``, ``patch`` or ``delete``
+        attributes. The response of the last attempt is returned whatever its
+        status, and errors from the last attempt are raised.
+        """
+        send = getattr(self, method)
+        policy = self.retry_policy
+        body_size = len(kwargs.get('data') or b'')
+
+        if self.observer is not None:
+            kwargs['headers'] = self._prepare_headers(call, kwargs.get('headers'))
+
+        if policy is not None:
+            policy.on_request()
+
+        hedge = self._may_hedge(call, kwargs)
+
+        while True:
+            # Check the circuit first, so an open one fails fast without
+            # taking a token from the rate limiter or waiting for one.
+            self._before_request(call)
+            try:
+                wait = self._rate_limit(call)
+                if wait > 0:
+                    time.sleep(wait)
+            except BaseException:
+                self._abandon_request(call)
+                raise
+
+            call.attempts += 1
+            call.bytes_sent += body_size
+            retry_after = None
+            start = time.perf_counter()
+
+            try:
+                if hedge:
+                    response = self._send_hedged(call, send, url, body_size, kwargs)
+                else:
+                    response = send(url, **kwargs)
+            except Exception as e:
+                self._after_request(call, None, time.perf_counter() - start)
+
+                if not isinstance(e, (requests.ConnectionError, requests.Timeout)):
+                    raise
+
+                if policy is None or not policy.should_retry(
+                    call.operation,
+                    call.attempts,
+                    sent=not _request_not_sent(e),
+                ):
+                    raise
+            except BaseException:
+                # Interrupted, so the request has no outcome to record.
+                self._abandon_request(call)
+                raise
+            else:
+                # Unless streamed, the body has been read by now.
+                if not kwargs.get('stream'):
+                    call.bytes_received += len(response.content)
+
+                self._after_request(
+                    call,
+                    response.status_code,
+                    time.perf_counter() - start,
+                )
+                self._after_response(call, response.status_code, response.headers)
+
+                if policy is None or not policy.should_retry(
+                    call.operation,
+                    call.attempts,
+                    status=response.status_code,
+                ):
+                    return response
+
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After'),
+                )
+                response.close()
+
+            time.sleep(policy.backoff(call.attempts, retry_after=retry_after))
+
+    def _send_hedged(
+        self,
+        call: Call,
+        send: Callable[..., requests.Response],
+        url: str,
+        body_size: int,
+        kwargs: Dict[str, Any],
+    ) -> requests.Response:
+        """Send a request, and again if it is slow, returning either response."""
+        hedging = cast(HedgingPolicy, self.hedging)
+
+        def request() -> requests.Response:
+            start = time.perf_counter()
+            response = send(url, **kwargs)
+            hedging.observe(call.operation, time.perf_counter() - start)
+            return response
+
+        with self._hedging_lock:
+            if self._hedging_executor is None:
+                self._hedging_executor = concurrent.futures.ThreadPoolExecutor(
+                    DEFAULT_HEDGING_WORKERS,
+                )
+            executor = self._hedging_executor
+
+        first = executor.submit(request)
+        done, _ = concurrent.futures.wait(
+            [first],
+            timeout=hedging.delay(call.operation),
+        )
+        if done or not hedging.should_hedge():
+            return first.result()
+        if not self._rate_limit_now(call):
+            return first.result()
+
+        call.hedges += 1
+        call.bytes_sent += body_size
+        return _first_response([first, executor.submit(request)])
+
+    def _iter_content(
+        self,
+        call: Call,
+        response: requests.Response,
+        chunk_size: int,
+    ) -> Iterator[bytes]:
+        """Stream a response body, measuring it for a call."""
+        chunks = response.iter_content(chunk_size)
+
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            call.network_time += time.perf_counter() - start
+
+            if chunk is None:
+                return
+
+            call.bytes_received += len(chunk)
+            yield chunk
 
     def get_status(self) -> Json:
         """Get the status of the wrapped API instance."""
-        response = self.get(self.build_url(''))
-        response.raise_for_status()
-        return response.json()
+        call = Call('get_status')
+
+        with self._observe(call):
+            response = self._send(call, 'get', self.routes.root)
+            response.raise_for_status()
+            return self._decode(call, response.content)
 
     def get_state_machines(self) -> List[StateMachine]:
         """Get the state machines known to the wrapped API instance."""
-        response = self.get(self.build_url('state-machines'))
-        response.raise_for_status()
+        call = Call('get_state_machines')
 
-        return [
-            StateMachine(data['name'])
-            for data in response.json()['state-machines']
-        ]
+        with self._observe(call):
+            response = self._send(
+                call,
+                'get',
+                self.routes.state_machines,
+                headers=self._state_machines_validators(),
+            )
+
+            if response.status_code == 304 and self._state_machines is not None:
+                return list(self._state_machines[1])
+
+            response.raise_for_status()
+
+            state_machines = [
+                StateMachine(data['name'])
+                for data in self._decode(call, response.content)['state-machines']
+            ]
+            self._record_state_machines(state_machines, response.headers)
+            return state_machines
+
+    def _single_flight(self, key: Hashable, func: Callable[[], R]) -> R:
+        """Call ``func``, sharing the call with concurrent ones for the key."""
+        if self._flights is None:
+            return func()
+        return self._flights.do(key, func)
 
     def get_labels(self, state_machine: StateMachine) -> List[LabelRef]:
         """List the labels in the given state machine."""
-        response = self.get(self.build_state_machine_url(state_machine))
+        return self._single_flight(
+            ('get_labels', state_machine),
+            lambda: self._get_labels(state_machine),
+        )
 
-        if response.status_code == 404:
-            raise UnknownStateMachine(state_machine)
+    def _get_labels(self, state_machine: StateMachine) -> List[LabelRef]:
+        call = Call('get_labels', state_machine=state_machine)
 
-        response.raise_for_status()
+        with self._observe(call):
+            response = self._send(
+                call,
+                'get',
+                self.build_state_machine_url(state_machine),
+            )
 
-        return [
-            LabelRef(
-                name=LabelName(data['name']),
-                state_machine=state_machine,
+            if response.status_code == 404:
+                raise UnknownStateMachine(state_machine)
+
+            response.raise_for_status()
+
+            return self._build_label_refs(
+                call,
+                state_machine,
+                self._decode(call, response.content)['labels'],
             )
-            for data in response.json()['labels']
-        ]
 
-    def get_label(self, label: LabelRef) -> Label:
+    def iter_labels(
+        self,
+        state_machine: StateMachine,
+        chunk_size: int = DEFAULT_STREAM_CHUNK_SIZE,
+    ) -> Iterator[LabelRef]:
+        """
+        Iterate over the labels in the given state machine.
+
+        Unlike ``get_labels`` the response is streamed and parsed as it
+        arrives, so memory use does not grow with the number of labels. If the
+        server paginates the listing (via a ``Link: <...>; rel="next"``
+        header), subsequent pages are followed transparently.
+
+        Errors (raised on first iteration):
+        - ``UnknownStateMachine`` if the state machine is not known (HTTP 404).
+        - ``requests.HTTPError`` for other HTTP errors.
+        """
+        url = self.build_state_machine_url(state_machine)  # type: Optional[str]
+
+        while url is not None:
+            call = Call('iter_labels', state_machine=state_machine)
+
+            with self._observe(call):
+                response = self._send(call, 'get', url, stream=True)
+
+                try:
+                    if response.status_code == 404:
+                        raise UnknownStateMachine(state_machine)
+
+                    response.raise_for_status()
+
+                    for data in iter_json_array(
+                        self._iter_content(call, response, chunk_size),
+                        'labels',
+                    ):
+                        yield LabelRef(
+                            name=LabelName(data['name']),
+                            state_machine=state_machine,
+                        )
+                finally:
+                    response.close()
+
+            next_page = response.links.get('next')
+            url = (
+                urllib.parse.urljoin(response.url, next_page['url'])
+                if next_page else None
+            )
+
+    def watch_labels(
+        self,
+        state_machine: StateMachine,
+        labels: Optional[Iterable[LabelName]] = None,
+        interval: float = 1.0,
+        max_interval: float = 30.0,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> Iterator['LabelChange']:
+        """
+        Poll labels forever, yielding a ``LabelChange`` whenever one changes.
+
+        Watches the named labels in the state machine, or all of its labels if
+        none are named. Every label is reported once initially. Polls are made
+        ``interval`` seconds apart while labels are changing, backing off up
+        to ``max_interval`` while they are not. See
+        ``routemaster_sdk.watch.LabelWatcher`` for details.
+        """
+        # Imported here as the watcher is built on this module.
+        from routemaster_sdk.watch import LabelWatcher
+
+        return LabelWatcher(
+            self,
+            state_machine,
+            labels=labels,
+            interval=interval,
+            max_interval=max_interval,
+            max_in_flight=max_in_flight,
+        ).watch()
+
+    def export_state_machine(
+        self,
+        state_machine: StateMachine,
+        path: str,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> 'ExportResult':
+        """
+        Write a snapshot of every label in a state machine to a file.
+
+        The labels are fetched concurrently, ``max_in_flight`` at a time. Open
+        the file with ``routemaster_sdk.snapshot.LabelSnapshot`` to query it.
+        See ``routemaster_sdk.snapshot.export_state_machine`` for details.
+        """
+        # Imported here as snapshots are built on this module.
+        from routemaster_sdk.snapshot import export_state_machine
+
+        return export_state_machine(
+            self,
+            state_machine,
+            path,
+            max_in_flight=max_in_flight,
+        )
+
+    def get_label(self, label: LabelRef, revalidate: bool = False) -> Label:
         """
         Get a label within a given state machine.
 
+        With a cache configured, fresh cached labels are returned directly and
+        expired ones are revalidated with a conditional request if the API
+        provided an ``ETag`` or ``Last-Modified`` header for them. With
+        ``revalidate``, fresh cached labels are revalidated too.
+
         Errors:
         - ``UnknownLabel`` if the label is not known (HTTP 404).
         - ``DeletedLabel`` if the label has been deleted (HTTP 410).
         - ``requests.HTTPError`` for other HTTP errors.
         """
+        cached = None if revalidate else self._cached_label(label)
+        if cached is not None:
+            return cached
 
-        response = self.get(self.build_label_url(label))
+        return self._single_flight(
+            ('get_label', label),
+            lambda: self._get_label(label),
+        )
 
-        if response.status_code == 404:
-            raise UnknownLabel(label)
-        elif response.status_code == 410:
-            raise DeletedLabel(label)
+    def _get_label(self, label: LabelRef) -> Label:
+        call = Call('get_label', label=label)
 
-        response.raise_for_status()
+        with self._observe(call):
+            url = self.build_label_url(label)
+            response = self._send(
+                call,
+                'get',
+                url,
+                headers=self._label_validators(label),
+            )
 
-        data = response.json()
+            if response.status_code == 304:
+                cached = self._revalidated_label(label)
+                if cached is not None:
+                    return cached
+                # Evicted while revalidating; fetch it in full.
+                response = self._send(call, 'get', url)
 
-        return Label(
-            ref=label,
-            metadata=data['metadata'],
-            state=State(data['state']),
-        )
+            if response.status_code == 404:
+                self._record_deletion(label)
+                raise UnknownLabel(label)
+            elif response.status_code == 410:
+                self._record_deletion(label)
+                raise DeletedLabel(label)
+
+            response.raise_for_status()
+
+            data = self._decode(call, response.content)
+
+            result = self._build_label(call, label, data)
+            self._record_label(result, response.headers)
+            return result
 
     def create_label(self, label: LabelRef, metadata: Metadata) -> Label:
         """
@@ -121,26 +944,34 @@ class RoutemasterAPI:
         - ``UnknownStateMachine`` if the state machine is not known (HTTP 404).
         - ``LabelAlreadyExists`` if the label already exists (HTTP 409).
         - ``requests.HTTPError`` for other HTTP errors.
+
+        If a retried request finds that the label already exists, an earlier
+        attempt is assumed to have created it and the label is returned.
         """
-        response = self.post(
-            self.build_label_url(label),
-            json={'metadata': metadata},
-        )
+        call = Call('create_label', label=label)
 
-        if response.status_code == 404:
-            raise UnknownStateMachine(label.state_machine)
-        elif response.status_code == 409:
-            raise LabelAlreadyExists(label)
+        with self._observe(call):
+            response = self._send(
+                call,
+                'post',
+                self.build_label_url(label),
+                **self._json_body({'metadata': metadata})
+            )
 
-        response.raise_for_status()
+            if response.status_code == 404:
+                raise UnknownStateMachine(label.state_machine)
+            elif response.status_code == 409:
+                if call.attempts > 1:
+                    return self.get_label(label)
+                raise LabelAlreadyExists(label)
 
-        data = response.json()
+            response.raise_for_status()
 
-        return Label(
-            ref=label,
-            metadata=data['metadata'],
-            state=State(data['state']),
-        )
+            data = self._decode(call, response.content)
+
+            result = self._build_label(call, label, data)
+            self._record_label(result, response.headers)
+            return result
 
     def update_label(self, label: LabelRef, metadata: Metadata) -> Label:
         """
@@ -154,25 +985,30 @@ class RoutemasterAPI:
         - ``DeletedLabel`` if the label has been deleted (HTTP 410).
         - ``requests.HTTPError`` for other HTTP errors.
         """
-        response = self.patch(
-            self.build_label_url(label),
-            json={'metadata': metadata},
-        )
+        call = Call('update_label', label=label)
 
-        if response.status_code == 404:
-            raise UnknownLabel(label)
-        elif response.status_code == 410:
-            raise DeletedLabel(label)
+        with self._observe(call):
+            response = self._send(
+                call,
+                'patch',
+                self.build_label_url(label),
+                **self._json_body({'metadata': metadata})
+            )
 
-        response.raise_for_status()
+            if response.status_code == 404:
+                self._record_deletion(label)
+                raise UnknownLabel(label)
+            elif response.status_code == 410:
+                self._record_deletion(label)
+                raise DeletedLabel(label)
 
-        data = response.json()
+            response.raise_for_status()
 
-        return Label(
-            ref=label,
-            metadata=data['metadata'],
-            state=State(data['state']),
-        )
+            data = self._decode(call, response.content)
+
+            result = self._build_label(call, label, data)
+            self._record_label(result, response.headers)
+            return result
 
     def delete_label(self, label: LabelRef) -> None:
         """
@@ -185,9 +1021,79 @@ class RoutemasterAPI:
         - ``UnknownStateMachine`` if the state machine is not known (HTTP 404).
         - ``requests.HTTPError`` for other HTTP errors.
         """
-        response = self.delete(self.build_label_url(label))
+        call = Call('delete_label', label=label)
+
+        with self._observe(call):
+            response = self._send(call, 'delete', self.build_label_url(label))
+
+            if response.status_code == 404:
+                raise UnknownStateMachine(label.state_machine)
+
+            response.raise_for_status()
+
+            self._record_deletion(label)
+
+    def get_labels_bulk(
+        self,
+        labels: Iterable[LabelRef],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        revalidate: bool = False,
+    ) -> List[BulkResult[Label]]:
+        """
+        Get many labels concurrently.
+
+        Returns one result per label, in order: either the ``Label`` or the
+        exception which ``get_label`` raised for it.
+        """
+        return _run_bulk(
+            lambda label: self.get_label(label, revalidate=revalidate),
+            labels,
+            max_in_flight,
+        )
+
+    def create_labels(
+        self,
+        labels: Iterable[Tuple[LabelRef, Metadata]],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> List[BulkResult[Label]]:
+        """
+        Create many labels concurrently from ``(label, metadata)`` pairs.
 
-        if response.status_code == 404:
-            raise UnknownStateMachine(label.state_machine)
+        Returns one result per label, in order: either the ``Label`` or the
+        exception which ``create_label`` raised for it.
+        """
+        return _run_bulk(
+            lambda pair: self.create_label(*pair),
+            labels,
+            max_in_flight,
+        )
+
+    def update_labels(
+        self,
+        labels: Iterable[Tuple[LabelRef, Metadata]],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> List[BulkResult[Label]]:
+        """
+        Update many labels concurrently from ``(label, metadata)`` pairs.
 
-        response.raise_for_status()
+        Returns one result per label, in order: either the ``Label`` or the
+        exception which ``update_label`` raised for it.
+        """
+        return _run_bulk(
+            lambda pair: self.update_label(*pair),
+            labels,
+            max_in_flight,
+        )
+
+    def delete_labels(
+        self,
+        labels: Iterable[LabelRef],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> List[Optional[Exception]]:
+        """
+        Delete many labels concurrently.
+
+        Returns one result per label, in order: either ``None`` or the
+        exception which ``delete_label`` raised for it.
+        """
+        return _run_bulk(self.delete_label, labels, max_in_flight)
@@ -0,0 +1,583 @@
+"""Asyncio interface to the routemaster HTTP API."""
+
+import time
+import asyncio
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+    TypeVar,
+    Callable,
+    Hashable,
+    Iterable,
+    Optional,
+    Awaitable,
+    cast,
+)
+
+import aiohttp
+
+from routemaster_sdk.api import (
+    DEFAULT_MAX_IN_FLIGHT,
+    Json,
+    BulkResult,
+    BaseRoutemasterAPI,
+)
+from routemaster_sdk.cache import LabelCache
+from routemaster_sdk.calls import Call
+from routemaster_sdk.codec import JSONCodec
+from routemaster_sdk.index import LabelIndex
+from routemaster_sdk.retry import RetryPolicy, parse_retry_after
+from routemaster_sdk.types import Label, LabelRef, Metadata, StateMachine
+from routemaster_sdk.circuit import CircuitBreaker
+from routemaster_sdk.hedging import HedgingPolicy
+from routemaster_sdk.ratelimit import RateLimiter
+from routemaster_sdk.exceptions import (
+    DeletedLabel,
+    UnknownLabel,
+    LabelAlreadyExists,
+    UnknownStateMachine,
+)
+from routemaster_sdk.singleflight import AsyncSingleFlight
+from routemaster_sdk.instrumentation import CallObserver
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def _release_response(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is None:
+        task.result().release()
+
+
+async def _first_response(
+    tasks: List[asyncio.Future],
+) -> aiohttp.ClientResponse:
+    """
+    The first successful response of several requests for the same thing.
+
+    The other requests are cancelled. If every request fails, the error of
+    the last to fail is raised.
+    """
+    pending = set(tasks)
+    winner = None  # type: Optional[asyncio.Future]
+
+    try:
+        while True:
+            done, pending = await asyncio.wait(
+                pending,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+            for task in done:
+                if task.exception() is None or not pending:
+                    winner = task
+                    return task.result()
+    finally:
+        for task in tasks:
+            if task is not winner:
+                task.cancel()
+                task.add_done_callback(_release_response)
+
+
+async def _gather_bulk(
+    func: Callable[[T], Awaitable[Any]],
+    items: Iterable[T],
+    max_in_flight: int,
+) -> List[BulkResult]:
+    """
+    Await ``func`` on each item with at most ``max_in_flight`` outstanding.
+
+    Results are returned in the order of the items. A fixed set of workers
+    pull from the items, so no more than ``max_in_flight`` tasks exist at once.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    iterator = enumerate(items)
+    results = []  # type: List[Tuple[int, Any]]
+
+    async def worker() -> None:
+        for index, item in iterator:
+            try:
+                results.append((index, await func(item)))
+            except Exception as e:
+                results.append((index, e))
+
+    await asyncio.gather(*(worker() for _ in range(max_in_flight)))
+
+    results.sort(key=lambda pair: pair[0])
+    return [result for _, result in results]
+
+
+class AsyncRoutemasterAPI(BaseRoutemasterAPI):
+    """
+    Asyncio wrapper around an instance of the routemaster HTTP API.
+
+    Mirrors ``RoutemasterAPI``, with each call being a coroutine issued over
+    the connection pool of the given ``aiohttp.ClientSession``. The session is
+    owned by the caller, who is responsible for closing it.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        session: aiohttp.ClientSession,
+        cache: Optional[LabelCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        codec: Optional[JSONCodec] = None,
+        compact_labels: bool = False,
+        observer: Optional[CallObserver] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        single_flight: bool = False,
+        rate_limiter: Optional[RateLimiter] = None,
+        index: Optional[LabelIndex] = None,
+    ) -> None:
+        """Create a new api wrapper around a given session and api base url."""
+        super().__init__(
+            api_url,
+            cache=cache,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            codec=codec,
+            compact_labels=compact_labels,
+            observer=observer,
+            hedging=hedging,
+            single_flight=single_flight,
+            rate_limiter=rate_limiter,
+            index=index,
+        )
+        self._session = session
+        self._flights = AsyncSingleFlight() if single_flight else None
+
+    async def _send(
+        self,
+        call: Call,
+        method: str,
+        url: str,
+        **kwargs: Any
+    ) -> aiohttp.ClientResponse:
+        """
+        Send the request for a call, retrying according to the retry policy.
+
+        Raises ``CircuitOpen`` if the circuit breaker refuses the request.
+        The response of the last attempt is returned whatever its status, and
+        errors from the last attempt are raised. The caller must release the
+        response, e.g. by using it as an async context manager.
+        """
+        policy = self.retry_policy
+        body_size = len(kwargs.get('data') or b'')
+
+        if self.observer is not None:
+            kwargs['headers'] = self._prepare_headers(call, kwargs.get('headers'))
+
+        if policy is not None:
+            policy.on_request()
+
+        hedge = self._may_hedge(call, kwargs)
+
+        while True:
+            # Check the circuit first, so an open one fails fast without
+            # taking a token from the rate limiter or waiting for one.
+            self._before_request(call)
+            try:
+                wait = self._rate_limit(call)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            except BaseException:
+                self._abandon_request(call)
+                raise
+
+            call.attempts += 1
+            call.bytes_sent += body_size
+            retry_after = None
+            start = time.perf_counter()
+
+            try:
+                if hedge:
+                    response = await self._send_hedged(
+                        call,
+                        method,
+                        url,
+                        body_size,
+                        kwargs,
+                    )
+                else:
+                    response = await self._session.request(method, url, **kwargs)
+            except Exception as e:
+                self._after_request(call, None, time.perf_counter() - start)
+
+                if not isinstance(e, _CONNECTION_ERRORS):
+                    raise
+
+                if policy is None or not policy.should_retry(
+                    call.operation,
+                    call.attempts,
+                    sent=not isinstance(e, aiohttp.ClientConnectorError),
+                ):
+                    raise
+            except BaseException:
+                # Cancelled, so the request has no outcome to record.
+                self._abandon_request(call)
+                raise
+            else:
+                self._after_request(
+                    call,
+                    response.status,
+                    time.perf_counter() - start,
+                )
+                self._after_response(call, response.status, response.headers)
+
+                if policy is None or not policy.should_retry(
+                    call.operation,
+                    call.attempts,
+                    status=response.status,
+                ):
+                    return response
+
+                retry_after = parse_retry_after(
+                    response.headers.get('Retry-After'),
+                )
+                response.release()
+
+            await asyncio.sleep(
+                policy.backoff(call.attempts, retry_after=retry_after),
+            )
+
+    async def _send_hedged(
+        self,
+        call: Call,
+        method: str,
+        url: str,
+        body_size: int,
+        kwargs: Dict[str, Any],
+    ) -> aiohttp.ClientResponse:
+        """
+        Send a request, and again if it is slow, returning either response.
+
+        Only the time until the response headers arrive is hedged.
+        """
+        hedging = cast(HedgingPolicy, self.hedging)
+
+        async def request() -> aiohttp.ClientResponse:
+            start = time.perf_counter()
+            response = await self._session.request(method, url, **kwargs)
+            hedging.observe(call.operation, time.perf_counter() - start)
+            return response
+
+        first = asyncio.ensure_future(request())
+        done, _ = await asyncio.wait(
+            [first],
+            timeout=hedging.delay(call.operation),
+        )
+        if done or not hedging.should_hedge():
+            return await first
+        if not self._rate_limit_now(call):
+            return await first
+
+        call.hedges += 1
+        call.bytes_sent += body_size
+        return await _first_response([first, asyncio.ensure_future(request())])
+
+    async def _read(self, call: Call, response: aiohttp.ClientResponse) -> Any:
+        """Read and decode a response body for a call."""
+        start = time.perf_counter()
+        content = await response.read()
+        call.network_time += time.perf_counter() - start
+        call.bytes_received += len(content)
+
+        return self._decode(call, content)
+
+    async def get_status(self) -> Json:
+        """Get the status of the wrapped API instance."""
+        call = Call('get_status')
+
+        with self._observe(call):
+            async with await self._send(
+                call,
+                'GET',
+                self.routes.root,
+            ) as response:
+                response.raise_for_status()
+                return await self._read(call, response)
+
+    async def get_state_machines(self) -> List[StateMachine]:
+        """Get the state machines known to the wrapped API instance."""
+        call = Call('get_state_machines')
+
+        with self._observe(call):
+            async with await self._send(
+                call,
+                'GET',
+                self.routes.state_machines,
+                headers=self._state_machines_validators(),
+            ) as response:
+                if response.status == 304 and self._state_machines is not None:
+                    return list(self._state_machines[1])
+
+                response.raise_for_status()
+                data = await self._read(call, response)
+
+            state_machines = [
+                StateMachine(state_machine['name'])
+                for state_machine in data['state-machines']
+            ]
+            self._record_state_machines(state_machines, response.headers)
+            return state_machines
+
+    async def _single_flight(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[R]],
+    ) -> R:
+        """Await ``func()``, sharing it with concurrent calls for the key."""
+        if self._flights is None:
+            return await func()
+        return await self._flights.do(key, func)
+
+    async def get_labels(self, state_machine: StateMachine) -> List[LabelRef]:
+        """List the labels in the given state machine."""
+        return await self._single_flight(
+            ('get_labels', state_machine),
+            lambda: self._get_labels(state_machine),
+        )
+
+    async def _get_labels(self, state_machine: StateMachine) -> List[LabelRef]:
+        call = Call('get_labels', state_machine=state_machine)
+
+        with self._observe(call):
+            async with await self._send(
+                call,
+                'GET',
+                self.build_state_machine_url(state_machine),
+            ) as response:
+                if response.status == 404:
+                    raise UnknownStateMachine(state_machine)
+
+                response.raise_for_status()
+                data = await self._read(call, response)
+
+            return self._build_label_refs(call, state_machine, data['labels'])
+
+    async def get_label(self, label: LabelRef, revalidate: bool = False) -> Label:
+        """
+        Get a label within a given state machine.
+
+        With a cache configured, fresh cached labels are returned directly and
+        expired ones are revalidated with a conditional request if the API
+        provided an ``ETag`` or ``Last-Modified`` header for them. With
+        ``revalidate``, fresh cached labels are revalidated too.
+
+        Errors:
+        - ``UnknownLabel`` if the label is not known (HTTP 404).
+        - ``DeletedLabel`` if the label has been deleted (HTTP 410).
+        - ``aiohttp.ClientResponseError`` for other HTTP errors.
+        """
+        cached = None if revalidate else self._cached_label(label)
+        if cached is not None:
+            return cached
+
+        return await self._single_flight(
+            ('get_label', label),
+            lambda: self._get_label(label),
+        )
+
+    async def _get_label(self, label: LabelRef) -> Label:
+        call = Call('get_label', label=label)
+
+        with self._observe(call):
+            url = self.build_label_url(label)
+            response = await self._send(
+                call,
+                'GET',
+                url,
+                headers=self._label_validators(label),
+            )
+
+            if response.status == 304:
+                response.release()
+                cached = self._revalidated_label(label)
+                if cached is not None:
+                    return cached
+                # Evicted while revalidating; fetch it in full.
+                response = await self._send(call, 'GET', url)
+
+            async with response:
+                if response.status == 404:
+                    self._record_deletion(label)
+                    raise UnknownLabel(label)
+                elif response.status == 410:
+                    self._record_deletion(label)
+                    raise DeletedLabel(label)
+
+                response.raise_for_status()
+                data = await self._read(call, response)
+
+            result = self._build_label(call, label, data)
+            self._record_label(result, response.headers)
+            return result
+
+    async def create_label(self, label: LabelRef, metadata: Metadata) -> Label:
+        """
+        Create a label with a given metadata, and start it in the state machine.
+
+        Errors:
+        - ``UnknownStateMachine`` if the state machine is not known (HTTP 404).
+        - ``LabelAlreadyExists`` if the label already exists (HTTP 409).
+        - ``aiohttp.ClientResponseError`` for other HTTP errors.
+
+        If a retried request finds that the label already exists, an earlier
+        attempt is assumed to have created it and the label is returned.
+        """
+        call = Call('create_label', label=label)
+
+        with self._observe(call):
+            async with await self._send(
+                call,
+                'POST',
+                self.build_label_url(label),
+                **self._json_body({'metadata': metadata})
+            ) as response:
+                if response.status == 404:
+                    raise UnknownStateMachine(label.state_machine)
+                elif response.status == 409:
+                    if call.attempts > 1:
+                        return await self.get_label(label)
+                    raise LabelAlreadyExists(label)
+
+                response.raise_for_status()
+                data = await self._read(call, response)
+
+            result = self._build_label(call, label, data)
+            self._record_label(result, response.headers)
+            return result
+
+    async def update_label(self, label: LabelRef, metadata: Metadata) -> Label:
+        """
+        Update a label in a state machine.
+
+        Triggering progression if necessary according to the state machine
+        configuration. Updates are _merged_ with existing metadata.
+
+        Errors:
+        - ``UnknownLabel`` if the label is not known (HTTP 404).
+        - ``DeletedLabel`` if the label has been deleted (HTTP 410).
+        - ``aiohttp.ClientResponseError`` for other HTTP errors.
+        """
+        call = Call('update_label', label=label)
+
+        with self._observe(call):
+            async with await self._send(
+                call,
+                'PATCH',
+                self.build_label_url(label),
+                **self._json_body({'metadata': metadata})
+            ) as response:
+                if response.status == 404:
+                    self._record_deletion(label)
+                    raise UnknownLabel(label)
+                elif response.status == 410:
+                    self._record_deletion(label)
+                    raise DeletedLabel(label)
+
+                response.raise_for_status()
+                data = await self._read(call, response)
+
+            result = self._build_label(call, label, data)
+            self._record_label(result, response.headers)
+            return result
+
+    async def delete_label(self, label: LabelRef) -> None:
+        """
+        Delete a label in a state machine.
+
+        Marks a label as deleted, but does not remove it from the database.
+        Deleted labels cannot be updated and will not move state.
+
+        Errors:
+        - ``UnknownStateMachine`` if the state machine is not known (HTTP 404).
+        - ``aiohttp.ClientResponseError`` for other HTTP errors.
+        """
+        call = Call('delete_label', label=label)
+
+        with self._observe(call):
+            async with await self._send(
+                call,
+                'DELETE',
+                self.build_label_url(label),
+            ) as response:
+                if response.status == 404:
+                    raise UnknownStateMachine(label.state_machine)
+
+                response.raise_for_status()
+
+            self._record_deletion(label)
+
+    async def get_labels_bulk(
+        self,
+        labels: Iterable[LabelRef],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        revalidate: bool = False,
+    ) -> List[BulkResult[Label]]:
+        """
+        Get many labels concurrently.
+
+        Returns one result per label, in order: either the ``Label`` or the
+        exception which ``get_label`` raised for it.
+        """
+        return await _gather_bulk(
+            lambda label: self.get_label(label, revalidate=revalidate),
+            labels,
+            max_in_flight,
+        )
+
+    async def create_labels(
+        self,
+        labels: Iterable[Tuple[LabelRef, Metadata]],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> List[BulkResult[Label]]:
+        """
+        Create many labels concurrently from ``(label, metadata)`` pairs.
+
+        Returns one result per label, in order: either the ``Label`` or the
+        exception which ``create_label`` raised for it.
+        """
+        return await _gather_bulk(
+            lambda pair: self.create_label(*pair),
+            labels,
+            max_in_flight,
+        )
+
+    async def update_labels(
+        self,
+        labels: Iterable[Tuple[LabelRef, Metadata]],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> List[BulkResult[Label]]:
+        """
+        Update many labels concurrently from ``(label, metadata)`` pairs.
+
+        Returns one result per label, in order: either the ``Label`` or the
+        exception which ``update_label`` raised for it.
+        """
+        return await _gather_bulk(
+            lambda pair: self.update_label(*pair),
+            labels,
+            max_in_flight,
+        )
+
+    async def delete_labels(
+        self,
+        labels: Iterable[LabelRef],
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> List[Optional[Exception]]:
+        """
+        Delete many labels concurrently.
+
+        Returns one result per label, in order: either ``None`` or the
+        exception which ``delete_label`` raised for it.
+        """
+        return await _gather_bulk(self.delete_label, labels, max_in_flight)
@@ -0,0 +1,352 @@
+"""
+Bulk creation of labels from a file, sharded across processes and hosts.
+
+Records are read from a JSONL file of objects with ``state_machine``,
+``label`` and (optionally) ``metadata`` keys, or a CSV file with those
+columns, the metadata being JSON encoded. Each record is assigned to a shard
+by a hash of its label, so that every shard, and every run, agrees on which
+shard handles a label; a run on each of ``nodes`` hosts handles ``workers``
+shards, each in its own process with its own ``RoutemasterAPI`` sending
+``max_in_flight`` requests at once.
+
+Each shard records its progress in a checkpoint file after every batch of
+records, so that a run which is interrupted continues where it stopped when
+started again with the same checkpoint directory. As a batch may have been
+partly sent before an interruption, records are upserted by default: labels
+which already exist are updated with the record's metadata. Records which
+fail are written, with their error, to a JSONL file per shard which may be
+used as the input of another run. Records which cannot be read are written
+there too, with their position in the file, and are otherwise skipped.
+"""
+
+import os
+import csv
+import json
+import zlib
+import itertools
+import concurrent.futures
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+    Union,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    NamedTuple,
+)
+
+from routemaster_sdk.api import (
+    DEFAULT_MAX_IN_FLIGHT,
+    RoutemasterAPI,
+    _run_bulk,
+)
+from routemaster_sdk.retry import RetryPolicy
+from routemaster_sdk.types import LabelRef, Metadata, LabelName, StateMachine
+from routemaster_sdk.ratelimit import RateLimiter
+from routemaster_sdk.exceptions import LabelAlreadyExists
+
+FORMATS = ('jsonl', 'csv')
+
+DEFAULT_BATCH_SIZE = 500
+
+CREATED = 'created'
+UPDATED = 'updated'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+Record = NamedTuple('Record', [
+    ('label', LabelRef),
+    ('metadata', Metadata),
+])
+
+# A record, or why it could not be read.
+Entry = Union[Record, ValueError]
+
+BackfillOptions = NamedTuple('BackfillOptions', [
+    ('api_url', str),
+    ('path', str),
+    ('checkpoint_dir', str),
+    ('format', str),
+    ('shards', int),
+    ('max_in_flight', int),
+    ('batch_size', int),
+    ('upsert', bool),
+    # Requests per second allowed to each worker, ``None`` if unlimited.
+    ('rate', Optional[float]),
+])
+
+ShardResult = NamedTuple('ShardResult', [
+    ('shard', int),
+    ('created', int),
+    ('updated', int),
+    ('skipped', int),
+    ('failed', int),
+])
+
+
+def detect_format(path: str) -> str:
+    """The format of a records file, from its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    raise ValueError("Cannot tell the format of {0!r}".format(path))
+
+
+def _record(fields: Dict[str, Any], metadata: Any) -> Record:
+    for key in ('state_machine', 'label'):
+        if not fields.get(key):
+            raise ValueError("Record has no {0!r}".format(key))
+    if not isinstance(metadata, dict):
+        raise ValueError("Metadata must be an object, not {0!r}".format(metadata))
+
+    return Record(
+        LabelRef(
+            LabelName(fields['label']),
+            StateMachine(fields['state_machine']),
+        ),
+        metadata,
+    )
+
+
+def _jsonl_record(line: str) -> Record:
+    fields = json.loads(line)
+    if not isinstance(fields, dict):
+        raise ValueError("Record must be an object, not {0!r}".format(fields))
+    return _record(fields, fields.get('metadata', {}))
+
+
+def _csv_record(fields: Dict[str, Any]) -> Record:
+    metadata = fields.get('metadata')
+    return _record(fields, json.loads(metadata) if metadata else {})
+
+
+def _read(parse: Callable[[Any], Record], value: Any) -> Entry:
+    try:
+        return parse(value)
+    except ValueError as e:
+        # Includes ``json.JSONDecodeError``.
+        return e
+
+
+def read_records(path: str, format: str) -> Iterator[Tuple[int, Entry]]:
+    """
+    Read the records in a file, with their positions in it.
+
+    A record which cannot be read is given as the ``ValueError`` saying why,
+    so that reading continues past it.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        if format == 'jsonl':
+            for position, line in enumerate(f):
+                if line.strip():
+                    yield position, _read(_jsonl_record, line)
+
+        elif format == 'csv':
+            for position, fields in enumerate(csv.DictReader(f)):
+                yield position, _read(_csv_record, fields)
+
+        else:
+            raise ValueError("Unknown format {0!r}".format(format))
+
+
+def shard_of(label: LabelRef, shards: int) -> int:
+    """The shard which handles a label, stable across processes and runs."""
+    key = '{0}/{1}'.format(label.state_machine, label.name).encode('utf-8')
+    return zlib.crc32(key) % shards
+
+
+def _shard_of_entry(position: int, entry: Entry, shards: int) -> int:
+    if isinstance(entry, Record):
+        return shard_of(entry.label, shards)
+    # Unreadable records have no label, so are shared out by position.
+    return position % shards
+
+
+def _checkpoint_path(options: BackfillOptions, shard: int) -> str:
+    return os.path.join(options.checkpoint_dir, 'shard-{0}.json'.format(shard))
+
+
+def _failures_path(options: BackfillOptions, shard: int) -> str:
+    return os.path.join(
+        options.checkpoint_dir,
+        'shard-{0}.failed.jsonl'.format(shard),
+    )
+
+
+def read_checkpoint(options: BackfillOptions, shard: int) -> int:
+    """The position of the last record a shard has handled, or -1."""
+    try:
+        with open(_checkpoint_path(options, shard), 'r') as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return -1
+
+    if checkpoint['shards'] != options.shards:
+        raise ValueError(
+            "Checkpoint of shard {0} is for {1} shards, not {2}".format(
+                shard,
+                checkpoint['shards'],
+                options.shards,
+            ),
+        )
+
+    return checkpoint['position']
+
+
+def _write_checkpoint(options: BackfillOptions, shard: int, position: int) -> None:
+    path = _checkpoint_path(options, shard)
+    temporary = path + '.tmp'
+
+    with open(temporary, 'w') as f:
+        json.dump({'shards': options.shards, 'position': position}, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary, path)
+
+
+def _upsert(api: RoutemasterAPI, record: Entry, upsert: bool) -> str:
+    if isinstance(record, ValueError):
+        # Unreadable, so reported as a failure with the others.
+        raise record
+
+    try:
+        api.create_label(record.label, record.metadata)
+    except LabelAlreadyExists:
+        if not upsert:
+            return SKIPPED
+        api.update_label(record.label, record.metadata)
+        return UPDATED
+    return CREATED
+
+
+def _failure(position: int, record: Entry, error: Exception) -> Dict[str, Any]:
+    if isinstance(record, ValueError):
+        return {'position': position, 'error': repr(error)}
+
+    return {
+        'state_machine': record.label.state_machine,
+        'label': record.label.name,
+        'metadata': record.metadata,
+        'error': repr(error),
+    }
+
+
+def _batches(
+    records: Iterable[Tuple[int, Entry]],
+    size: int,
+) -> Iterator[List[Tuple[int, Entry]]]:
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def run_shard(options: BackfillOptions, shard: int) -> ShardResult:
+    """Backfill the records of one shard, from its last checkpoint."""
+    api = RoutemasterAPI.from_url(
+        options.api_url,
+        pool_size=options.max_in_flight,
+        retry_policy=RetryPolicy(),
+        rate_limiter=(
+            RateLimiter(rate=options.rate) if options.rate is not None else None
+        ),
+    )
+    done = read_checkpoint(options, shard)
+    counts = {CREATED: 0, UPDATED: 0, SKIPPED: 0, FAILED: 0}
+
+    records = (
+        (position, record)
+        for position, record in read_records(options.path, options.format)
+        if position > done
+        if _shard_of_entry(position, record, options.shards) == shard
+    )
+
+    try:
+        with open(_failures_path(options, shard), 'a', encoding='utf-8') as failures:
+            for batch in _batches(records, options.batch_size):
+                results = _run_bulk(
+                    lambda item: _upsert(api, item[1], options.upsert),
+                    batch,
+                    options.max_in_flight,
+                )
+
+                for (position, record), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        counts[FAILED] += 1
+                        failures.write(
+                            json.dumps(_failure(position, record, result)) + '\n',
+                        )
+                    else:
+                        counts[result] += 1
+
+                failures.flush()
+                _write_checkpoint(options, shard, batch[-1][0])
+    finally:
+        api.close()
+
+    return ShardResult(
+        shard,
+        counts[CREATED],
+        counts[UPDATED],
+        counts[SKIPPED],
+        counts[FAILED],
+    )
+
+
+def backfill(
+    api_url: str,
+    path: str,
+    checkpoint_dir: str,
+    format: Optional[str] = None,
+    workers: int = 1,
+    node: int = 0,
+    nodes: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    upsert: bool = True,
+    rate: Optional[float] = None,
+) -> List[ShardResult]:
+    """
+    Backfill this node's shards of the records in a file.
+
+    With one worker, its shard is handled in this process; otherwise each
+    shard is handled by a process of its own. Returns a result per shard.
+    See the module documentation for details.
+    """
+    if workers < 1 or nodes < 1:
+        raise ValueError("workers and nodes must be at least 1")
+    if not 0 <= node < nodes:
+        raise ValueError("node must be in [0, nodes)")
+
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    options = BackfillOptions(
+        api_url=api_url,
+        path=path,
+        checkpoint_dir=checkpoint_dir,
+        format=format or detect_format(path),
+        shards=workers * nodes,
+        max_in_flight=max_in_flight,
+        batch_size=batch_size,
+        upsert=upsert,
+        rate=rate,
+    )
+    shards = range(node * workers, (node + 1) * workers)
+
+    if workers == 1:
+        return [run_shard(options, shard) for shard in shards]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [
+            executor.submit(run_shard, options, shard)
+            for shard in shards
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1 @@
+"""Benchmarks of the SDK's performance-sensitive paths."""
@@ -0,0 +1,263 @@
+"""
+Benchmark of the API clients against a local stand-in for routemaster.
+
+Run with ``python -m routemaster_sdk.benchmarks.api``. The stand-in runs in
+the same process as the clients, so results are for comparing changes to the
+SDK or its settings rather than predicting throughput against routemaster.
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+import concurrent.futures
+from typing import Any, Dict, List, Tuple, Callable, Awaitable
+
+from routemaster_sdk.api import RoutemasterAPI
+from routemaster_sdk.types import LabelRef, Metadata, LabelName, StateMachine
+from routemaster_sdk.benchmarks.codec import PAYLOAD_SIZES, make_metadata
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+OPERATIONS = ('get_label', 'create_label', 'update_label', 'get_labels')
+MODES = ('serial', 'threaded', 'async')
+
+STATE_MACHINE = StateMachine('benchmark')
+
+# Labels which exist before the benchmark starts, read and updated by it.
+SEEDED_LABELS = 100
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """The nearest-rank percentile of some samples, e.g. 0.99 for p99."""
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def _seeded_label(index: int) -> LabelRef:
+    return LabelRef(
+        LabelName('label-{0}'.format(index % SEEDED_LABELS)),
+        STATE_MACHINE,
+    )
+
+
+def _new_label(prefix: str, index: int) -> LabelRef:
+    return LabelRef(LabelName('{0}-{1}'.format(prefix, index)), STATE_MACHINE)
+
+
+def _sync_operation(
+    api: Any,
+    operation: str,
+    metadata: Metadata,
+    prefix: str,
+) -> Callable[[int], Any]:
+    """A function making the ``index``th call of an operation."""
+    if operation == 'get_label':
+        return lambda index: api.get_label(_seeded_label(index))
+    if operation == 'create_label':
+        return lambda index: api.create_label(_new_label(prefix, index), metadata)
+    if operation == 'update_label':
+        return lambda index: api.update_label(_seeded_label(index), metadata)
+    if operation == 'get_labels':
+        return lambda index: api.get_labels(STATE_MACHINE)
+    raise ValueError("Unknown operation {0!r}".format(operation))
+
+
+def _timed(call: Callable[[int], Any], index: int) -> float:
+    start = time.perf_counter()
+    call(index)
+    return time.perf_counter() - start
+
+
+def measure_serial(
+    call: Callable[[int], Any],
+    requests: int,
+) -> Tuple[List[float], float]:
+    """Make calls one after another, returning their latencies and the total."""
+    start = time.perf_counter()
+    samples = [_timed(call, index) for index in range(requests)]
+    return samples, time.perf_counter() - start
+
+
+def measure_threaded(
+    call: Callable[[int], Any],
+    requests: int,
+    concurrency: int,
+) -> Tuple[List[float], float]:
+    """Make calls from a pool of threads, returning latencies and the total."""
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        start = time.perf_counter()
+        samples = list(executor.map(
+            lambda index: _timed(call, index),
+            range(requests),
+        ))
+        return samples, time.perf_counter() - start
+
+
+async def measure_async(
+    call: Callable[[int], Awaitable[Any]],
+    requests: int,
+    concurrency: int,
+) -> Tuple[List[float], float]:
+    """Make calls from concurrent coroutines, returning latencies and total."""
+    indexes = iter(range(requests))
+    samples = []  # type: List[float]
+
+    async def worker() -> None:
+        for index in indexes:
+            call_start = time.perf_counter()
+            await call(index)
+            samples.append(time.perf_counter() - call_start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def _run_async(
+    url: str,
+    operation: str,
+    metadata: Metadata,
+    prefix: str,
+    requests: int,
+    concurrency: int,
+) -> Tuple[List[float], float]:
+    # Imported here as aiohttp is an optional dependency.
+    import aiohttp
+
+    from routemaster_sdk.async_api import AsyncRoutemasterAPI
+
+    async def go() -> Tuple[List[float], float]:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            api = AsyncRoutemasterAPI(url, session)
+            call = _sync_operation(api, operation, metadata, prefix)
+            return await measure_async(call, requests, concurrency)
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(go())
+    finally:
+        loop.close()
+
+
+def run(
+    requests: int = 500,
+    concurrency: int = 8,
+    latency: float = 0.0,
+    payload: str = 'small',
+    operations: Tuple[str, ...] = OPERATIONS,
+    modes: Tuple[str, ...] = MODES,
+) -> List[Dict[str, Any]]:
+    """Run the benchmark, returning one row per operation and mode."""
+    metadata = make_metadata(PAYLOAD_SIZES[payload])
+    unique = itertools.count()
+    rows = []  # type: List[Dict[str, Any]]
+
+    with FakeRoutemaster(state_machines=(STATE_MACHINE,)) as server:
+        server.seed(
+            STATE_MACHINE,
+            ('label-{0}'.format(x) for x in range(SEEDED_LABELS)),
+            metadata,
+        )
+        api = RoutemasterAPI.from_url(server.url, pool_size=concurrency)
+
+        for operation in operations:
+            for mode in modes:
+                prefix = 'created-{0}'.format(next(unique))
+                call = _sync_operation(api, operation, metadata, prefix)
+
+                # Warm the connection pool, undelayed and outside the timings.
+                api.get_status()
+                server.latency = latency
+
+                if mode == 'serial':
+                    samples, elapsed = measure_serial(call, requests)
+                elif mode == 'threaded':
+                    samples, elapsed = measure_threaded(
+                        call,
+                        requests,
+                        concurrency,
+                    )
+                elif mode == 'async':
+                    samples, elapsed = _run_async(
+                        server.url,
+                        operation,
+                        metadata,
+                        prefix,
+                        requests,
+                        concurrency,
+                    )
+                else:
+                    raise ValueError("Unknown mode {0!r}".format(mode))
+
+                server.latency = 0.0
+
+                rows.append({
+                    'operation': operation,
+                    'mode': mode,
+                    'requests': requests,
+                    'throughput': requests / elapsed,
+                    'p50_ms': percentile(samples, 0.5) * 1000,
+                    'p99_ms': percentile(samples, 0.99) * 1000,
+                })
+
+        api.close()
+
+    return rows
+
+
+def main(argv: List[str] = sys.argv[1:]) -> None:
+    """Print a table of throughput and latency per operation and mode."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.0,
+        help="Delay added to each response by the server, in milliseconds.",
+    )
+    parser.add_argument(
+        '--payload',
+        choices=sorted(PAYLOAD_SIZES, key=PAYLOAD_SIZES.__getitem__),
+        default='small',
+    )
+    parser.add_argument(
+        '--operation',
+        dest='operations',
+        action='append',
+        choices=OPERATIONS,
+    )
+    parser.add_argument('--mode', dest='modes', action='append', choices=MODES)
+    args = parser.parse_args(argv)
+
+    rows = run(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        latency=args.latency / 1000,
+        payload=args.payload,
+        operations=tuple(args.operations or OPERATIONS),
+        modes=tuple(args.modes or MODES),
+    )
+
+    row_format = (
+        '{operation:<13} {mode:<9} {requests:>8} {throughput:>10.1f} '
+        '{p50_ms:>9.2f} {p99_ms:>9.2f}'
+    )
+
+    print('{0:<13} {1:<9} {2:>8} {3:>10} {4:>9} {5:>9}'.format(
+        'operation',
+        'mode',
+        'requests',
+        'req/s',
+        'p50 (ms)',
+        'p99 (ms)',
+    ))
+    for row in rows:
+        print(row_format.format(**row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark of the available JSON codecs on label-shaped payloads.
+
+Run with ``python -m routemaster_sdk.benchmarks.codec``.
+"""
+
+import sys
+import timeit
+import argparse
+from typing import Any, Dict, List
+
+from routemaster_sdk.codec import JSONCodec, available_codecs
+
+# Number of top-level metadata keys in each payload size.
+PAYLOAD_SIZES = {
+    'small': 10,
+    'medium': 200,
+    'large': 5000,
+}
+
+
+def make_metadata(keys: int) -> Dict[str, Any]:
+    """Build metadata resembling that of a real label, with ``keys`` keys."""
+    metadata = {}  # type: Dict[str, Any]
+
+    for index in range(keys):
+        kind = index % 4
+        key = 'field_{0}'.format(index)
+
+        if kind == 0:
+            metadata[key] = 'value-{0}-{1}'.format(index, 'x' * (index % 40))
+        elif kind == 1:
+            metadata[key] = index * 7919
+        elif kind == 2:
+            metadata[key] = {
+                'enabled': bool(index % 3),
+                'score': index / 7,
+                'tags': ['tag-{0}'.format(tag) for tag in range(index % 5)],
+            }
+        else:
+            metadata[key] = [index, None, 'item-{0}'.format(index)]
+
+    return metadata
+
+
+def time_codec(
+    codec: JSONCodec,
+    payload: Dict[str, Any],
+    repeat: int,
+) -> Dict[str, float]:
+    """Best per-call encode and decode times of a codec, in microseconds."""
+    encoded = codec.dumps(payload)
+
+    def best(func: Any) -> float:
+        number = max(1, 20000 // max(1, len(encoded) // 100))
+        timings = timeit.repeat(func, number=number, repeat=repeat)
+        return min(timings) / number * 1e6
+
+    return {
+        'encode': best(lambda: codec.dumps(payload)),
+        'decode': best(lambda: codec.loads(encoded)),
+        'bytes': float(len(encoded)),
+    }
+
+
+def run(repeat: int = 5) -> List[Dict[str, Any]]:
+    """Run the benchmark, returning one row per codec and payload size."""
+    rows = []  # type: List[Dict[str, Any]]
+
+    for size_name, keys in sorted(PAYLOAD_SIZES.items(), key=lambda x: x[1]):
+        payload = {'metadata': make_metadata(keys), 'state': 'in-progress'}
+
+        for codec in available_codecs():
+            timings = time_codec(codec, payload, repeat)
+            rows.append({
+                'payload': size_name,
+                'codec': codec.name,
+                'bytes': int(timings['bytes']),
+                'encode_us': timings['encode'],
+                'decode_us': timings['decode'],
+            })
+
+    return rows
+
+
+def main(argv: List[str] = sys.argv[1:]) -> None:
+    """Print a table of codec timings."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    row_format = (
+        '{payload:<8} {codec:<8} {bytes:>9} {encode_us:>12.1f} {decode_us:>12.1f}'
+    )
+
+    print('{0:<8} {1:<8} {2:>9} {3:>12} {4:>12}'.format(
+        'payload',
+        'codec',
+        'bytes',
+        'encode (us)',
+        'decode (us)',
+    ))
+    for row in run(repeat=args.repeat):
+        print(row_format.format(**row))
+
+
+if __name__ == '__main__':
+    main()
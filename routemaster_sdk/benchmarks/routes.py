@@ -0,0 +1,84 @@
+"""
+Benchmark of building label urls, as done for every label request.
+
+Compares the precompiled ``Routes`` with formatting each path and resolving
+it against the base url. Run with ``python -m routemaster_sdk.benchmarks.routes``.
+"""
+
+import sys
+import timeit
+import argparse
+import urllib.parse
+from typing import Any, Dict, List, Callable
+
+from routemaster_sdk.types import LabelRef, LabelName, StateMachine
+from routemaster_sdk.routes import Routes
+
+API_URL = 'http://localhost:2017/'
+
+LABEL_NAMES = {
+    'plain': 'label-1234567',
+    'quoted': 'orders/1234567?region=eu#1',
+}
+
+
+def urljoin_label_url(api_url: str, label: LabelRef) -> str:
+    """A label's url, built as it was before ``Routes``."""
+    return urllib.parse.urljoin(
+        api_url,
+        'state-machines/{0}/labels/{1}'.format(label.state_machine, label.name),
+    )
+
+
+def time_call(func: Callable[[], Any], number: int, repeat: int) -> float:
+    """Best per-call time of a function, in microseconds."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6
+
+
+def run(number: int = 100000, repeat: int = 5) -> List[Dict[str, Any]]:
+    """Run the benchmark, returning one row per label name."""
+    routes = Routes(API_URL)
+    rows = []  # type: List[Dict[str, Any]]
+
+    for kind, name in sorted(LABEL_NAMES.items()):
+        label = LabelRef(LabelName(name), StateMachine('orders'))
+
+        urljoin_us = time_call(
+            lambda: urljoin_label_url(API_URL, label),
+            number,
+            repeat,
+        )
+        routes_us = time_call(lambda: routes.label(label), number, repeat)
+
+        rows.append({
+            'name': kind,
+            'urljoin_us': urljoin_us,
+            'routes_us': routes_us,
+            'speedup': urljoin_us / routes_us,
+        })
+
+    return rows
+
+
+def main(argv: List[str] = sys.argv[1:]) -> None:
+    """Print a table of url building timings."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print('{0:<8} {1:>13} {2:>12} {3:>8}'.format(
+        'name',
+        'urljoin (us)',
+        'routes (us)',
+        'speedup',
+    ))
+    for row in run(number=args.number, repeat=args.repeat):
+        print(
+            '{name:<8} {urljoin_us:>13.2f} {routes_us:>12.2f} '
+            '{speedup:>7.1f}x'.format(**row),
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""In-process stand-in for the routemaster HTTP API, for benchmarking."""
+
+import json
+import time
+import threading
+import http.server
+import socketserver
+import urllib.parse
+from typing import Any, Dict, Tuple, Iterable, Optional
+
+from routemaster_sdk.buffer import merge_metadata
+
+INITIAL_STATE = 'start'
+
+
+class _Label:
+    __slots__ = ('metadata', 'deleted')
+
+    def __init__(self, metadata: Dict[str, Any]) -> None:
+        self.metadata = metadata
+        self.deleted = False
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    # Room for every client connection to be opened at once.
+    request_queue_size = 128
+
+    def __init__(self, fake: 'FakeRoutemaster', address: Tuple[str, int]) -> None:
+        super().__init__(address, _Handler)
+        self.fake = fake
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    # Keep connections alive, as routemaster behind a real server would.
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, so would otherwise be delayed.
+    disable_nagle_algorithm = True
+
+    server = None  # type: Any
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _handle(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        body = None
+        if length:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+
+        path = urllib.parse.urlsplit(self.path).path
+        status, response = self.server.fake.handle(self.command, path, body)
+
+        data = b'' if response is None else json.dumps(response).encode('utf-8')
+
+        self.send_response(status)
+        if response is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+
+class FakeRoutemaster:
+    """
+    A routemaster API served from memory, on a local port.
+
+    Implements the endpoints used by ``RoutemasterAPI`` for the given state
+    machines, in which labels are created in the state ``start`` and never
+    move. Each request is delayed by ``latency`` seconds before being
+    answered, to stand in for network and database time.
+
+    Use as a context manager, or call ``start`` and ``stop``.
+    """
+
+    def __init__(
+        self,
+        state_machines: Iterable[str] = ('benchmark',),
+        latency: float = 0.0,
+        host: str = '127.0.0.1',
+    ) -> None:
+        self.latency = latency
+        self.host = host
+
+        self._labels = {
+            state_machine: {}
+            for state_machine in state_machines
+        }  # type: Dict[str, Dict[str, _Label]]
+        self._lock = threading.Lock()
+        self._server = None  # type: Optional[_Server]
+        self._thread = None  # type: Optional[threading.Thread]
+
+    def __enter__(self) -> 'FakeRoutemaster':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        """The base url of the API, once started."""
+        if self._server is None:
+            raise RuntimeError("The server has not been started")
+        return 'http://{0}:{1}/'.format(self.host, self._server.server_port)
+
+    def start(self) -> None:
+        """Start serving requests, on a background thread."""
+        self._server = _Server(self, (self.host, 0))
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name='fake-routemaster',
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving requests."""
+        if self._server is None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def seed(
+        self,
+        state_machine: str,
+        names: Iterable[str],
+        metadata: Dict[str, Any],
+    ) -> None:
+        """Create labels directly, without going through the API."""
+        with self._lock:
+            labels = self._labels[state_machine]
+            for name in names:
+                labels[name] = _Label(dict(metadata))
+
+    def handle(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Dict[str, Any]],
+    ) -> Tuple[int, Any]:
+        """Answer a request, returning its status and JSON body."""
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = [
+            urllib.parse.unquote(part)
+            for part in path.strip('/').split('/')
+            if part
+        ]
+
+        with self._lock:
+            if not parts:
+                return self._status(method)
+
+            if parts[0] != 'state-machines':
+                return 404, None
+
+            if len(parts) == 1:
+                return self._state_machines(method)
+
+            labels = self._labels.get(parts[1])
+            if labels is None or len(parts) < 3 or parts[2] != 'labels':
+                return 404, None
+
+            if len(parts) == 3:
+                return self._list_labels(method, labels)
+
+            if len(parts) == 4:
+                return self._label(method, labels, parts[3], body)
+
+        return 404, None
+
+    def _status(self, method: str) -> Tuple[int, Any]:
+        if method != 'GET':
+            return 405, None
+        return 200, {
+            'status': 'ok',
+            'state-machines': '/state-machines',
+            'version': 'fake',
+        }
+
+    def _state_machines(self, method: str) -> Tuple[int, Any]:
+        if method != 'GET':
+            return 405, None
+        return 200, {
+            'state-machines': [
+                {
+                    'name': name,
+                    'labels': '/state-machines/{0}/labels'.format(name),
+                }
+                for name in self._labels
+            ],
+        }
+
+    def _list_labels(
+        self,
+        method: str,
+        labels: Dict[str, _Label],
+    ) -> Tuple[int, Any]:
+        if method != 'GET':
+            return 405, None
+
+        return 200, {
+            'labels': [
+                {'name': name}
+                for name, label in labels.items()
+                if not label.deleted
+            ],
+        }
+
+    def _label(
+        self,
+        method: str,
+        labels: Dict[str, _Label],
+        name: str,
+        body: Optional[Dict[str, Any]],
+    ) -> Tuple[int, Any]:
+        label = labels.get(name)
+
+        if method == 'POST':
+            if label is not None:
+                return 409, None
+            if body is None:
+                return 400, None
+            label = labels[name] = _Label(body['metadata'])
+            return 201, {'metadata': label.metadata, 'state': INITIAL_STATE}
+
+        if label is None:
+            return 404, None
+
+        if label.deleted:
+            return (204, None) if method == 'DELETE' else (410, None)
+
+        if method == 'GET':
+            return 200, {'metadata': label.metadata, 'state': INITIAL_STATE}
+
+        if method == 'PATCH':
+            if body is None:
+                return 400, None
+            label.metadata = merge_metadata(label.metadata, body['metadata'])
+            return 200, {'metadata': label.metadata, 'state': INITIAL_STATE}
+
+        if method == 'DELETE':
+            label.deleted = True
+            return 204, None
+
+        return 405, None
@@ -0,0 +1,229 @@
+"""Coalescing of label updates into fewer requests."""
+
+import time
+import threading
+import collections
+import concurrent.futures
+from typing import Any, Dict, List, Optional
+
+from routemaster_sdk.api import DEFAULT_MAX_IN_FLIGHT, RoutemasterAPI
+from routemaster_sdk.types import LabelRef, Metadata
+
+
+def merge_metadata(existing: Metadata, update: Metadata) -> Metadata:
+    """
+    Merge a metadata update into existing metadata, as routemaster does.
+
+    Nested dicts are merged recursively; any other value in the update
+    replaces the existing one. Neither argument is modified.
+    """
+    merged = dict(existing)
+
+    for key, value in update.items():
+        current = merged.get(key)
+        if isinstance(current, dict) and isinstance(value, dict):
+            merged[key] = merge_metadata(current, value)
+        else:
+            merged[key] = value
+
+    return merged
+
+
+def _merges_exactly(existing: Metadata, update: Metadata) -> bool:
+    """
+    Whether merging an update into a pending one is the same as sending both.
+
+    It is not where one replaces a dict with another value, or the reverse:
+    a dict sent alone replaces what routemaster holds, but merged into the
+    pending update it is then merged with what routemaster holds.
+    """
+    for key, value in update.items():
+        if key not in existing:
+            continue
+        current = existing[key]
+        if isinstance(current, dict) != isinstance(value, dict):
+            return False
+        if isinstance(value, dict) and not _merges_exactly(current, value):
+            return False
+
+    return True
+
+
+class _Pending:
+    __slots__ = ('metadata', 'futures', 'queued_at')
+
+    def __init__(self, queued_at: float) -> None:
+        self.metadata = {}  # type: Metadata
+        self.futures = []  # type: List[concurrent.futures.Future]
+        self.queued_at = queued_at
+
+
+# The updates waiting to be sent, in order, for each label.
+_Buffered = Dict[LabelRef, List[_Pending]]
+
+
+class LabelUpdateBuffer:
+    """
+    Collects ``update_label`` calls and sends them as fewer requests.
+
+    Successive updates to the same label within ``window`` seconds are merged
+    (following routemaster's merge semantics) into a single PATCH, except
+    where an update replaces an object with another value or the reverse,
+    which merging would not reproduce; such an update starts another PATCH,
+    sent once the one before it has completed. Buffered
+    updates are sent once the oldest has waited ``window`` seconds, as soon as
+    ``max_pending`` labels have updates waiting, or when ``flush`` is called.
+    Updates to different labels in one flush are sent concurrently, up to
+    ``max_in_flight`` at once. Flushes happen one at a time, so updates to one
+    label are always applied in order.
+
+    ``update_label`` returns a future which resolves to the label as returned
+    by the request its update was merged into, or to the exception raised by
+    that request.
+
+    ``close`` (or leaving the buffer's ``with`` block) sends any remaining
+    updates and stops the background flushing thread; it must be called
+    before shutdown for buffered updates not to be lost.
+    """
+
+    def __init__(
+        self,
+        api: RoutemasterAPI,
+        window: float = 0.1,
+        max_pending: int = 100,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> None:
+        self.api = api
+        self.window = window
+        self.max_pending = max_pending
+        self.max_in_flight = max_in_flight
+
+        self._pending = collections.OrderedDict()  # type: _Buffered
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._closed = False
+
+    def __enter__(self) -> 'LabelUpdateBuffer':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def update_label(
+        self,
+        label: LabelRef,
+        metadata: Metadata,
+    ) -> concurrent.futures.Future:
+        """Buffer an update to a label, see ``RoutemasterAPI.update_label``."""
+        future = concurrent.futures.Future()  # type: concurrent.futures.Future
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Cannot update labels through a closed buffer")
+
+            patches = self._pending.get(label)
+            if patches is None:
+                patches = self._pending[label] = [_Pending(time.monotonic())]
+            elif not _merges_exactly(patches[-1].metadata, metadata):
+                patches.append(_Pending(time.monotonic()))
+
+            pending = patches[-1]
+            pending.metadata = merge_metadata(pending.metadata, metadata)
+            pending.futures.append(future)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='routemaster-update-buffer',
+                    daemon=True,
+                )
+                self._thread.start()
+
+            self._condition.notify()
+
+        return future
+
+    def pending(self) -> int:
+        """The number of labels with buffered updates."""
+        with self._condition:
+            return len(self._pending)
+
+    def flush(self) -> None:
+        """Send all buffered updates now, and wait for them to complete."""
+        with self._flush_lock:
+            with self._condition:
+                buffered = self._pending
+                self._pending = collections.OrderedDict()
+
+            # Each round sends at most one update per label, so that those of
+            # a label are applied in order.
+            rounds = max((len(patches) for patches in buffered.values()), default=0)
+            for index in range(rounds):
+                self._send(collections.OrderedDict(
+                    (label, patches[index])
+                    for label, patches in buffered.items()
+                    if index < len(patches)
+                ))
+
+    def close(self) -> None:
+        """Send all buffered updates and stop accepting new ones."""
+        with self._condition:
+            self._closed = True
+            thread = self._thread
+            self._condition.notify()
+
+        if thread is not None:
+            thread.join()
+
+        self.flush()
+
+    def _due(self) -> Optional[float]:
+        """Seconds until the buffer is due a flush, or None if it is empty."""
+        if not self._pending:
+            return None
+
+        if len(self._pending) >= self.max_pending:
+            return 0
+
+        oldest = next(iter(self._pending.values()))[0]
+        return max(0, oldest.queued_at + self.window - time.monotonic())
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._closed:
+                    due = self._due()
+                    if due == 0:
+                        break
+                    self._condition.wait(due)
+
+                if self._closed:
+                    return
+
+            self.flush()
+
+    def _send(self, batch: Dict[LabelRef, _Pending]) -> None:
+        if not batch:
+            return
+
+        results = self._request(batch)
+
+        for pending, result in zip(batch.values(), results):
+            for future in pending.futures:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _request(self, batch: Dict[LabelRef, _Pending]) -> List[Any]:
+        """Send a batch of updates, returning a result per label."""
+        try:
+            return self.api.update_labels(
+                ((label, pending.metadata) for label, pending in batch.items()),
+                max_in_flight=self.max_in_flight,
+            )
+        except Exception as e:
+            return [e] * len(batch)
@@ -0,0 +1,193 @@
+"""Client-side caching of labels."""
+
+import time
+import threading
+import collections
+from typing import Dict, Mapping, Callable, Optional, NamedTuple
+
+from routemaster_sdk.types import Label, LabelRef, StateMachine
+
+CacheStats = NamedTuple('CacheStats', [
+    ('hits', int),
+    ('misses', int),
+    ('evictions', int),
+    ('revalidations', int),
+    ('size', int),
+])
+
+
+def validators_from_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    """
+    Build conditional request headers from a response's validators.
+
+    Returns an empty dict if the response carried neither an ``ETag`` nor a
+    ``Last-Modified`` header.
+    """
+    validators = {}  # type: Dict[str, str]
+
+    etag = headers.get('ETag')
+    if etag:
+        validators['If-None-Match'] = etag
+
+    last_modified = headers.get('Last-Modified')
+    if last_modified:
+        validators['If-Modified-Since'] = last_modified
+
+    return validators
+
+
+class _Entry:
+    __slots__ = ('label', 'expires_at', 'validators')
+
+    def __init__(
+        self,
+        label: Label,
+        expires_at: float,
+        validators: Dict[str, str],
+    ) -> None:
+        self.label = label
+        self.expires_at = expires_at
+        self.validators = validators
+
+
+class LabelCache:
+    """
+    A bounded, thread-safe LRU cache of labels keyed on their ``LabelRef``.
+
+    Entries expire after a TTL, which may be set per state machine through
+    ``state_machine_ttls`` and otherwise defaults to ``ttl``. A TTL of zero
+    disables caching for that state machine. Once ``max_size`` entries are held
+    the least recently used entry is evicted.
+
+    Labels stored along with validators (``ETag``/``Last-Modified``) are kept
+    after they expire, so that they can be revalidated with a conditional
+    request rather than downloaded and decoded again.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 60.0,
+        state_machine_ttls: Optional[Dict[StateMachine, float]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.state_machine_ttls = dict(state_machine_ttls or {})
+        self._clock = clock
+
+        self._entries = collections.OrderedDict()  # type: collections.OrderedDict
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+
+    def ttl_for(self, state_machine: StateMachine) -> float:
+        """The TTL of cached labels in the given state machine."""
+        return self.state_machine_ttls.get(state_machine, self.ttl)
+
+    def get(self, label: LabelRef) -> Optional[Label]:
+        """Get a cached label, or ``None`` if it is not cached or expired."""
+        with self._lock:
+            entry = self._entries.get(label)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry.expires_at <= self._clock():
+                if not entry.validators:
+                    del self._entries[label]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(label)
+            self.hits += 1
+            return entry.label
+
+    def validators(self, label: LabelRef) -> Dict[str, str]:
+        """
+        Conditional request headers for revalidating a cached label.
+
+        Empty if the label is not cached or was stored without validators.
+        """
+        with self._lock:
+            entry = self._entries.get(label)
+            if entry is None:
+                return {}
+            return dict(entry.validators)
+
+    def revalidated(self, label: LabelRef) -> Optional[Label]:
+        """
+        Mark a cached label as still current, after a ``304 Not Modified``.
+
+        Returns the cached label with its TTL renewed, or ``None`` if it has
+        since been evicted.
+        """
+        ttl = self.ttl_for(label.state_machine)
+
+        with self._lock:
+            entry = self._entries.get(label)
+            if entry is None:
+                return None
+
+            entry.expires_at = self._clock() + ttl
+            self._entries.move_to_end(label)
+            self.revalidations += 1
+            return entry.label
+
+    def put(
+        self,
+        label: Label,
+        validators: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Cache a label, as returned by the API.
+
+        ``validators`` are the conditional request headers with which to
+        revalidate the label once it expires, see ``validators_from_headers``.
+        """
+        ttl = self.ttl_for(label.ref.state_machine)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._entries[label.ref] = _Entry(
+                label,
+                self._clock() + ttl,
+                validators or {},
+            )
+            self._entries.move_to_end(label.ref)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, label: LabelRef) -> None:
+        """Drop any cached copy of the given label."""
+        with self._lock:
+            self._entries.pop(label, None)
+
+    def clear(self) -> None:
+        """Drop all cached labels."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> CacheStats:
+        """Snapshot of the cache's counters."""
+        with self._lock:
+            return CacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                revalidations=self.revalidations,
+                size=len(self._entries),
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,65 @@
+"""Description of individual calls made through the API wrappers."""
+
+from typing import Optional
+
+from routemaster_sdk.types import LabelRef, StateMachine
+
+
+class Call:
+    """
+    A single call into the routemaster API, as it is being made.
+
+    ``operation`` is the name of the API wrapper method (e.g. ``get_label``).
+    ``state_machine`` and ``label`` are set for calls which concern them.
+    ``attempts`` counts the requests sent so far, including retries, and
+    ``hedges`` the duplicate requests sent for slow attempts.
+
+    The remaining attributes measure the call so far, for instrumentation:
+    ``status`` is that of the last response (``None`` if there was none),
+    ``bytes_sent`` and ``bytes_received`` count request and response bodies,
+    and ``network_time``, ``decode_time`` and ``build_time`` are the seconds
+    spent sending requests and receiving responses (including connecting and
+    retries), decoding JSON, and building ``Label``s and ``LabelRef``s.
+    """
+
+    __slots__ = (
+        'operation',
+        'state_machine',
+        'label',
+        'attempts',
+        'hedges',
+        'status',
+        'bytes_sent',
+        'bytes_received',
+        'network_time',
+        'decode_time',
+        'build_time',
+    )
+
+    def __init__(
+        self,
+        operation: str,
+        state_machine: Optional[StateMachine] = None,
+        label: Optional[LabelRef] = None,
+    ) -> None:
+        self.operation = operation
+        self.label = label
+        self.state_machine = (
+            label.state_machine if label is not None else state_machine
+        )
+        self.attempts = 0
+        self.hedges = 0
+
+        self.status = None  # type: Optional[int]
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.network_time = 0.0
+        self.decode_time = 0.0
+        self.build_time = 0.0
+
+    def __repr__(self) -> str:
+        return 'Call({0!r}, state_machine={1!r}, label={2!r})'.format(
+            self.operation,
+            self.state_machine,
+            self.label,
+        )
@@ -0,0 +1,185 @@
+"""Client-side circuit breaking for calls to the routemaster API."""
+
+import time
+import threading
+import collections
+from typing import Dict, List, Tuple, Callable, Optional
+
+from routemaster_sdk.types import StateMachine
+from routemaster_sdk.exceptions import CircuitOpen
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Called with the state machine (or ``None`` for calls not concerning one),
+# the previous state and the new state of its circuit.
+StateChangeCallback = Callable[[Optional[StateMachine], str, str], None]
+
+
+class _Circuit:
+    __slots__ = ('state', 'outcomes', 'opened_at', 'probes')
+
+    def __init__(self, window: int) -> None:
+        self.state = CLOSED
+        self.outcomes = collections.deque(maxlen=window)  # type: collections.deque
+        self.opened_at = 0.0
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the API, or one state machine, is failing.
+
+    A circuit is kept per state machine, plus one for calls which do not
+    concern a state machine. Each tracks the outcomes of its last ``window``
+    requests; once at least ``minimum_calls`` have been made and the
+    proportion of failures reaches ``failure_threshold`` the circuit opens,
+    and requests raise ``CircuitOpen`` without being sent.
+
+    After ``reset_timeout`` seconds the circuit becomes half-open and lets up
+    to ``half_open_max_calls`` probe requests through at once. A successful
+    probe closes the circuit, a failed one opens it again.
+
+    Failures are connection errors, timeouts and 5xx responses; any other
+    response shows the server is healthy. ``on_state_change`` is called on
+    every transition, for alerting.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        minimum_calls: int = 10,
+        window: int = 20,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        on_state_change: Optional[StateChangeCallback] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if not 0 < failure_threshold <= 1:
+            raise ValueError("failure_threshold must be in (0, 1]")
+        if not 0 < minimum_calls <= window:
+            raise ValueError("minimum_calls must be in (0, window]")
+
+        self.failure_threshold = failure_threshold
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.on_state_change = on_state_change
+        self._clock = clock
+
+        self._circuits = {}  # type: Dict[Optional[StateMachine], _Circuit]
+        self._lock = threading.Lock()
+
+    def _circuit(self, state_machine: Optional[StateMachine]) -> _Circuit:
+        circuit = self._circuits.get(state_machine)
+        if circuit is None:
+            circuit = self._circuits[state_machine] = _Circuit(self.window)
+        return circuit
+
+    def _transition(
+        self,
+        state_machine: Optional[StateMachine],
+        circuit: _Circuit,
+        state: str,
+        changes: List[Tuple[Optional[StateMachine], str, str]],
+    ) -> None:
+        changes.append((state_machine, circuit.state, state))
+        circuit.state = state
+        circuit.probes = 0
+
+        if state == OPEN:
+            circuit.opened_at = self._clock()
+        elif state == CLOSED:
+            circuit.outcomes.clear()
+
+    def _notify(
+        self,
+        changes: List[Tuple[Optional[StateMachine], str, str]],
+    ) -> None:
+        if self.on_state_change is None:
+            return
+        for state_machine, old, new in changes:
+            self.on_state_change(state_machine, old, new)
+
+    def state(self, state_machine: Optional[StateMachine] = None) -> str:
+        """The current state of the circuit for the given state machine."""
+        with self._lock:
+            circuit = self._circuits.get(state_machine)
+            return circuit.state if circuit is not None else CLOSED
+
+    def states(self) -> Dict[Optional[StateMachine], str]:
+        """The current state of every circuit which has seen a request."""
+        with self._lock:
+            return {
+                state_machine: circuit.state
+                for state_machine, circuit in self._circuits.items()
+            }
+
+    def before_request(self, state_machine: Optional[StateMachine]) -> None:
+        """
+        Check that a request may be sent.
+
+        Raises ``CircuitOpen`` if not. Otherwise the outcome of the request
+        must then be reported with ``record``.
+        """
+        changes = []  # type: List[Tuple[Optional[StateMachine], str, str]]
+
+        try:
+            with self._lock:
+                circuit = self._circuit(state_machine)
+
+                if circuit.state == OPEN:
+                    elapsed = self._clock() - circuit.opened_at
+                    if elapsed < self.reset_timeout:
+                        raise CircuitOpen(
+                            state_machine,
+                            retry_after=self.reset_timeout - elapsed,
+                        )
+                    self._transition(state_machine, circuit, HALF_OPEN, changes)
+
+                if circuit.state == HALF_OPEN:
+                    if circuit.probes >= self.half_open_max_calls:
+                        raise CircuitOpen(state_machine, retry_after=0)
+                    circuit.probes += 1
+        finally:
+            self._notify(changes)
+
+    def release(self, state_machine: Optional[StateMachine]) -> None:
+        """
+        Give back a request allowed by ``before_request`` without an outcome.
+
+        For requests which were abandoned, e.g. cancelled, so that a probe of
+        a half-open circuit is freed for another request.
+        """
+        with self._lock:
+            circuit = self._circuit(state_machine)
+            if circuit.state == HALF_OPEN and circuit.probes > 0:
+                circuit.probes -= 1
+
+    def record(self, state_machine: Optional[StateMachine], success: bool) -> None:
+        """Record the outcome of a request allowed by ``before_request``."""
+        changes = []  # type: List[Tuple[Optional[StateMachine], str, str]]
+
+        with self._lock:
+            circuit = self._circuit(state_machine)
+
+            if circuit.state == HALF_OPEN:
+                self._transition(
+                    state_machine,
+                    circuit,
+                    CLOSED if success else OPEN,
+                    changes,
+                )
+
+            elif circuit.state == CLOSED:
+                circuit.outcomes.append(success)
+                calls = len(circuit.outcomes)
+                failures = calls - sum(circuit.outcomes)
+                tripped = failures >= self.failure_threshold * calls
+
+                if calls >= self.minimum_calls and tripped:
+                    self._transition(state_machine, circuit, OPEN, changes)
+
+        self._notify(changes)
@@ -0,0 +1,114 @@
+"""Pluggable JSON encoding and decoding of request and response bodies."""
+
+import abc
+import json
+from typing import Any, List, Type
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None  # type: ignore
+
+
+class JSONCodec(abc.ABC):
+    """Encodes and decodes the JSON bodies sent to and from routemaster."""
+
+    name = 'abstract'
+    content_type = 'application/json'
+
+    @abc.abstractmethod
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value as a JSON document."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def loads(self, data: bytes) -> Any:
+        """Decode a JSON document."""
+        raise NotImplementedError
+
+
+class StdlibCodec(JSONCodec):
+    """Codec using the standard library's ``json`` module."""
+
+    name = 'json'
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value as a JSON document."""
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        """Decode a JSON document."""
+        return json.loads(data.decode('utf-8'))
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    Codec using ``orjson``, if installed.
+
+    Note that ``orjson`` only accepts string keys in dicts.
+    """
+
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value as a JSON document."""
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        """Decode a JSON document."""
+        return orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """Codec using ``ujson``, if installed."""
+
+    name = 'ujson'
+
+    def __init__(self) -> None:
+        if ujson is None:
+            raise ImportError("ujson is not installed")
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode a value as a JSON document."""
+        return ujson.dumps(value, escape_forward_slashes=False).encode('utf-8')
+
+    def loads(self, data: bytes) -> Any:
+        """Decode a JSON document."""
+        return ujson.loads(data)
+
+
+_CodecClasses = List[Type[JSONCodec]]
+
+# In order of preference.
+CODECS = [
+    OrjsonCodec,
+    UjsonCodec,
+    StdlibCodec,
+]  # type: _CodecClasses
+
+
+def available_codecs() -> List[JSONCodec]:
+    """Instances of each codec whose library is installed, fastest first."""
+    codecs = []  # type: List[JSONCodec]
+
+    for codec_class in CODECS:
+        try:
+            codecs.append(codec_class())
+        except ImportError:
+            continue
+
+    return codecs
+
+
+def fastest_codec() -> JSONCodec:
+    """The fastest codec whose library is installed."""
+    return available_codecs()[0]
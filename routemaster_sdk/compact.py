@@ -0,0 +1,100 @@
+"""Memory-compact representation of labels."""
+
+import sys
+from typing import Any, Iterator
+
+from routemaster_sdk.codec import JSONCodec
+from routemaster_sdk.types import (
+    Label,
+    State,
+    LabelRef,
+    Metadata,
+    StateMachine,
+)
+
+
+def intern_ref(label: LabelRef) -> LabelRef:
+    """A copy of a label reference, with its state machine name interned."""
+    return LabelRef(
+        name=label.name,
+        state_machine=StateMachine(sys.intern(label.state_machine)),
+    )
+
+
+class CompactLabel:
+    """
+    A label which holds its metadata encoded, decoding it only when read.
+
+    Behaves like ``Label``: it has ``ref``, ``metadata`` and ``state``
+    attributes, unpacks as ``ref, metadata, state``, supports indexing and
+    compares equal to the equivalent ``Label``. State and state machine names
+    are interned, so they are shared between all labels which use them.
+
+    ``metadata`` is decoded afresh on every access, so changes to the returned
+    dict are not kept; bind it to a local when reading it more than once.
+    Labels read from the API have had their metadata decoded once already, to
+    build them, so holding them saves memory rather than decoding time.
+    """
+
+    __slots__ = ('ref', 'state', '_raw_metadata', '_codec')
+
+    def __init__(
+        self,
+        ref: LabelRef,
+        raw_metadata: bytes,
+        state: State,
+        codec: JSONCodec,
+    ) -> None:
+        self.ref = intern_ref(ref)
+        self.state = State(sys.intern(state))
+        self._raw_metadata = raw_metadata
+        self._codec = codec
+
+    @classmethod
+    def from_label(cls, label: Label, codec: JSONCodec) -> 'CompactLabel':
+        """Compact a ``Label``, encoding its metadata with the given codec."""
+        return cls(label.ref, codec.dumps(label.metadata), label.state, codec)
+
+    @property
+    def metadata(self) -> Metadata:
+        """The label's metadata, decoded."""
+        return self._codec.loads(self._raw_metadata)
+
+    @property
+    def raw_metadata(self) -> bytes:
+        """The label's metadata, encoded as JSON."""
+        return self._raw_metadata
+
+    def to_label(self) -> Label:
+        """Expand into a ``Label``."""
+        return Label(ref=self.ref, metadata=self.metadata, state=self.state)
+
+    def __iter__(self) -> Iterator[Any]:
+        yield self.ref
+        yield self.metadata
+        yield self.state
+
+    def __len__(self) -> int:
+        return 3
+
+    def __getitem__(self, index: int) -> Any:
+        return (self.ref, self.metadata, self.state)[index]
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (CompactLabel, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other: Any) -> bool:
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    # Like ``Label``, whose metadata is an unhashable dict.
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return 'CompactLabel(ref={0!r}, state={1!r}, metadata=<{2} bytes>)'.format(
+            self.ref,
+            self.state,
+            len(self._raw_metadata),
+        )
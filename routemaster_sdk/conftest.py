@@ -15,3 +15,20 @@ def routemaster_api():
         api_url=TEST_API_URL,
         session=requests.Session(),
     )
+
+
+class FakeClock:
+    """A clock for time-dependent policies, which moves only when told to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        """The current time."""
+        return self.now
+
+
+@pytest.fixture()
+def clock():
+    """Create a ``FakeClock`` starting at zero."""
+    return FakeClock()
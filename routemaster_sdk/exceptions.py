@@ -1,5 +1,7 @@
 """Well known exceptions."""
 
+from typing import Optional
+
 from routemaster_sdk.types import LabelRef, StateMachine
 
 
@@ -37,3 +39,22 @@ class LabelAlreadyExists(ValueError):
 
     def __str__(self):
         return "{0}: {1}".format(self.__class__.__name__, self.label)
+
+
+class CircuitOpen(Exception):
+    """Thrown when a call is refused because its circuit breaker is open."""
+
+    def __init__(
+        self,
+        state_machine: Optional[StateMachine],
+        retry_after: float,
+    ) -> None:
+        self.state_machine = state_machine
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return "{0}: {1} (retry in {2:.1f}s)".format(
+            self.__class__.__name__,
+            self.state_machine or 'routemaster',
+            self.retry_after,
+        )
@@ -0,0 +1,136 @@
+"""Hedging of slow read requests to the routemaster API."""
+
+import math
+import threading
+import collections
+from typing import Optional, FrozenSet
+
+from routemaster_sdk.retry import RetryBudget
+
+# Read operations whose requests may be duplicated, keeping whichever
+# response arrives first.
+HEDGED_OPERATIONS = frozenset((
+    'get_status',
+    'get_state_machines',
+    'get_labels',
+    'get_label',
+))
+
+
+class LatencyTracker:
+    """
+    Percentiles of the latencies of the most recent requests.
+
+    Keeps the last ``window`` latencies, and re-sorts them to answer queries
+    only after a tenth of the window has been replaced.
+    """
+
+    def __init__(self, window: int = 1000) -> None:
+        if window < 1:
+            raise ValueError("window must be at least 1")
+
+        self.window = window
+        self._latencies = collections.deque(maxlen=window)  # type: collections.deque
+        self._sorted = sorted(self._latencies)
+        self._stale = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def observe(self, latency: float) -> None:
+        """Record the latency of a request."""
+        with self._lock:
+            self._latencies.append(latency)
+            self._stale += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The ``q``-quantile (in [0, 1]) latency, or ``None`` if none are known."""
+        with self._lock:
+            if self._stale > self.window // 10 or not self._sorted:
+                self._sorted = sorted(self._latencies)
+                self._stale = 0
+
+            if not self._sorted:
+                return None
+
+            # Nearest rank.
+            rank = max(1, int(math.ceil(q * len(self._sorted))))
+            return self._sorted[rank - 1]
+
+
+class HedgingPolicy:
+    """
+    Decides when a second request is sent for a read which is slow to answer.
+
+    If a request for one of the ``operations`` has not been answered after
+    the ``percentile`` latency of recent requests for that operation (clamped
+    to ``[min_delay, max_delay]``, and ``max_delay`` until ``min_samples``
+    latencies are known), an identical request is sent and whichever answers
+    first is used. Each extra request is drawn from a ``RetryBudget``, by
+    default one of the policy's own allowing hedges to add a tenth to the
+    load, so that a slow server is not overwhelmed by duplicate requests.
+    With a ``RateLimiter``, a hedge is only sent if it allows one immediately.
+
+    Responses to streamed requests are not hedged.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_delay: float = 0.005,
+        max_delay: float = 1.0,
+        min_samples: int = 20,
+        window: int = 1000,
+        budget: Optional[RetryBudget] = None,
+        operations: FrozenSet[str] = HEDGED_OPERATIONS,
+    ) -> None:
+        if not 0 < percentile < 1:
+            raise ValueError("percentile must be in (0, 1)")
+        if not 0 <= min_delay <= max_delay:
+            raise ValueError("min_delay must be in [0, max_delay]")
+
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.budget = budget if budget is not None else RetryBudget(ratio=0.1)
+        self.operations = operations
+
+        self._trackers = collections.defaultdict(
+            lambda: LatencyTracker(window),
+        )  # type: collections.defaultdict
+        self._lock = threading.Lock()
+
+    def _tracker(self, operation: str) -> LatencyTracker:
+        with self._lock:
+            return self._trackers[operation]
+
+    def applies(self, operation: str) -> bool:
+        """Whether requests for an operation may be hedged."""
+        return operation in self.operations
+
+    def on_request(self) -> None:
+        """Record that a call which may be hedged is being made."""
+        self.budget.deposit()
+
+    def observe(self, operation: str, latency: float) -> None:
+        """Record the latency of a request for an operation."""
+        self._tracker(operation).observe(latency)
+
+    def delay(self, operation: str) -> float:
+        """Seconds to wait for a response before hedging a request."""
+        tracker = self._tracker(operation)
+        if len(tracker) < self.min_samples:
+            return self.max_delay
+
+        latency = tracker.percentile(self.percentile)
+        if latency is None:  # pragma: no cover
+            return self.max_delay
+
+        return min(self.max_delay, max(self.min_delay, latency))
+
+    def should_hedge(self) -> bool:
+        """Take a hedge from the budget, returning whether one was available."""
+        return self.budget.withdraw()
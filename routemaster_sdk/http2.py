@@ -0,0 +1,329 @@
+"""
+HTTP/2 transports for the API wrappers, using ``httpx``.
+
+Over TLS, HTTP/2 is negotiated with the server and every request to a host
+is multiplexed over a single connection; servers which do not negotiate it
+are spoken to with HTTP/1.1 over a pool of connections as usual. Plain
+``http://`` URLs always use HTTP/1.1.
+"""
+
+import types
+import asyncio
+import threading
+from typing import Any, Dict, Mapping, Optional, cast
+
+import urllib3
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover
+    httpx = None  # type: ignore
+
+try:
+    import yarl
+    import aiohttp
+    import multidict
+except ImportError:  # pragma: no cover
+    aiohttp = None  # type: ignore
+
+DEFAULT_MAX_CONNECTIONS = 10
+
+# ``httpcore`` trace events ending a request's sending of its headers.
+_HEADERS_SENT = (
+    'send_request_headers.complete',
+    'send_request_headers.failed',
+)
+
+
+def _require_httpx() -> None:
+    if httpx is None:
+        raise ImportError("httpx is not installed")
+
+
+def _limits(max_connections: int) -> Any:
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+    )
+
+
+def _timeout(timeout: Any) -> Any:
+    """An ``httpx.Timeout`` from a ``requests`` style timeout."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
+
+
+def _connect_error(error: Exception, request: requests.PreparedRequest) -> Exception:
+    """
+    A ``requests.ConnectionError`` for a failure to connect, as urllib3 raises.
+
+    Its reason is a ``NewConnectionError``, which tells retry policies that
+    the request never reached the server.
+    """
+    reason = urllib3.exceptions.NewConnectionError(cast(Any, None), str(error))
+    return requests.ConnectionError(reason, request=request)
+
+
+def _connector_error(url: str, error: Exception) -> Exception:
+    """An ``aiohttp.ClientConnectorError`` for a failure to connect to a url."""
+    parsed = yarl.URL(url)
+    key = types.SimpleNamespace(
+        host=parsed.host,
+        port=parsed.port,
+        ssl=parsed.scheme == 'https',
+    )
+    return aiohttp.ClientConnectorError(cast(Any, key), OSError(None, str(error)))
+
+
+_VERSIONS = {'HTTP/1.0': 10, 'HTTP/1.1': 11, 'HTTP/2': 20}
+
+
+class _StreamReader:
+    """
+    File-like view of a streamed ``httpx`` response body, as ``raw``.
+
+    Like urllib3's responses, ``version_string`` is the protocol the response
+    came over, e.g. ``'HTTP/2'``, and ``version`` the same as a number.
+    """
+
+    def __init__(self, response: Any) -> None:
+        self._response = response
+        self._chunks = response.iter_bytes()
+        self._buffer = b''
+        self.version_string = response.http_version
+        self.version = _VERSIONS.get(response.http_version, 11)
+
+    def read(self, amt: Optional[int] = None, **kwargs: Any) -> bytes:
+        while amt is None or len(self._buffer) < amt:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+
+        if amt is None:
+            data, self._buffer = self._buffer, b''
+        else:
+            data, self._buffer = self._buffer[:amt], self._buffer[amt:]
+
+        if not data:
+            self.close()
+        return data
+
+    def close(self) -> None:
+        self._response.close()
+
+    def release_conn(self) -> None:
+        self.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    ``requests`` transport adapter sending requests with ``httpx``.
+
+    Mount it on a session (or use ``build_session(http2=True)``) for
+    ``RoutemasterAPI`` to multiplex its requests over one HTTP/2 connection
+    per host. ``max_connections`` bounds the connections opened to servers
+    which fall back to HTTP/1.1. TLS verification is configured with
+    ``verify`` rather than per request, and proxies are not supported.
+
+    Transport errors are raised as their ``requests`` equivalents, so retry
+    policies and circuit breakers treat them as they would otherwise.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        verify: Any = True,
+    ) -> None:
+        _require_httpx()
+        super().__init__()
+        self._client = httpx.Client(
+            http2=True,
+            limits=_limits(max_connections),
+            verify=verify,
+        )
+        # ``httpcore`` does not serialise the start of HTTP/2 streams between
+        # threads, whose headers can then reach the server out of order (or
+        # garbled) and have it close the connection. Requests hold this lock
+        # only until their headers are sent, so their responses still overlap.
+        self._headers_lock = threading.Lock()
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Any = None,
+        verify: Any = True,
+        cert: Any = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        """Send a prepared request, returning a ``requests.Response``."""
+        locked = True
+
+        def trace(event: str, info: Any) -> None:
+            nonlocal locked
+            if locked and event.endswith(_HEADERS_SENT):
+                locked = False
+                self._headers_lock.release()
+
+        self._headers_lock.acquire()
+        try:
+            sent = self._client.send(
+                self._client.build_request(
+                    request.method or 'GET',
+                    request.url or '',
+                    headers=cast(Any, request.headers),
+                    content=cast(Any, request.body),
+                    timeout=_timeout(timeout),
+                    extensions={'trace': trace},
+                ),
+                stream=True,
+            )
+        except httpx.ConnectTimeout as e:
+            raise requests.ConnectTimeout(e, request=request)
+        except httpx.ConnectError as e:
+            raise _connect_error(e, request)
+        except httpx.TimeoutException as e:
+            raise requests.ReadTimeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request)
+        finally:
+            if locked:
+                self._headers_lock.release()
+
+        response = requests.Response()
+        response.status_code = sent.status_code
+        response.headers = CaseInsensitiveDict(sent.headers.items())
+        # ``httpx`` decodes bodies itself.
+        response.headers.pop('Content-Encoding', None)
+        response.raw = _StreamReader(sent)
+        response.url = request.url or ''
+        response.reason = sent.reason_phrase
+        response.request = request
+        response.connection = self  # type: ignore
+        response.encoding = requests.utils.get_encoding_from_headers(
+            response.headers,
+        )
+        return response
+
+    def close(self) -> None:
+        """Close the adapter's connections."""
+        self._client.close()
+
+
+class _AsyncResponse:
+    """The parts of ``aiohttp.ClientResponse`` used by the async API."""
+
+    def __init__(self, method: str, url: str, response: Any) -> None:
+        self.method = method
+        self.url = url
+        self.status = response.status_code
+        self.version = aiohttp.HttpVersion(
+            *divmod(_VERSIONS.get(response.http_version, 11), 10)
+        )
+        self.headers = multidict.CIMultiDictProxy(
+            multidict.CIMultiDict(response.headers.items()),
+        )
+        self._response = response
+
+    async def __aenter__(self) -> '_AsyncResponse':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.release()
+
+    async def read(self) -> bytes:
+        """Read the whole body."""
+        try:
+            return await self._response.aread()
+        except httpx.TransportError as e:
+            raise aiohttp.ClientPayloadError(str(e))
+
+    def release(self) -> None:
+        """Release the response's stream, closing it if it is unread."""
+        if not self._response.is_closed:
+            asyncio.ensure_future(self._response.aclose())
+
+    def raise_for_status(self) -> None:
+        """Raise ``aiohttp.ClientResponseError`` for 4xx and 5xx statuses."""
+        if self.status < 400:
+            return
+
+        url = yarl.URL(self.url)
+        raise aiohttp.ClientResponseError(
+            aiohttp.RequestInfo(url, self.method, self.headers, url),
+            (),
+            status=self.status,
+            message=self._response.reason_phrase,
+            headers=self.headers,
+        )
+
+
+class AsyncHTTP2Session:
+    """
+    Stand-in for an ``aiohttp.ClientSession``, sending requests with ``httpx``.
+
+    Give it to ``AsyncRoutemasterAPI`` to multiplex its requests over one
+    HTTP/2 connection per host. Transport errors are raised as
+    ``aiohttp.ClientConnectionError`` (``ClientConnectorError`` for failures
+    to connect) or ``asyncio.TimeoutError``. Close it
+    with ``close``, or use it as an async context manager.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        verify: Any = True,
+        timeout: Optional[float] = None,
+    ) -> None:
+        _require_httpx()
+        if aiohttp is None:
+            raise ImportError("aiohttp is not installed")
+
+        self._client = httpx.AsyncClient(
+            http2=True,
+            limits=_limits(max_connections),
+            verify=verify,
+            timeout=timeout,
+        )
+
+    async def __aenter__(self) -> 'AsyncHTTP2Session':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        data: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> _AsyncResponse:
+        """Send a request, returning once its response headers arrive."""
+        request = self._client.build_request(
+            method,
+            url,
+            content=data,
+            headers=headers,
+        )
+
+        try:
+            response = await self._client.send(request, stream=True)
+        except httpx.TimeoutException as e:
+            raise asyncio.TimeoutError(str(e))
+        except httpx.ConnectError as e:
+            raise _connector_error(url, e)
+        except httpx.TransportError as e:
+            raise aiohttp.ClientConnectionError(str(e))
+
+        return _AsyncResponse(method, url, response)
+
+    async def close(self) -> None:
+        """Close the session's connections."""
+        await self._client.aclose()
@@ -0,0 +1,245 @@
+"""In-memory indexes of labels, for local queries over their states."""
+
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Set,
+    Dict,
+    List,
+    Tuple,
+    Hashable,
+    Iterable,
+    Optional,
+    cast,
+)
+
+from routemaster_sdk.api import DEFAULT_MAX_IN_FLIGHT, RoutemasterAPI
+from routemaster_sdk.types import Label, State, LabelRef, StateMachine
+from routemaster_sdk.exceptions import DeletedLabel, UnknownLabel
+
+if TYPE_CHECKING:  # pragma: no cover
+    from routemaster_sdk.snapshot import LabelSnapshot
+
+# Stands in for metadata values which are missing or cannot be indexed.
+_UNINDEXED = object()
+
+_States = Dict[StateMachine, Dict[State, Set[LabelRef]]]
+_Values = Dict[Tuple[str, Hashable], Set[LabelRef]]
+
+
+class _Entry:
+    __slots__ = ('state', 'values')
+
+    def __init__(self, state: State, values: Tuple[Any, ...]) -> None:
+        self.state = state
+        self.values = values
+
+
+class LabelIndex:
+    """
+    A thread-safe index of labels by state, and by chosen metadata keys.
+
+    Only each label's state and the values of its ``metadata_keys`` are held,
+    not its metadata. Counting the labels in a state and looking up a
+    label's state take constant time; listing the labels in a state, or with
+    a given metadata value, takes time in the number of labels listed.
+    Metadata values which are not hashable (such as lists and dicts) are
+    not indexed.
+
+    The index is filled with ``add`` (or ``fill``) from labels returned by
+    the API, from a ``LabelSnapshot`` with ``fill_from_snapshot``, or by
+    fetching a whole state machine with ``refresh``. Given to an API wrapper
+    as its ``index``, it is kept current with every label that wrapper reads,
+    creates, updates or deletes.
+    """
+
+    def __init__(self, metadata_keys: Iterable[str] = ()) -> None:
+        self.metadata_keys = tuple(metadata_keys)  # type: Tuple[str, ...]
+
+        self._entries = {}  # type: Dict[LabelRef, _Entry]
+        self._states = {}  # type: _States
+        self._values = {}  # type: _Values
+        self._lock = threading.Lock()
+
+    def _indexed_values(self, label: Label) -> Tuple[Any, ...]:
+        if not self.metadata_keys:
+            return ()
+
+        metadata = label.metadata
+        values = []
+        for key in self.metadata_keys:
+            value = metadata.get(key, _UNINDEXED)
+            try:
+                hash(value)
+            except TypeError:
+                value = _UNINDEXED
+            values.append(value)
+        return tuple(values)
+
+    def _insert(self, ref: LabelRef, entry: _Entry) -> None:
+        self._entries[ref] = entry
+        states = self._states.setdefault(ref.state_machine, {})
+        states.setdefault(entry.state, set()).add(ref)
+
+        for key, value in zip(self.metadata_keys, entry.values):
+            if value is not _UNINDEXED:
+                self._values.setdefault((key, value), set()).add(ref)
+
+    def _discard(self, ref: LabelRef) -> bool:
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return False
+
+        states = self._states[ref.state_machine]
+        refs = states[entry.state]
+        refs.discard(ref)
+        if not refs:
+            del states[entry.state]
+            if not states:
+                del self._states[ref.state_machine]
+
+        for key, value in zip(self.metadata_keys, entry.values):
+            if value is not _UNINDEXED:
+                refs = self._values[key, value]
+                refs.discard(ref)
+                if not refs:
+                    del self._values[key, value]
+
+        return True
+
+    def _discard_state_machine(self, state_machine: StateMachine) -> None:
+        for refs in list(self._states.get(state_machine, {}).values()):
+            for ref in list(refs):
+                self._discard(ref)
+
+    def add(self, label: Label) -> None:
+        """Add a label, replacing any earlier version of it."""
+        entry = _Entry(label.state, self._indexed_values(label))
+
+        with self._lock:
+            self._discard(label.ref)
+            self._insert(label.ref, entry)
+
+    def fill(self, labels: Iterable[Label]) -> None:
+        """Add many labels."""
+        for label in labels:
+            self.add(label)
+
+    def fill_from_snapshot(self, snapshot: 'LabelSnapshot') -> None:
+        """Add every label in a snapshot."""
+        # Compact labels are used in place of ``Label``, which they mimic.
+        self.fill(cast(Label, label) for label in snapshot)
+
+    def remove(self, label: LabelRef) -> bool:
+        """Remove a label, returning whether it was in the index."""
+        with self._lock:
+            return self._discard(label)
+
+    def clear(self, state_machine: Optional[StateMachine] = None) -> None:
+        """Remove every label, or every label in the given state machine."""
+        with self._lock:
+            if state_machine is None:
+                self._entries.clear()
+                self._states.clear()
+                self._values.clear()
+                return
+
+            self._discard_state_machine(state_machine)
+
+    def refresh(
+        self,
+        api: RoutemasterAPI,
+        state_machine: StateMachine,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    ) -> None:
+        """
+        Replace the labels of a state machine with those currently in the API.
+
+        Labels are listed with ``get_labels`` and fetched with
+        ``get_labels_bulk``. Labels deleted before they are fetched are left
+        out; any other error is raised, leaving the index as it was.
+        """
+        refs = api.get_labels(state_machine)
+        results = api.get_labels_bulk(refs, max_in_flight)
+
+        entries = []
+        for ref, result in zip(refs, results):
+            if isinstance(result, (DeletedLabel, UnknownLabel)):
+                continue
+            if isinstance(result, Exception):
+                raise result
+            entries.append((
+                ref,
+                _Entry(result.state, self._indexed_values(result)),
+            ))
+
+        with self._lock:
+            self._discard_state_machine(state_machine)
+            for ref, entry in entries:
+                self._insert(ref, entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, label: object) -> bool:
+        return label in self._entries
+
+    def state_of(self, label: LabelRef) -> Optional[State]:
+        """The state of a label, or ``None`` if it is not in the index."""
+        entry = self._entries.get(label)
+        return None if entry is None else entry.state
+
+    def count(self, state_machine: StateMachine, state: State) -> int:
+        """The number of labels in a state."""
+        with self._lock:
+            return len(self._states.get(state_machine, {}).get(state, ()))
+
+    def counts(self, state_machine: StateMachine) -> Dict[State, int]:
+        """The number of labels in each state of a state machine."""
+        with self._lock:
+            return {
+                state: len(refs)
+                for state, refs in self._states.get(state_machine, {}).items()
+            }
+
+    def labels_in_state(
+        self,
+        state_machine: StateMachine,
+        state: State,
+    ) -> Set[LabelRef]:
+        """The labels in a state."""
+        with self._lock:
+            return set(self._states.get(state_machine, {}).get(state, ()))
+
+    def labels_with(
+        self,
+        key: str,
+        value: Hashable,
+        state_machine: Optional[StateMachine] = None,
+        state: Optional[State] = None,
+    ) -> Set[LabelRef]:
+        """
+        The labels whose metadata has a value for an indexed key.
+
+        Optionally only those in a state machine, or in a state of it.
+        """
+        if key not in self.metadata_keys:
+            raise ValueError("Metadata key {0!r} is not indexed".format(key))
+
+        with self._lock:
+            refs = set(self._values.get((key, value), ()))  # type: Set[LabelRef]
+
+            if state is not None:
+                if state_machine is None:
+                    raise ValueError("A state needs a state machine")
+                refs &= self._states.get(state_machine, {}).get(state, set())
+            elif state_machine is not None:
+                refs = {ref for ref in refs if ref.state_machine == state_machine}
+
+        return refs
+
+    def state_machines(self) -> List[StateMachine]:
+        """The state machines with labels in the index."""
+        with self._lock:
+            return sorted(self._states)
@@ -0,0 +1,421 @@
+"""Instrumentation of calls made through the API wrappers."""
+
+import re
+import time
+import bisect
+import socket
+import threading
+from typing import Any, Dict, List, Tuple, Optional, Sequence
+
+from routemaster_sdk.calls import Call
+
+# Upper bounds of histogram buckets, in seconds.
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Timings kept per operation and state machine: the total duration of calls,
+# and the ``Call`` attributes of the same names.
+TIMINGS = ('duration', 'network_time', 'decode_time', 'build_time')
+
+
+class CallObserver:
+    """
+    Receives notifications of calls made through an API wrapper.
+
+    Subclass and override the methods of interest. ``call_finished`` gets the
+    ``Call`` with its measurements (see ``routemaster_sdk.calls.Call``), the
+    total time the call took and the exception it raised, if any.
+    ``request_finished`` is called for each request sent, including retries,
+    with its status (``None`` for a connection error) and the time it took.
+    ``prepare_headers`` may add headers to the requests for a call.
+
+    Calls served entirely from a cache are not observed.
+    """
+
+    def call_started(self, call: Call) -> None:
+        """A call has started."""
+
+    def prepare_headers(self, call: Call, headers: Dict[str, str]) -> None:
+        """Add to the headers of the requests about to be sent for a call."""
+
+    def request_finished(
+        self,
+        call: Call,
+        status: Optional[int],
+        elapsed: float,
+    ) -> None:
+        """A request for a call has completed or failed."""
+
+    def call_finished(
+        self,
+        call: Call,
+        duration: float,
+        error: Optional[BaseException],
+    ) -> None:
+        """A call has returned or raised."""
+
+
+class CompositeObserver(CallObserver):
+    """Passes notifications of calls on to each of several observers."""
+
+    def __init__(self, observers: Sequence[CallObserver]) -> None:
+        self.observers = tuple(observers)
+
+    def call_started(self, call: Call) -> None:
+        """A call has started."""
+        for observer in self.observers:
+            observer.call_started(call)
+
+    def prepare_headers(self, call: Call, headers: Dict[str, str]) -> None:
+        """Add to the headers of the requests about to be sent for a call."""
+        for observer in self.observers:
+            observer.prepare_headers(call, headers)
+
+    def request_finished(
+        self,
+        call: Call,
+        status: Optional[int],
+        elapsed: float,
+    ) -> None:
+        """A request for a call has completed or failed."""
+        for observer in self.observers:
+            observer.request_finished(call, status, elapsed)
+
+    def call_finished(
+        self,
+        call: Call,
+        duration: float,
+        error: Optional[BaseException],
+    ) -> None:
+        """A call has returned or raised."""
+        # In reverse, so that observers wrap the call like nested contexts.
+        for observer in reversed(self.observers):
+            observer.call_finished(call, duration, error)
+
+
+class Histogram:
+    """Counts of observed values falling into a fixed set of buckets."""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        # The last count is of values above the largest bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[float, int]]:
+        """Counts of values at most each bucket's bound, ending with +Inf."""
+        bounds = self.buckets + (float('inf'),)
+        counts = []  # type: List[Tuple[float, int]]
+        total = 0
+
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            counts.append((bound, total))
+
+        return counts
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimate a quantile, e.g. 0.99 for p99, as the bound of its bucket.
+
+        Values beyond the largest bucket are estimated as its bound.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = fraction * self.count
+        for bound, total in self.cumulative_counts():
+            if total >= rank:
+                return min(bound, self.buckets[-1])
+
+        return self.buckets[-1]  # pragma: no cover
+
+    def copy(self) -> 'Histogram':
+        """A snapshot of this histogram."""
+        copy = Histogram(self.buckets)
+        copy.counts = list(self.counts)
+        copy.sum = self.sum
+        copy.count = self.count
+        return copy
+
+
+# Operation and state machine ('' for calls not concerning one).
+_Key = Tuple[str, str]
+
+
+class _Metrics:
+    __slots__ = ('timings', 'statuses', 'bytes_sent', 'bytes_received')
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.timings = {name: Histogram(buckets) for name in TIMINGS}
+        self.statuses = {}  # type: Dict[str, int]
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsCollector(CallObserver):
+    """
+    Aggregates calls in memory, per operation and state machine.
+
+    Keeps a histogram of each of the total duration, network time, decode
+    time and build time of calls, a count of calls by outcome (their final
+    HTTP status, or ``error`` if they got no response) and counts of bytes
+    sent and received. ``prometheus_text`` renders them for scraping.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self._metrics = {}  # type: Dict[_Key, _Metrics]
+        self._lock = threading.Lock()
+
+    def call_finished(
+        self,
+        call: Call,
+        duration: float,
+        error: Optional[BaseException],
+    ) -> None:
+        """Record a finished call."""
+        key = (call.operation, call.state_machine or '')
+        outcome = str(call.status) if call.status is not None else 'error'
+
+        with self._lock:
+            metrics = self._metrics.get(key)
+            if metrics is None:
+                metrics = self._metrics[key] = _Metrics(self.buckets)
+
+            metrics.timings['duration'].observe(duration)
+            metrics.timings['network_time'].observe(call.network_time)
+            metrics.timings['decode_time'].observe(call.decode_time)
+            metrics.timings['build_time'].observe(call.build_time)
+            metrics.statuses[outcome] = metrics.statuses.get(outcome, 0) + 1
+            metrics.bytes_sent += call.bytes_sent
+            metrics.bytes_received += call.bytes_received
+
+    def histogram(
+        self,
+        timing: str,
+        operation: str,
+        state_machine: Optional[str] = None,
+    ) -> Histogram:
+        """A snapshot of one of the ``TIMINGS`` histograms."""
+        with self._lock:
+            metrics = self._metrics.get((operation, state_machine or ''))
+            if metrics is None:
+                return Histogram(self.buckets)
+            return metrics.timings[timing].copy()
+
+    def outcomes(
+        self,
+        operation: str,
+        state_machine: Optional[str] = None,
+    ) -> Dict[str, int]:
+        """Counts of calls by final HTTP status, or ``error``."""
+        with self._lock:
+            metrics = self._metrics.get((operation, state_machine or ''))
+            return dict(metrics.statuses) if metrics is not None else {}
+
+    def reset(self) -> None:
+        """Discard everything collected so far."""
+        with self._lock:
+            self._metrics.clear()
+
+    def prometheus_text(self, namespace: str = 'routemaster_sdk') -> str:
+        """Render the collected metrics in the Prometheus text format."""
+        with self._lock:
+            snapshot = sorted(self._metrics.items())
+
+            lines = []  # type: List[str]
+
+            for timing in TIMINGS:
+                name = '{0}_call_{1}_seconds'.format(
+                    namespace,
+                    timing.replace('_time', ''),
+                )
+                lines.append('# TYPE {0} histogram'.format(name))
+
+                for key, metrics in snapshot:
+                    lines.extend(self._histogram_lines(
+                        name,
+                        key,
+                        metrics.timings[timing],
+                    ))
+
+            name = '{0}_calls_total'.format(namespace)
+            lines.append('# TYPE {0} counter'.format(name))
+            for key, metrics in snapshot:
+                for outcome, count in sorted(metrics.statuses.items()):
+                    lines.append('{0}{{{1},outcome="{2}"}} {3}'.format(
+                        name,
+                        self._labels(key),
+                        outcome,
+                        count,
+                    ))
+
+            for direction in ('sent', 'received'):
+                name = '{0}_bytes_{1}_total'.format(namespace, direction)
+                lines.append('# TYPE {0} counter'.format(name))
+                for key, metrics in snapshot:
+                    lines.append('{0}{{{1}}} {2}'.format(
+                        name,
+                        self._labels(key),
+                        getattr(metrics, 'bytes_' + direction),
+                    ))
+
+        return '\n'.join(lines) + '\n'
+
+    def _labels(self, key: _Key) -> str:
+        operation, state_machine = key
+        return 'operation="{0}",state_machine="{1}"'.format(
+            operation,
+            _escape_label_value(state_machine),
+        )
+
+    def _histogram_lines(
+        self,
+        name: str,
+        key: _Key,
+        histogram: Histogram,
+    ) -> List[str]:
+        labels = self._labels(key)
+        lines = [
+            '{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                name,
+                labels,
+                '+Inf' if bound == float('inf') else repr(bound),
+                count,
+            )
+            for bound, count in histogram.cumulative_counts()
+        ]
+        lines.append('{0}_sum{{{1}}} {2!r}'.format(name, labels, histogram.sum))
+        lines.append('{0}_count{{{1}}} {2}'.format(name, labels, histogram.count))
+        return lines
+
+
+_UNSAFE_STATSD_CHARACTERS = re.compile(r'[^A-Za-z0-9_\-]')
+
+
+class StatsdObserver(CallObserver):
+    """
+    Sends the measurements of each call to a StatsD server, over UDP.
+
+    Metrics are named ``<prefix>.<state machine>.<operation>.<metric>``, with
+    ``_global`` standing in for the state machine of calls not concerning
+    one. Timings are sent in milliseconds, alongside counters of outcomes and
+    of bytes sent and received. Failures to send are ignored.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 8125,
+        prefix: str = 'routemaster_sdk',
+    ) -> None:
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def close(self) -> None:
+        """Close the socket used to send metrics."""
+        self._socket.close()
+
+    def lines(self, call: Call, duration: float) -> List[str]:
+        """The StatsD lines describing a finished call."""
+        name = '{0}.{1}.{2}'.format(
+            self.prefix,
+            _UNSAFE_STATSD_CHARACTERS.sub('_', call.state_machine or '_global'),
+            call.operation,
+        )
+        outcome = str(call.status) if call.status is not None else 'error'
+
+        return [
+            '{0}.duration:{1:.3f}|ms'.format(name, duration * 1000),
+            '{0}.network:{1:.3f}|ms'.format(name, call.network_time * 1000),
+            '{0}.decode:{1:.3f}|ms'.format(name, call.decode_time * 1000),
+            '{0}.build:{1:.3f}|ms'.format(name, call.build_time * 1000),
+            '{0}.outcome.{1}:1|c'.format(name, outcome),
+            '{0}.bytes_sent:{1}|c'.format(name, call.bytes_sent),
+            '{0}.bytes_received:{1}|c'.format(name, call.bytes_received),
+        ]
+
+    def call_finished(
+        self,
+        call: Call,
+        duration: float,
+        error: Optional[BaseException],
+    ) -> None:
+        """Send the measurements of a finished call."""
+        packet = '\n'.join(self.lines(call, duration)).encode('utf-8')
+
+        try:
+            self._socket.sendto(packet, self.address)
+        except OSError:
+            pass
+
+
+class Observation:
+    """
+    Reports a call to an observer, as a context manager around the call.
+
+    A generator stopped before it is exhausted (e.g. ``iter_labels``) is not
+    reported as having failed.
+    """
+
+    __slots__ = ('observer', 'call', 'started_at')
+
+    def __init__(self, observer: CallObserver, call: Call) -> None:
+        self.observer = observer
+        self.call = call
+        self.started_at = 0.0
+
+    def __enter__(self) -> None:
+        self.started_at = time.perf_counter()
+        self.observer.call_started(self.call)
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        self.observer.call_finished(
+            self.call,
+            time.perf_counter() - self.started_at,
+            None if exc_type is GeneratorExit else exc,
+        )
+
+
+class NullObservation:
+    """Stands in for an ``Observation`` when there is no observer."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> None:
+        pass
+
+
+NULL_OBSERVATION = NullObservation()
@@ -0,0 +1,400 @@
+"""Durable, asynchronous delivery of label mutations."""
+
+import time
+import logging
+import sqlite3
+import threading
+from typing import Any, List, Tuple, Callable, Optional, NamedTuple, cast
+
+import requests
+
+from routemaster_sdk.api import (
+    DEFAULT_MAX_IN_FLIGHT,
+    RoutemasterAPI,
+    _run_bulk,
+)
+from routemaster_sdk.types import LabelRef, Metadata, LabelName, StateMachine
+from routemaster_sdk.exceptions import CircuitOpen, LabelAlreadyExists
+
+logger = logging.getLogger(__name__)
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mutations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    state_machine TEXT NOT NULL,
+    label TEXT NOT NULL,
+    operation TEXT NOT NULL,
+    metadata BLOB,
+    queued_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# The oldest mutation of each label; only these may be sent, so that the
+# mutations of a label are delivered in order.
+_SELECT_HEADS = """
+SELECT id, state_machine, label, operation, metadata, queued_at, attempts
+FROM mutations
+WHERE id IN (SELECT MIN(id) FROM mutations GROUP BY state_machine, label)
+ORDER BY id
+LIMIT ?
+"""
+
+Mutation = NamedTuple('Mutation', [
+    ('id', int),
+    ('operation', str),
+    ('label', LabelRef),
+    # The metadata to create or update the label with, ``None`` for deletions.
+    ('metadata', Optional[Metadata]),
+    ('queued_at', float),
+    # The number of earlier attempts to deliver the mutation which routemaster
+    # answered with an error, see ``MutationOutbox.max_attempts``.
+    ('attempts', int),
+])
+
+# Called with each mutation dropped because it can never be delivered, and
+# the exception which its delivery raised.
+ErrorCallback = Callable[[Mutation, Exception], None]
+
+_Dropped = List[Tuple[Mutation, Exception]]
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether a failed delivery may succeed if it is retried later."""
+    if isinstance(error, CircuitOpen):
+        return True
+
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        if response is None:
+            return True
+        return response.status_code == 429 or response.status_code >= 500
+
+    return isinstance(error, requests.RequestException)
+
+
+class MutationOutbox:
+    """
+    Queues label mutations in a local file and delivers them in the background.
+
+    ``create_label``, ``update_label`` and ``delete_label`` record the
+    mutation in an SQLite database at ``path`` and return at once, so the
+    caller does not wait for routemaster, and does not fail if it is down.
+    A background thread replays the queue: mutations of different labels are
+    sent concurrently, up to ``max_in_flight`` at once, while those of one
+    label are sent strictly in the order they were queued.
+
+    Delivery is at least once. A mutation is removed from the queue only
+    after routemaster has applied it, so one may be sent again if the process
+    stops in between. The replay allows for this: a creation finding that its
+    label already exists is taken to have been delivered before, as is a
+    deletion, which routemaster accepts again for a deleted label.
+
+    Mutations which fail with connection errors, 5xx or 429 responses, or
+    while the API wrapper's circuit breaker is open stay queued, and the
+    label's later mutations wait behind them. Delivery of the queue is then
+    retried after ``retry_interval`` seconds, doubling after each further
+    failure up to ``max_retry_interval``; queuing more mutations does not cut
+    the wait short. Mutations which can never succeed, such as updates of
+    deleted labels, are dropped and passed to ``on_error``, as are those
+    which routemaster has answered with 5xx or 429 responses
+    ``max_attempts`` times. Connection errors and an open circuit do not
+    count towards ``max_attempts``, so mutations are kept while routemaster
+    is down, for however long.
+
+    Mutations still queued when the outbox is closed are delivered by the
+    next outbox opened on the same file.
+
+    The background thread logs, rather than dies of, errors in delivering
+    the queue, including any raised by ``on_error``, and tries again after
+    a backoff.
+    """
+
+    def __init__(
+        self,
+        api: RoutemasterAPI,
+        path: str,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 60.0,
+        max_attempts: Optional[int] = 10,
+        on_error: Optional[ErrorCallback] = None,
+        background: bool = True,
+    ) -> None:
+        if not 0 < retry_interval <= max_retry_interval:
+            raise ValueError("retry_interval must be in (0, max_retry_interval]")
+        if max_attempts is not None and max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        self.api = api
+        self.path = path
+        self.max_in_flight = max_in_flight
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.max_attempts = max_attempts
+        self.on_error = on_error
+
+        self._db = sqlite3.connect(
+            path,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(_SCHEMA)
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition()
+        self._drain_lock = threading.Lock()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._closed = False
+        self._background = background
+
+        if self.pending():
+            self._wake()
+
+    def __enter__(self) -> 'MutationOutbox':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def create_label(self, label: LabelRef, metadata: Metadata) -> int:
+        """Queue the creation of a label, see ``RoutemasterAPI.create_label``."""
+        return self._enqueue(CREATE, label, metadata)
+
+    def update_label(self, label: LabelRef, metadata: Metadata) -> int:
+        """Queue an update to a label, see ``RoutemasterAPI.update_label``."""
+        return self._enqueue(UPDATE, label, metadata)
+
+    def delete_label(self, label: LabelRef) -> int:
+        """Queue the deletion of a label, see ``RoutemasterAPI.delete_label``."""
+        return self._enqueue(DELETE, label, None)
+
+    def pending(self) -> int:
+        """The number of mutations waiting to be delivered."""
+        with self._lock:
+            count, = self._db.execute('SELECT COUNT(*) FROM mutations').fetchone()
+        return count
+
+    def drain(self) -> bool:
+        """
+        Deliver queued mutations until the queue is empty or delivery fails.
+
+        Returns whether the queue was emptied; if not, some mutations failed
+        with transient errors and remain queued.
+        """
+        with self._drain_lock:
+            return self._drain() is None
+
+    def close(self) -> None:
+        """Stop delivering mutations and close the queue's file."""
+        with self._condition:
+            self._closed = True
+            thread = self._thread
+            self._condition.notify()
+
+        if thread is not None:
+            thread.join()
+
+        with self._lock:
+            self._db.close()
+
+    def _enqueue(
+        self,
+        operation: str,
+        label: LabelRef,
+        metadata: Optional[Metadata],
+    ) -> int:
+        encoded = None if metadata is None else self.api.codec.dumps(metadata)
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot queue mutations in a closed outbox")
+
+            cursor = self._db.execute(
+                'INSERT INTO mutations '
+                '(state_machine, label, operation, metadata, queued_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (label.state_machine, label.name, operation, encoded, time.time()),
+            )
+
+        self._wake()
+        return cast(int, cursor.lastrowid)
+
+    def _wake(self) -> None:
+        if not self._background:
+            return
+
+        with self._condition:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='routemaster-outbox',
+                    daemon=True,
+                )
+                self._thread.start()
+
+            self._condition.notify()
+
+    def _run(self) -> None:
+        delay = None  # type: Optional[float]
+        not_before = 0.0
+
+        while True:
+            with self._condition:
+                # Queued mutations notify the condition too, so wait out any
+                # backoff in full; only closing the outbox cuts it short.
+                while not self._closed:
+                    wait = not_before - time.monotonic()
+                    if wait > 0:
+                        self._condition.wait(wait)
+                    elif self.pending():
+                        break
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+
+            with self._drain_lock:
+                try:
+                    retry_after = self._drain()
+                except Exception:
+                    logger.exception("Failed to deliver queued mutations")
+                    retry_after = 0.0
+
+            if retry_after is None:
+                delay = None
+            else:
+                backoff = self.retry_interval if delay is None else min(
+                    self.max_retry_interval,
+                    delay * 2,
+                )
+                delay = max(backoff, retry_after)
+                not_before = time.monotonic() + delay
+
+    def _heads(self) -> List[Mutation]:
+        with self._lock:
+            if self._closed:
+                return []
+            rows = self._db.execute(
+                _SELECT_HEADS,
+                (self.max_in_flight * 2,),
+            ).fetchall()
+
+        return [
+            Mutation(
+                id,
+                operation,
+                LabelRef(LabelName(name), StateMachine(state_machine)),
+                None if metadata is None else self.api.codec.loads(metadata),
+                queued_at,
+                attempts,
+            )
+            for id, state_machine, name, operation, metadata, queued_at, attempts
+            in rows
+        ]
+
+    def _drain(self) -> Optional[float]:
+        """
+        Deliver mutations until none are left or some fail transiently.
+
+        Returns ``None`` once the queue is empty, otherwise the least time to
+        wait before retrying.
+        """
+        while True:
+            heads = self._heads()
+            if not heads:
+                return None
+
+            results = _run_bulk(self._deliver, heads, self.max_in_flight)
+
+            done = []  # type: List[int]
+            dropped = []  # type: _Dropped
+            # Those which routemaster answered with an error, which count
+            # towards ``max_attempts``; others never reached it.
+            answered = []  # type: List[int]
+            retry_after = None  # type: Optional[float]
+
+            for mutation, result in zip(heads, results):
+                if result is None:
+                    done.append(mutation.id)
+                elif is_transient(result) and not self._out_of_attempts(
+                    mutation,
+                    result,
+                ):
+                    if isinstance(result, requests.HTTPError):
+                        answered.append(mutation.id)
+                    wait = getattr(result, 'retry_after', 0.0)
+                    retry_after = wait if retry_after is None else max(
+                        retry_after,
+                        wait,
+                    )
+                else:
+                    done.append(mutation.id)
+                    dropped.append((mutation, result))
+
+            with self._lock:
+                if self._closed:
+                    return None
+                self._db.execute('BEGIN')
+                self._db.executemany(
+                    'DELETE FROM mutations WHERE id = ?',
+                    [(id,) for id in done],
+                )
+                self._db.executemany(
+                    'UPDATE mutations SET attempts = attempts + 1 WHERE id = ?',
+                    [(id,) for id in answered],
+                )
+                self._db.execute('COMMIT')
+
+            for mutation, error in dropped:
+                self._report(mutation, error)
+
+            if retry_after is not None:
+                return retry_after
+
+    def _report(self, mutation: Mutation, error: Exception) -> None:
+        """Pass a dropped mutation to ``on_error``, which may not stop delivery."""
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(mutation, error)
+        except Exception:
+            logger.exception("on_error failed for mutation %d", mutation.id)
+
+    def _out_of_attempts(self, mutation: Mutation, error: Exception) -> bool:
+        """Whether a mutation routemaster keeps failing should be dropped."""
+        if self.max_attempts is None:
+            return False
+        if not isinstance(error, requests.HTTPError):
+            # Routemaster could not be reached; it has not failed the mutation.
+            return False
+        return mutation.attempts + 1 >= self.max_attempts
+
+    def _deliver(self, mutation: Mutation) -> None:
+        """Apply a mutation, raising if it has not been applied."""
+        label = mutation.label
+
+        try:
+            if mutation.operation == CREATE:
+                self.api.create_label(label, self._metadata(mutation))
+            elif mutation.operation == UPDATE:
+                self.api.update_label(label, self._metadata(mutation))
+            elif mutation.operation == DELETE:
+                self.api.delete_label(label)
+            else:
+                raise ValueError(
+                    "Unknown mutation {0!r}".format(mutation.operation),
+                )
+        except LabelAlreadyExists:
+            if mutation.operation != CREATE:
+                raise
+
+    def _metadata(self, mutation: Mutation) -> Metadata:
+        if mutation.metadata is None:
+            raise ValueError("Mutation {0} has no metadata".format(mutation.id))
+        return mutation.metadata
@@ -0,0 +1,217 @@
+"""Client-side limiting of the rate of requests to the routemaster API."""
+
+import time
+import threading
+from typing import Dict, List, Mapping, Callable, Optional
+
+from routemaster_sdk.types import StateMachine
+
+TOO_MANY_REQUESTS = 429
+
+
+class _Bucket:
+    __slots__ = (
+        'limit',
+        'rate',
+        'capacity',
+        'tokens',
+        'updated_at',
+        'paused_until',
+    )
+
+    def __init__(self, limit: Optional[float], burst: float, now: float) -> None:
+        # The configured rate, ``None`` if unlimited, and the current rate.
+        self.limit = limit
+        self.rate = limit or 0.0
+        self.capacity = max(1.0, (limit or 0.0) * burst)
+        self.tokens = self.capacity
+        self.updated_at = now
+        self.paused_until = now
+
+    def refill(self, now: float, recovery_time: float) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.updated_at = now
+
+        if self.limit is not None:
+            self.rate = min(
+                self.limit,
+                self.rate + self.limit * elapsed / recovery_time,
+            )
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+
+    def reserve(self, now: float) -> float:
+        """Take a token, returning the seconds to wait before using it."""
+        wait = max(0.0, self.paused_until - now)
+
+        if self.limit is not None:
+            self.tokens -= 1
+            if self.tokens < 0:
+                wait = max(wait, -self.tokens / self.rate)
+
+        return wait
+
+    def available(self, now: float) -> bool:
+        """Whether a token may be taken without waiting."""
+        if self.paused_until > now:
+            return False
+        return self.limit is None or self.tokens >= 1
+
+    def throttle(
+        self,
+        now: float,
+        retry_after: Optional[float],
+        factor: float,
+        min_factor: float,
+    ) -> None:
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+        if self.limit is not None:
+            self.rate = max(self.limit * min_factor, self.rate * factor)
+            self.tokens = min(self.tokens, 0.0)
+
+
+_Buckets = Dict[StateMachine, _Bucket]
+
+
+class RateLimiter:
+    """
+    Token buckets limiting the rate at which requests are sent.
+
+    ``rate`` limits the requests per second made through the API wrapper as a
+    whole, and ``state_machine_rates`` those concerning individual state
+    machines, with ``default_state_machine_rate`` applying to any others.
+    ``None`` leaves a rate unlimited. Each bucket allows bursts of up to
+    ``burst`` seconds' worth of requests.
+
+    Requests wait (blocking in ``RoutemasterAPI``, awaiting in
+    ``AsyncRoutemasterAPI``) until every bucket they draw from allows them;
+    waiting requests are released in the order in which they arrived.
+
+    The limits adapt to the server: a 429 response multiplies the current
+    rate of its state machine's bucket (or the global one, for calls not
+    concerning a state machine) by ``backoff_factor``, down to ``min_factor``
+    of its configured rate, and pauses the bucket for the response's
+    ``Retry-After`` if it has one, even where no rate is configured. Rates
+    then recover linearly to their configured values over ``recovery_time``
+    seconds.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        state_machine_rates: Optional[Mapping[StateMachine, float]] = None,
+        default_state_machine_rate: Optional[float] = None,
+        burst: float = 1.0,
+        backoff_factor: float = 0.5,
+        min_factor: float = 0.1,
+        recovery_time: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        rates = [rate, default_state_machine_rate]
+        rates.extend((state_machine_rates or {}).values())
+        if any(limit is not None and limit <= 0 for limit in rates):
+            raise ValueError("Rates must be positive")
+        if not 0 < backoff_factor <= 1:
+            raise ValueError("backoff_factor must be in (0, 1]")
+        if recovery_time <= 0:
+            raise ValueError("recovery_time must be positive")
+
+        self.rate = rate
+        self.state_machine_rates = dict(state_machine_rates or {})
+        self.default_state_machine_rate = default_state_machine_rate
+        self.burst = burst
+        self.backoff_factor = backoff_factor
+        self.min_factor = min_factor
+        self.recovery_time = recovery_time
+        self._clock = clock
+
+        self._global = _Bucket(rate, burst, clock())
+        self._buckets = {}  # type: _Buckets
+        self._lock = threading.Lock()
+
+    def _buckets_for(
+        self,
+        state_machine: Optional[StateMachine],
+        now: float,
+    ) -> List[_Bucket]:
+        if state_machine is None:
+            return [self._global]
+
+        bucket = self._buckets.get(state_machine)
+        if bucket is None:
+            limit = self.state_machine_rates.get(
+                state_machine,
+                self.default_state_machine_rate,
+            )
+            bucket = self._buckets[state_machine] = _Bucket(
+                limit,
+                self.burst,
+                now,
+            )
+
+        return [self._global, bucket]
+
+    def acquire(self, state_machine: Optional[StateMachine]) -> float:
+        """
+        Reserve the sending of a request.
+
+        Returns the seconds the caller must wait before sending it.
+        """
+        with self._lock:
+            now = self._clock()
+            wait = 0.0
+            for bucket in self._buckets_for(state_machine, now):
+                bucket.refill(now, self.recovery_time)
+                wait = max(wait, bucket.reserve(now))
+            return wait
+
+    def try_acquire(self, state_machine: Optional[StateMachine]) -> bool:
+        """
+        Reserve the sending of a request only if it may be sent immediately.
+
+        Returns whether it was reserved. For optional requests, such as
+        hedges, which are better not sent than delayed.
+        """
+        with self._lock:
+            now = self._clock()
+            buckets = self._buckets_for(state_machine, now)
+            for bucket in buckets:
+                bucket.refill(now, self.recovery_time)
+            if not all(bucket.available(now) for bucket in buckets):
+                return False
+            for bucket in buckets:
+                bucket.reserve(now)
+            return True
+
+    def record(
+        self,
+        state_machine: Optional[StateMachine],
+        status: int,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Record the status of a response, adapting to 429s."""
+        if status != TOO_MANY_REQUESTS:
+            return
+
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets_for(state_machine, now)[-1]
+            bucket.refill(now, self.recovery_time)
+            bucket.throttle(
+                now,
+                retry_after,
+                self.backoff_factor,
+                self.min_factor,
+            )
+
+    def current_rate(
+        self,
+        state_machine: Optional[StateMachine] = None,
+    ) -> Optional[float]:
+        """The current, possibly reduced, rate of a bucket (or the global one)."""
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets_for(state_machine, now)[-1]
+            bucket.refill(now, self.recovery_time)
+            return bucket.rate if bucket.limit is not None else None
@@ -0,0 +1,187 @@
+"""Retrying of failed requests to the routemaster API."""
+
+import time
+import random
+import threading
+from typing import Callable, Optional, FrozenSet
+
+# Operations which may be repeated without changing their outcome.
+IDEMPOTENT_OPERATIONS = frozenset((
+    'get_status',
+    'get_state_machines',
+    'get_labels',
+    'iter_labels',
+    'get_label',
+    'delete_label',
+))
+
+# Operations which are safe to repeat even if an earlier attempt may have
+# reached the server. A repeated ``create_label`` which gets a 409 is
+# recognised by the client as the earlier attempt having succeeded.
+RETRY_SAFE_OPERATIONS = IDEMPOTENT_OPERATIONS | frozenset(('create_label',))
+
+# Statuses which indicate a transient failure.
+RETRYABLE_STATUSES = frozenset((429, 502, 503, 504))
+
+# Statuses which indicate that the server did not process the request, so
+# that even unsafe operations may be retried.
+UNPROCESSED_STATUSES = frozenset((429, 503))
+
+
+class RetryBudget:
+    """
+    Limit on the rate of retries, relative to the rate of requests.
+
+    Each request deposits ``ratio`` of a retry into the budget, and each retry
+    withdraws a whole one, so that retries add at most ``ratio`` extra load
+    while the server is failing. A floor of ``min_per_second`` retries is
+    always available so that quiet clients can still retry. The balance is
+    capped so an idle period cannot bank an unbounded burst of retries.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.2,
+        min_per_second: float = 1.0,
+        max_balance: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._clock = clock
+
+        self._balance = max_balance
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount: float) -> None:
+        now = self._clock()
+        amount += (now - self._updated_at) * self.min_per_second
+        self._updated_at = now
+        self._balance = min(self.max_balance, self._balance + amount)
+
+    def deposit(self) -> None:
+        """Record that a request (not a retry) is being made."""
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take a retry from the budget, returning whether one was available."""
+        with self._lock:
+            self._refill(0)
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+# Shared between all retry policies which are not given their own budget, so
+# that the total retry rate of the process is bounded.
+DEFAULT_BUDGET = RetryBudget()
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is retried.
+
+    Only failures which are transient are retried: connection errors and the
+    ``retry_statuses``. Operations not in ``RETRY_SAFE_OPERATIONS`` (i.e.
+    ``update_label``) are only retried if the request certainly did not reach
+    the server, or was refused by it unprocessed (HTTP 429 or 503).
+
+    Retries wait for an exponentially increasing delay, with full jitter, and
+    are drawn from a ``RetryBudget`` which is shared process-wide by default.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_base: float = 0.1,
+        backoff_max: float = 5.0,
+        budget: Optional[RetryBudget] = None,
+        retry_statuses: FrozenSet[int] = RETRYABLE_STATUSES,
+        rng: Callable[[], float] = random.random,
+    ) -> None:
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget = budget if budget is not None else DEFAULT_BUDGET
+        self.retry_statuses = retry_statuses
+        self._rng = rng
+
+    def on_request(self) -> None:
+        """Record that a new request (not a retry) is being made."""
+        self.budget.deposit()
+
+    def is_retryable(
+        self,
+        operation: str,
+        status: Optional[int] = None,
+        sent: bool = True,
+    ) -> bool:
+        """
+        Whether a failure of the given operation may be retried at all.
+
+        Pass ``status`` for a failed response, or ``sent`` for a connection
+        error to indicate whether the request may have reached the server.
+        """
+        safe = operation in RETRY_SAFE_OPERATIONS
+
+        if status is None:
+            return safe or not sent
+
+        if status not in self.retry_statuses:
+            return False
+
+        return safe or status in UNPROCESSED_STATUSES
+
+    def should_retry(
+        self,
+        operation: str,
+        attempt: int,
+        status: Optional[int] = None,
+        sent: bool = True,
+    ) -> bool:
+        """
+        Whether to retry after the given attempt (counting from 1) failed.
+
+        Withdraws from the retry budget if the answer is yes.
+        """
+        if attempt >= self.max_attempts:
+            return False
+
+        if not self.is_retryable(operation, status=status, sent=sent):
+            return False
+
+        return self.budget.withdraw()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        The delay before retrying after the given attempt (counting from 1).
+
+        A ``Retry-After`` from the server is respected as a lower bound, up to
+        ``backoff_max``.
+        """
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        delay = self._rng() * ceiling
+
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+
+        return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a ``Retry-After`` header given in seconds, if present."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        # HTTP dates are not worth the complexity of supporting here.
+        return None
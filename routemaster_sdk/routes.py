@@ -0,0 +1,71 @@
+"""Precompiled URL templates for the routemaster API's endpoints."""
+
+import re
+import urllib.parse
+from typing import Dict
+
+from routemaster_sdk.types import LabelRef, StateMachine
+
+DEFAULT_MAX_PREFIXES = 1024
+
+_Prefixes = Dict[StateMachine, str]
+
+# Values made only of these characters are the same once quoted.
+_UNRESERVED = re.compile(r'[A-Za-z0-9_.~-]*')
+
+# Dot segments, which would be removed from the path rather than sent.
+_DOT_SEGMENTS = {'.': '%2E', '..': '%2E%2E'}
+
+
+def quote_segment(value: str) -> str:
+    """Percent-encode a value as a single path segment, including any ``/``."""
+    if _UNRESERVED.fullmatch(value):
+        return _DOT_SEGMENTS.get(value, value)
+    return urllib.parse.quote(value, safe='')
+
+
+class Routes:
+    """
+    The URLs of an API instance's endpoints.
+
+    The fixed parts of every URL are resolved against the API's base url once,
+    and the encoded labels url of up to ``max_prefixes`` state machines is
+    cached, so that building a label's url is a quote and a concatenation.
+    State machine and label names are encoded as single path segments, so
+    names containing ``/``, ``?``, ``#`` or ``%`` address the right resource.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        max_prefixes: int = DEFAULT_MAX_PREFIXES,
+    ) -> None:
+        self.api_url = api_url
+        self.root = urllib.parse.urljoin(api_url, '')
+        self.state_machines = urllib.parse.urljoin(api_url, 'state-machines')
+        self.max_prefixes = max_prefixes
+        self._prefixes = {}  # type: _Prefixes
+
+    def state_machine(self, state_machine: StateMachine) -> str:
+        """The url of a state machine's labels."""
+        try:
+            return self._prefixes[state_machine]
+        except KeyError:
+            pass
+
+        prefix = '/'.join((
+            self.state_machines,
+            quote_segment(state_machine),
+            'labels',
+        ))
+        if len(self._prefixes) >= self.max_prefixes:
+            # State machines are few in practice; this only bounds the memory
+            # used by a caller iterating over arbitrary names.
+            self._prefixes.clear()
+        self._prefixes[state_machine] = prefix
+        return prefix
+
+    def label(self, label: LabelRef) -> str:
+        """The url of a label."""
+        prefix = self.state_machine(label.state_machine)
+        return prefix + '/' + quote_segment(label.name)
@@ -0,0 +1,222 @@
+"""Construction and inspection of HTTP sessions for the routemaster API."""
+
+import os
+import socket
+import threading
+import collections
+from typing import Any, List, Callable, NamedTuple
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_MAX_RETRIES = 2
+
+PoolStats = NamedTuple('PoolStats', [
+    ('host', str),
+    ('max_size', int),
+    ('in_use', int),
+    ('idle', int),
+    ('connections_created', int),
+    ('requests_made', int),
+])
+
+
+class TunedHTTPAdapter(HTTPAdapter):
+    """
+    ``HTTPAdapter`` which can enable TCP keep-alive on its connections.
+
+    Connection-level retries are configured through ``max_retries`` as usual;
+    by default only connection failures and idempotent requests are retried.
+    """
+
+    def __init__(self, keepalive: bool = True, **kwargs) -> None:
+        self.keepalive = keepalive
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        """Initialise the pool manager, with socket options for keep-alive."""
+        if self.keepalive:
+            socket_options = list(HTTPConnection.default_socket_options)
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+            kwargs.setdefault('socket_options', socket_options)
+        super().init_poolmanager(*args, **kwargs)
+
+
+class ThreadLocalSession(requests.Session):
+    """
+    ``requests.Session`` which is safe to share between threads.
+
+    Each thread sends its requests through a ``requests.Session`` of its own,
+    configured as this one (headers, auth, TLS options and so on) but without
+    cookies of its own, over this session's adapters. The adapters' connection
+    pools are thread-safe, so connections are reused across all threads.
+
+    After a fork, the first request in the child replaces the adapters with
+    new ones from ``adapter_factory``, so that the child never uses the
+    sockets it inherited from its parent.
+    """
+
+    def __init__(self, adapter_factory: Callable[[], BaseAdapter]) -> None:
+        super().__init__()
+        self._adapter_factory = adapter_factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pid = 0
+        self._mount_adapters()
+
+    def _mount_adapters(self) -> None:
+        adapter = self._adapter_factory()
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+        self._pid = os.getpid()
+        self._generation += 1
+
+    def _thread_session(self) -> requests.Session:
+        """The calling thread's session, made or remade as needed."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Abandon, rather than close, the parent's connections.
+                    self._mount_adapters()
+
+        local = self._local
+        if getattr(local, 'generation', None) == self._generation:
+            return local.session
+
+        session = requests.Session()
+        for attr in self.__attrs__:
+            if attr not in ('cookies', 'adapters'):
+                setattr(session, attr, getattr(self, attr))
+        session.adapters = collections.OrderedDict(self.adapters)
+
+        local.session = session
+        local.generation = self._generation
+        return session
+
+    def request(  # type: ignore
+        self,
+        method: str,
+        url: str,
+        *args: Any,
+        **kwargs: Any
+    ) -> requests.Response:
+        """Send a request through the calling thread's session."""
+        return self._thread_session().request(method, url, *args, **kwargs)
+
+    def close(self) -> None:
+        """Close the connection pools shared by all threads."""
+        with self._lock:
+            super().close()
+
+
+def _build_adapter(
+    pool_size: int,
+    pool_block: bool,
+    keepalive: bool,
+    max_retries: int,
+) -> TunedHTTPAdapter:
+    return TunedHTTPAdapter(
+        keepalive=keepalive,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        pool_block=pool_block,
+        max_retries=Retry(
+            total=max_retries,
+            status=0,
+            backoff_factor=0.1,
+            raise_on_status=False,
+        ),
+    )
+
+
+def build_session(
+    pool_size: int = DEFAULT_POOL_SIZE,
+    pool_block: bool = False,
+    keepalive: bool = True,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    thread_local: bool = False,
+    http2: bool = False,
+) -> requests.Session:
+    """
+    Build a ``requests.Session`` with a connection pool tuned for routemaster.
+
+    - ``pool_size`` connections are kept open to each host, which should be at
+      least the number of threads making requests concurrently.
+    - ``pool_block`` makes requests wait for a free connection rather than open
+      an extra one which is thrown away after use.
+    - ``keepalive`` enables TCP keep-alive probes on idle connections; when
+      disabled connections are also closed after each request.
+    - ``max_retries`` bounds the retries of connection failures (and failures
+      reading the response to idempotent requests) at the adapter level.
+    - ``thread_local`` builds a ``ThreadLocalSession``, which may be shared
+      between threads and survives forks.
+    - ``http2`` sends requests with ``routemaster_sdk.http2.HTTP2Adapter``
+      (which needs ``httpx``), multiplexing them over one HTTP/2 connection
+      per host where the server supports it. ``pool_size`` then bounds the
+      connections to servers which only speak HTTP/1.1; ``pool_block`` and
+      ``max_retries`` are not supported.
+    """
+    def adapter_factory() -> BaseAdapter:
+        if http2:
+            from routemaster_sdk.http2 import HTTP2Adapter
+            return HTTP2Adapter(max_connections=pool_size)
+        return _build_adapter(pool_size, pool_block, keepalive, max_retries)
+
+    if thread_local:
+        session = ThreadLocalSession(adapter_factory)  # type: requests.Session
+    else:
+        session = requests.Session()
+        adapter = adapter_factory()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+    if not keepalive:
+        session.headers['Connection'] = 'close'
+
+    return session
+
+
+def connection_pool_stats(session: requests.Session) -> List[PoolStats]:
+    """
+    Point in time usage of each connection pool held by a session's adapters.
+
+    ``in_use`` reaching ``max_size`` means a pool is saturated: further
+    requests either block (``pool_block=True``) or open an extra connection
+    which is discarded afterwards. ``connections_created`` growing in step
+    with ``requests_made`` is a sign that connections are not being reused.
+    """
+    stats = []  # type: List[PoolStats]
+    seen = set()
+
+    for adapter in session.adapters.values():
+        if not isinstance(adapter, HTTPAdapter) or id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        with pools.lock:
+            connection_pools = list(pools._container.values())
+
+        for pool in connection_pools:
+            queue = pool.pool
+            if queue is None:
+                # Closed pool.
+                continue
+
+            available = queue.qsize()
+            idle = sum(1 for conn in list(queue.queue) if conn is not None)
+
+            stats.append(PoolStats(
+                host='{0}://{1}:{2}'.format(pool.scheme, pool.host, pool.port),
+                max_size=queue.maxsize,
+                in_use=queue.maxsize - available,
+                idle=idle,
+                connections_created=pool.num_connections,
+                requests_made=pool.num_requests,
+            ))
+
+    return stats
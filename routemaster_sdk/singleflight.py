@@ -0,0 +1,88 @@
+"""Collapsing of concurrent identical calls into one."""
+
+import asyncio
+import threading
+import concurrent.futures
+from typing import Any, Dict, TypeVar, Callable, Hashable, Awaitable
+
+R = TypeVar('R')
+
+# The running call for each key, by thread or by coroutine.
+_Flights = Dict[Hashable, concurrent.futures.Future]
+_AsyncFlights = Dict[Hashable, asyncio.Future]
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time, sharing its outcome.
+
+    A thread calling ``do`` while another call with the same key is running
+    waits for that call instead, and gets its result or exception. Calls
+    made after it finishes run afresh; nothing is cached.
+    """
+
+    def __init__(self) -> None:
+        self._flights = {}  # type: _Flights
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], R]) -> R:
+        """Call ``func``, or join a running call with the same key."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if flight is None:
+                flight = self._flights[key] = concurrent.futures.Future()
+
+        if not leader:
+            return flight.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def in_flight(self) -> int:
+        """The number of keys with a call running."""
+        with self._lock:
+            return len(self._flights)
+
+
+class AsyncSingleFlight:
+    """
+    Runs at most one coroutine per key at a time, sharing its outcome.
+
+    As ``SingleFlight``, for coroutines on one event loop. The shared call
+    runs as a task of its own, so that it is not cancelled while others are
+    waiting for it if the caller which started it is cancelled.
+    """
+
+    def __init__(self) -> None:
+        self._flights = {}  # type: _AsyncFlights
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[R]]) -> R:
+        """Await ``func()``, or join a running call with the same key."""
+        flight = self._flights.get(key)
+
+        if flight is None:
+            flight = self._flights[key] = asyncio.ensure_future(func())
+
+            def finished(task: Any) -> None:
+                del self._flights[key]
+                # Mark the exception as retrieved, should no caller be left.
+                if not task.cancelled():
+                    task.exception()
+
+            flight.add_done_callback(finished)
+
+        return await asyncio.shield(flight)
+
+    def in_flight(self) -> int:
+        """The number of keys with a call running."""
+        return len(self._flights)
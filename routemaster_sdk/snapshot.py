@@ -0,0 +1,412 @@
+"""
+Snapshots of a state machine's labels, in a compact memory-mapped file.
+
+``export_state_machine`` lists a state machine's labels, fetches them
+concurrently and writes them to a file which ``LabelSnapshot`` opens with
+``mmap``. Queries such as "how many labels are in state X" or "which labels
+are in state X" are answered from indexes in the file, reading only the
+labels they return.
+
+The file is laid out in sections, each aligned to 8 bytes::
+
+    magic      b'RMSNAP01'
+    rows       each label's UTF-8 name followed by its JSON metadata
+    offsets    uint64 * (2n + 1): the start of each row's name and metadata,
+               then the end of the last row
+    states     uint32 * n: the index of each row's state in the footer
+    by_state   uint32 * n: rows ordered by state, then name
+    by_name    uint32 * n: rows ordered by name
+    footer     JSON: the state machine, the count of labels, the states with
+               their ranges in ``by_state``, and where each section is
+    uint64     the length of the footer
+    magic      b'RMSNAP01'
+
+Integers are little-endian. Rows are written as labels are fetched, so only
+the indexes are held in memory during an export.
+"""
+
+import os
+import sys
+import mmap
+import array
+import bisect
+import itertools
+from typing import (
+    IO,
+    Any,
+    Dict,
+    List,
+    Tuple,
+    Iterator,
+    Optional,
+    Sequence,
+    NamedTuple,
+)
+
+from routemaster_sdk.api import DEFAULT_MAX_IN_FLIGHT, RoutemasterAPI
+from routemaster_sdk.codec import JSONCodec, StdlibCodec
+from routemaster_sdk.types import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    StateMachine,
+)
+from routemaster_sdk.compact import CompactLabel
+from routemaster_sdk.exceptions import DeletedLabel, UnknownLabel
+
+MAGIC = b'RMSNAP01'
+VERSION = 1
+
+DEFAULT_CHUNK_SIZE = 1000
+
+_LENGTH = array.array('Q', [0]).itemsize
+
+# The range of each state's rows in the ``by_state`` index.
+_StateRanges = Dict[State, Tuple[int, int]]
+
+ExportResult = NamedTuple('ExportResult', [
+    ('state_machine', StateMachine),
+    ('labels', int),
+    # Labels which were deleted between being listed and being fetched.
+    ('skipped', int),
+])
+
+
+def _little_endian(values: array.array) -> bytes:
+    if sys.byteorder != 'little':  # pragma: no cover
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _encoded_metadata(label: Label, codec: JSONCodec) -> bytes:
+    if isinstance(label, CompactLabel):
+        return label.raw_metadata
+    return codec.dumps(label.metadata)
+
+
+class _Writer:
+    """Writes the sections of a snapshot file, tracking where each one is."""
+
+    def __init__(self, f: IO[bytes]) -> None:
+        self._f = f
+        self.position = 0
+        self.sections = {}  # type: Dict[str, List[int]]
+
+    def write(self, data: bytes) -> None:
+        self._f.write(data)
+        self.position += len(data)
+
+    def align(self) -> None:
+        self.write(b'\0' * (-self.position % 8))
+
+    def section(self, name: str, values: array.array) -> None:
+        self.align()
+        data = _little_endian(values)
+        self.sections[name] = [self.position, len(data)]
+        self.write(data)
+
+
+def write_snapshot(
+    path: str,
+    state_machine: StateMachine,
+    labels: Iterator[Label],
+    codec: Optional[JSONCodec] = None,
+) -> int:
+    """
+    Write labels to a snapshot file, returning how many were written.
+
+    The file is written beside ``path`` and moved into place once complete,
+    so readers never see a partial snapshot.
+    """
+    codec = codec if codec is not None else StdlibCodec()
+    temporary = '{0}.{1}.tmp'.format(path, os.getpid())
+
+    offsets = array.array('Q')
+    state_codes = array.array('I')
+    names = []  # type: List[bytes]
+    states = {}  # type: Dict[State, int]
+
+    try:
+        with open(temporary, 'wb') as f:
+            writer = _Writer(f)
+            writer.write(MAGIC)
+            rows_start = writer.position
+
+            for label in labels:
+                name = label.ref.name.encode('utf-8')
+                offsets.append(writer.position)
+                writer.write(name)
+                offsets.append(writer.position)
+                writer.write(_encoded_metadata(label, codec))
+
+                names.append(name)
+                state_codes.append(states.setdefault(label.state, len(states)))
+
+            offsets.append(writer.position)
+            writer.sections['rows'] = [rows_start, writer.position - rows_start]
+
+            state_names = sorted(states, key=states.__getitem__)
+            by_state = sorted(
+                range(len(names)),
+                key=lambda row: (state_names[state_codes[row]], names[row]),
+            )
+            by_name = sorted(range(len(names)), key=names.__getitem__)
+
+            ranges = []  # type: List[Dict[str, Any]]
+            for code, rows in itertools.groupby(
+                by_state,
+                key=state_codes.__getitem__,
+            ):
+                start = ranges[-1]['end'] if ranges else 0
+                ranges.append({
+                    'state': state_names[code],
+                    'code': code,
+                    'start': start,
+                    'end': start + sum(1 for _ in rows),
+                })
+
+            writer.section('offsets', offsets)
+            writer.section('states', state_codes)
+            writer.section('by_state', array.array('I', by_state))
+            writer.section('by_name', array.array('I', by_name))
+
+            footer = codec.dumps({
+                'version': VERSION,
+                'state_machine': state_machine,
+                'count': len(names),
+                'states': ranges,
+                'sections': writer.sections,
+            })
+            writer.write(footer)
+            writer.write(_little_endian(array.array('Q', [len(footer)])))
+            writer.write(MAGIC)
+
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+    return len(names)
+
+
+def _chunks(refs: Iterator[LabelRef], size: int) -> Iterator[List[LabelRef]]:
+    while True:
+        chunk = list(itertools.islice(refs, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def export_state_machine(
+    api: RoutemasterAPI,
+    state_machine: StateMachine,
+    path: str,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> ExportResult:
+    """
+    Write a snapshot of every label in a state machine to a file.
+
+    Labels are listed with ``iter_labels`` and fetched ``chunk_size`` at a
+    time with ``get_labels_bulk``. Labels which are deleted before they are
+    fetched are skipped; any other error aborts the export, leaving any
+    existing file at ``path`` untouched.
+    """
+    skipped = 0
+
+    def labels() -> Iterator[Label]:
+        nonlocal skipped
+        refs = api.iter_labels(state_machine)
+
+        for chunk in _chunks(refs, chunk_size):
+            for result in api.get_labels_bulk(chunk, max_in_flight):
+                if isinstance(result, (DeletedLabel, UnknownLabel)):
+                    skipped += 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+
+    count = write_snapshot(path, state_machine, labels(), api.codec)
+    return ExportResult(state_machine, count, skipped)
+
+
+def _uint_view(
+    buffer: memoryview,
+    section: Sequence[int],
+    format: str,
+) -> Sequence[int]:
+    start, length = section
+    data = buffer[start:start + length]
+    if sys.byteorder == 'little':
+        return data.cast(format)  # type: ignore
+    values = array.array(format, data)  # pragma: no cover
+    values.byteswap()  # pragma: no cover
+    return values  # pragma: no cover
+
+
+class LabelSnapshot:
+    """
+    A snapshot of a state machine's labels, as written by ``export_state_machine``.
+
+    The file is memory-mapped rather than read: counts per state come from
+    its footer, the labels in a state are a range of its ``by_state`` index
+    and labels are found by name by a binary search of its ``by_name`` index.
+    Labels are returned as ``CompactLabel``, whose metadata is decoded only
+    when read. Close the snapshot with ``close``, or use it as a context
+    manager.
+    """
+
+    def __init__(self, path: str, codec: Optional[JSONCodec] = None) -> None:
+        self.path = path
+        self.codec = codec if codec is not None else StdlibCodec()
+
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            self._open()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _open(self) -> None:
+        data = self._mmap
+        trailer = len(MAGIC) + _LENGTH
+
+        magics = (data[:len(MAGIC)], data[-len(MAGIC):])
+        if len(data) < len(MAGIC) + trailer or magics != (MAGIC, MAGIC):
+            raise ValueError("{0!r} is not a label snapshot".format(self.path))
+
+        footer_end = len(data) - trailer
+        footer_length = int.from_bytes(
+            data[footer_end:footer_end + _LENGTH],
+            'little',
+        )
+        footer = self.codec.loads(data[footer_end - footer_length:footer_end])
+
+        if footer['version'] != VERSION:
+            raise ValueError(
+                "Unsupported snapshot version {0}".format(footer['version']),
+            )
+
+        # Views of the indexes, straight from the mapped file.
+        buffer = memoryview(data)
+        self._buffer = buffer
+        sections = footer['sections']
+        self.state_machine = StateMachine(footer['state_machine'])
+        self._count = footer['count']  # type: int
+        self._offsets = _uint_view(buffer, sections['offsets'], 'Q')
+        self._states = _uint_view(buffer, sections['states'], 'I')
+        self._by_state = _uint_view(buffer, sections['by_state'], 'I')
+        self._by_name = _uint_view(buffer, sections['by_name'], 'I')
+
+        self._state_names = {}  # type: Dict[int, State]
+        self._state_ranges = {}  # type: _StateRanges
+        for entry in footer['states']:
+            state = State(entry['state'])
+            self._state_names[entry['code']] = state
+            self._state_ranges[state] = (entry['start'], entry['end'])
+
+    def __enter__(self) -> 'LabelSnapshot':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Unmap the snapshot file."""
+        for view in (self._offsets, self._states, self._by_state, self._by_name):
+            if isinstance(view, memoryview):
+                view.release()
+        self._buffer.release()
+        self._mmap.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _name(self, row: int) -> bytes:
+        offsets = self._offsets
+        return self._mmap[offsets[2 * row]:offsets[2 * row + 1]]
+
+    def _label(self, row: int) -> CompactLabel:
+        offsets = self._offsets
+        name, metadata, end = offsets[2 * row:2 * row + 3]
+
+        return CompactLabel(
+            LabelRef(
+                LabelName(self._mmap[name:metadata].decode('utf-8')),
+                self.state_machine,
+            ),
+            self._mmap[metadata:end],
+            self._state_names[self._states[row]],
+            self.codec,
+        )
+
+    def states(self) -> Dict[State, int]:
+        """The number of labels in each state."""
+        return {
+            state: end - start
+            for state, (start, end) in self._state_ranges.items()
+        }
+
+    def count(self, state: State) -> int:
+        """The number of labels in a state."""
+        start, end = self._state_ranges.get(state, (0, 0))
+        return end - start
+
+    def labels_in_state(self, state: State) -> Iterator[LabelRef]:
+        """The labels in a state, ordered by name."""
+        start, end = self._state_ranges.get(state, (0, 0))
+        for index in range(start, end):
+            yield LabelRef(
+                LabelName(self._name(self._by_state[index]).decode('utf-8')),
+                self.state_machine,
+            )
+
+    def _find(self, name: LabelName) -> Optional[int]:
+        encoded = name.encode('utf-8')
+        by_name = self._by_name
+
+        index = bisect.bisect_left(
+            _NameIndex(self, by_name),
+            encoded,
+        )
+        if index < len(by_name) and self._name(by_name[index]) == encoded:
+            return by_name[index]
+        return None
+
+    def get(self, name: LabelName) -> Optional[CompactLabel]:
+        """A label by name, or ``None`` if it is not in the snapshot."""
+        row = self._find(name)
+        return None if row is None else self._label(row)
+
+    def state_of(self, name: LabelName) -> Optional[State]:
+        """The state of a label, or ``None`` if it is not in the snapshot."""
+        row = self._find(name)
+        return None if row is None else self._state_names[self._states[row]]
+
+    def __iter__(self) -> Iterator[CompactLabel]:
+        """Every label, in the order they were written."""
+        for row in range(self._count):
+            yield self._label(row)
+
+
+class _NameIndex:
+    """The names of a snapshot's labels in order, for ``bisect``."""
+
+    def __init__(self, snapshot: LabelSnapshot, by_name: Sequence[int]) -> None:
+        self._snapshot = snapshot
+        self._by_name = by_name
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def __getitem__(self, index: int) -> bytes:
+        return self._snapshot._name(self._by_name[index])
@@ -0,0 +1,122 @@
+"""Incremental parsing of large JSON response bodies."""
+
+import json
+import codecs
+from typing import Any, Iterable, Iterator
+
+_WHITESPACE = ' \t\n\r'
+
+# Characters which may follow a complete value in a JSON document.
+_DELIMITERS = _WHITESPACE + ',:]}'
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Text buffer fed from an iterable of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read another chunk into the buffer, returning False at the end."""
+        if self.eof:
+            return False
+
+        # Drop consumed text so the buffer only holds the current value.
+        self.text = self.text[self.pos:]
+        self.pos = 0
+
+        for chunk in self._chunks:
+            text = self._decoder.decode(chunk)
+            if text:
+                self.text += text
+                return True
+
+        self.text += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def skip_whitespace(self) -> None:
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text) or not self.fill():
+                return
+
+    def peek(self) -> str:
+        self.skip_whitespace()
+        if self.pos >= len(self.text):
+            raise ValueError("Unexpected end of JSON document")
+        return self.text[self.pos]
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError("Expected {0!r} at offset {1} of JSON document".format(
+                char,
+                self.pos,
+            ))
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode the next complete JSON value, reading more as needed."""
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+
+            # A number may have been cut short by the end of the buffer (e.g.
+            # ``3.`` of ``3.25``), so only accept values once a delimiter
+            # follows them.
+            if self.eof or (
+                end < len(self.text) and self.text[end] in _DELIMITERS
+            ):
+                self.pos = end
+                return value
+
+            self.fill()
+
+
+def iter_json_array(chunks: Iterable[bytes], key: str) -> Iterator[Any]:
+    """
+    Yield the items of the array under ``key`` in a top-level JSON object.
+
+    The document is parsed incrementally from ``chunks``, so only one item is
+    held in memory at once and the first item is available as soon as its
+    bytes have arrived. Other top-level keys are parsed and discarded.
+    """
+    buffer = _Buffer(chunks)
+
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+
+    while True:
+        name = buffer.value()
+        buffer.expect(':')
+
+        if name != key:
+            buffer.value()
+        else:
+            buffer.expect('[')
+            if buffer.peek() == ']':
+                buffer.pos += 1
+            else:
+                while True:
+                    yield buffer.value()
+                    if buffer.peek() == ']':
+                        buffer.pos += 1
+                        break
+                    buffer.expect(',')
+
+        if buffer.peek() == '}':
+            return
+        buffer.expect(',')
@@ -471,3 +471,179 @@ def test_delete_label_unknown_state_machine(routemaster_api: RoutemasterAPI):
         routemaster_api.delete_label(label_ref)
 
     assert e.value.state_machine == 'none'
+
+
+@httpretty.activate
+def test_get_labels_bulk(routemaster_api: RoutemasterAPI):
+    testing_machine = StateMachine('testing-machine')
+
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels/first',
+        body=json.dumps({'metadata': {'n': 1}, 'state': 'start'}),
+        content_type='application/json',
+    )
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels/gone',
+        content_type='application/json',
+        status=410,
+    )
+
+    first = LabelRef(LabelName('first'), testing_machine)
+    gone = LabelRef(LabelName('gone'), testing_machine)
+
+    results = routemaster_api.get_labels_bulk(
+        [first, gone, first],
+        max_in_flight=2,
+    )
+
+    assert len(results) == 3
+    assert results[0] == Label(first, {'n': 1}, State('start'))
+    assert isinstance(results[1], DeletedLabel)
+    assert results[1].label == gone
+    assert results[2] == results[0]
+
+
+@httpretty.activate
+def test_create_labels(routemaster_api: RoutemasterAPI):
+    testing_machine = StateMachine('testing-machine')
+
+    httpretty.register_uri(
+        httpretty.POST,
+        'http://localhost:2017/state-machines/testing-machine/labels/new',
+        body=json.dumps({'metadata': {'n': 1}, 'state': 'start'}),
+        content_type='application/json',
+        status=201,
+    )
+    httpretty.register_uri(
+        httpretty.POST,
+        'http://localhost:2017/state-machines/testing-machine/labels/existing',
+        content_type='application/json',
+        status=409,
+    )
+
+    new = LabelRef(LabelName('new'), testing_machine)
+    existing = LabelRef(LabelName('existing'), testing_machine)
+
+    results = routemaster_api.create_labels(
+        [(new, {'n': 1}), (existing, {})],
+    )
+
+    assert results[0] == Label(new, {'n': 1}, State('start'))
+    assert isinstance(results[1], LabelAlreadyExists)
+
+
+@httpretty.activate
+def test_update_labels(routemaster_api: RoutemasterAPI):
+    testing_machine = StateMachine('testing-machine')
+
+    httpretty.register_uri(
+        httpretty.PATCH,
+        'http://localhost:2017/state-machines/testing-machine/labels/demo',
+        body=json.dumps({'metadata': {'n': 2}, 'state': 'start'}),
+        content_type='application/json',
+    )
+
+    demo = LabelRef(LabelName('demo'), testing_machine)
+
+    results = routemaster_api.update_labels(iter([(demo, {'n': 2})]))
+
+    assert results == [Label(demo, {'n': 2}, State('start'))]
+
+
+@httpretty.activate
+def test_delete_labels(routemaster_api: RoutemasterAPI):
+    httpretty.register_uri(
+        httpretty.DELETE,
+        'http://localhost:2017/state-machines/testing-machine/labels/demo',
+        content_type='application/json',
+        status=204,
+    )
+    httpretty.register_uri(
+        httpretty.DELETE,
+        'http://localhost:2017/state-machines/none/labels/demo',
+        content_type='application/json',
+        status=404,
+    )
+
+    results = routemaster_api.delete_labels([
+        LabelRef(LabelName('demo'), StateMachine('testing-machine')),
+        LabelRef(LabelName('demo'), StateMachine('none')),
+    ])
+
+    assert results[0] is None
+    assert isinstance(results[1], UnknownStateMachine)
+
+
+def test_bulk_rejects_empty_window(routemaster_api: RoutemasterAPI):
+    with pytest.raises(ValueError):
+        routemaster_api.get_labels_bulk([], max_in_flight=0)
+
+
+@httpretty.activate
+def test_iter_labels(routemaster_api: RoutemasterAPI):
+    data = {'labels': [
+        {'name': 'first-label'},
+        {'name': 'other-label'},
+    ]}
+
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels',
+        body=json.dumps(data),
+        content_type='application/json',
+    )
+
+    testing_machine = StateMachine('testing-machine')
+
+    labels = routemaster_api.iter_labels(testing_machine, chunk_size=3)
+
+    assert list(labels) == [
+        LabelRef(LabelName('first-label'), testing_machine),
+        LabelRef(LabelName('other-label'), testing_machine),
+    ]
+
+
+@httpretty.activate
+def test_iter_labels_follows_next_links(routemaster_api: RoutemasterAPI):
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels',
+        responses=[
+            httpretty.Response(
+                body=json.dumps({'labels': [{'name': 'first-label'}]}),
+                content_type='application/json',
+                adding_headers={
+                    'Link': '<labels?after=first-label>; rel="next"',
+                },
+            ),
+            httpretty.Response(
+                body=json.dumps({'labels': [{'name': 'other-label'}]}),
+                content_type='application/json',
+            ),
+        ],
+    )
+
+    testing_machine = StateMachine('testing-machine')
+
+    labels = list(routemaster_api.iter_labels(testing_machine))
+
+    assert labels == [
+        LabelRef(LabelName('first-label'), testing_machine),
+        LabelRef(LabelName('other-label'), testing_machine),
+    ]
+    assert httpretty.last_request().querystring == {'after': ['first-label']}
+
+
+@httpretty.activate
+def test_iter_labels_unknown_state_machine(routemaster_api: RoutemasterAPI):
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/none/labels',
+        content_type='application/json',
+        status=404,
+    )
+
+    with pytest.raises(UnknownStateMachine):
+        list(routemaster_api.iter_labels(StateMachine('none')))
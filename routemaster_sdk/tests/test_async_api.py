@@ -0,0 +1,374 @@
+import asyncio
+
+import pytest
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from routemaster_sdk import (
+    RetryBudget,
+    RetryPolicy,
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    LabelCache,
+    CallObserver,
+    DeletedLabel,
+    StateMachine,
+    UnknownLabel,
+    LabelAlreadyExists,
+    UnknownStateMachine,
+)
+from routemaster_sdk.async_api import AsyncRoutemasterAPI
+
+LABEL_PATH = '/state-machines/{state_machine}/labels/{name}'
+
+TEST_LABEL = LabelRef(
+    LabelName('demo-label'),
+    StateMachine('testing-machine'),
+)
+
+
+def respond(status=200, body=None, received=None):
+    async def handler(request):
+        if received is not None:
+            received.append(await request.json())
+        if body is None:
+            return web.Response(status=status)
+        return web.json_response(body, status=status)
+    return handler
+
+
+def run_with_api(routes, test, **api_kwargs):
+    async def go():
+        app = web.Application()
+        for method, path, handler in routes:
+            app.router.add_route(method, path, handler)
+
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                api = AsyncRoutemasterAPI(
+                    str(server.make_url('/')),
+                    session,
+                    **api_kwargs
+                )
+                return await test(api)
+        finally:
+            await server.close()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(go())
+    finally:
+        loop.close()
+
+
+def test_get_status():
+    expected = {'status': 'ok', 'state-machines': '/state-machines'}
+
+    result = run_with_api(
+        [('GET', '/', respond(body=expected))],
+        lambda api: api.get_status(),
+    )
+
+    assert result == expected
+
+
+def test_get_status_error_response():
+    with pytest.raises(aiohttp.ClientResponseError):
+        run_with_api(
+            [('GET', '/', respond(status=503, body={'status': 'error'}))],
+            lambda api: api.get_status(),
+        )
+
+
+def test_get_state_machines():
+    data = {'state-machines': [
+        {
+            'name': 'testing-machine',
+            'labels': '/state-machines/testing-machine/labels',
+        }
+    ]}
+
+    result = run_with_api(
+        [('GET', '/state-machines', respond(body=data))],
+        lambda api: api.get_state_machines(),
+    )
+
+    assert result == [StateMachine('testing-machine')]
+
+
+def test_get_labels():
+    data = {'labels': [
+        {'name': 'first-label'},
+        {'name': 'other-label'},
+    ]}
+    testing_machine = StateMachine('testing-machine')
+
+    result = run_with_api(
+        [(
+            'GET',
+            '/state-machines/testing-machine/labels',
+            respond(body=data),
+        )],
+        lambda api: api.get_labels(testing_machine),
+    )
+
+    assert result == [
+        LabelRef(LabelName('first-label'), testing_machine),
+        LabelRef(LabelName('other-label'), testing_machine),
+    ]
+
+
+def test_get_labels_unknown_state_machine():
+    with pytest.raises(UnknownStateMachine) as e:
+        run_with_api(
+            [('GET', '/state-machines/none/labels', respond(status=404))],
+            lambda api: api.get_labels(StateMachine('none')),
+        )
+
+    assert e.value.state_machine == 'none'
+
+
+def test_get_label():
+    expected_returned = {'foo': 'returned'}
+
+    result = run_with_api(
+        [('GET', LABEL_PATH, respond(body={
+            'metadata': expected_returned,
+            'state': 'first-state',
+        }))],
+        lambda api: api.get_label(TEST_LABEL),
+    )
+
+    assert result == Label(
+        TEST_LABEL,
+        expected_returned,
+        State('first-state'),
+    )
+
+
+def test_get_label_refetches_label_evicted_while_revalidating():
+    cache = LabelCache()
+    validators = []
+    calls = []
+
+    class Observer(CallObserver):
+        def call_finished(self, call, duration, error):
+            calls.append((call.operation, call.attempts))
+
+    async def handler(request):
+        validators.append(request.headers.get('If-None-Match'))
+        if 'If-None-Match' in request.headers:
+            cache.invalidate(TEST_LABEL)
+            return web.Response(status=304)
+        return web.json_response(
+            {'metadata': {'n': len(validators)}, 'state': 'start'},
+            headers={'ETag': '"v1"'},
+        )
+
+    async def test(api):
+        await api.get_label(TEST_LABEL)
+        return await api.get_label(TEST_LABEL, revalidate=True)
+
+    result = run_with_api(
+        [('GET', LABEL_PATH, handler)],
+        test,
+        cache=cache,
+        observer=Observer(),
+    )
+
+    assert result == Label(TEST_LABEL, {'n': 3}, State('start'))
+    assert validators == [None, '"v1"', None]
+    assert calls == [('get_label', 1), ('get_label', 2)]
+
+
+def test_get_label_error_response():
+    with pytest.raises(aiohttp.ClientResponseError):
+        run_with_api(
+            [('GET', LABEL_PATH, respond(status=502))],
+            lambda api: api.get_label(TEST_LABEL),
+        )
+
+
+def test_get_label_unknown_label():
+    with pytest.raises(UnknownLabel) as e:
+        run_with_api(
+            [('GET', LABEL_PATH, respond(status=404))],
+            lambda api: api.get_label(TEST_LABEL),
+        )
+
+    assert e.value.label == TEST_LABEL
+
+
+def test_get_label_deleted_label():
+    with pytest.raises(DeletedLabel) as e:
+        run_with_api(
+            [('GET', LABEL_PATH, respond(status=410))],
+            lambda api: api.get_label(TEST_LABEL),
+        )
+
+    assert e.value.label == TEST_LABEL
+
+
+def test_create_label():
+    expected_sent = {'foo': 'sent'}
+    expected_returned = {'foo': 'returned'}
+    received = []
+
+    result = run_with_api(
+        [('POST', LABEL_PATH, respond(status=201, received=received, body={
+            'metadata': expected_returned,
+            'state': 'first-state',
+        }))],
+        lambda api: api.create_label(TEST_LABEL, metadata=expected_sent),
+    )
+
+    assert result == Label(
+        TEST_LABEL,
+        expected_returned,
+        State('first-state'),
+    )
+    assert received == [{'metadata': expected_sent}]
+
+
+def test_create_label_unknown_state_machine():
+    with pytest.raises(UnknownStateMachine) as e:
+        run_with_api(
+            [('POST', LABEL_PATH, respond(status=404))],
+            lambda api: api.create_label(TEST_LABEL, metadata={}),
+        )
+
+    assert e.value.state_machine == 'testing-machine'
+
+
+def test_create_label_already_exists():
+    with pytest.raises(LabelAlreadyExists) as e:
+        run_with_api(
+            [('POST', LABEL_PATH, respond(status=409))],
+            lambda api: api.create_label(TEST_LABEL, metadata={}),
+        )
+
+    assert e.value.label == TEST_LABEL
+
+
+def test_update_label():
+    expected_sent = {'foo': 'sent'}
+    expected_returned = {'foo': 'returned'}
+    received = []
+
+    result = run_with_api(
+        [('PATCH', LABEL_PATH, respond(received=received, body={
+            'metadata': expected_returned,
+            'state': 'first-state',
+        }))],
+        lambda api: api.update_label(TEST_LABEL, metadata=expected_sent),
+    )
+
+    assert result == Label(
+        TEST_LABEL,
+        expected_returned,
+        State('first-state'),
+    )
+    assert received == [{'metadata': expected_sent}]
+
+
+def test_update_label_deleted_label():
+    with pytest.raises(DeletedLabel) as e:
+        run_with_api(
+            [('PATCH', LABEL_PATH, respond(status=410))],
+            lambda api: api.update_label(TEST_LABEL, metadata={}),
+        )
+
+    assert e.value.label == TEST_LABEL
+
+
+def test_delete_label():
+    result = run_with_api(
+        [('DELETE', LABEL_PATH, respond(status=204))],
+        lambda api: api.delete_label(TEST_LABEL),
+    )
+
+    assert result is None
+
+
+def test_delete_label_unknown_state_machine():
+    with pytest.raises(UnknownStateMachine):
+        run_with_api(
+            [('DELETE', LABEL_PATH, respond(status=404))],
+            lambda api: api.delete_label(TEST_LABEL),
+        )
+
+
+
+def test_get_labels_bulk():
+    async def handler(request):
+        if request.match_info['name'] == 'gone':
+            return web.Response(status=410)
+        return web.json_response({
+            'metadata': {'name': request.match_info['name']},
+            'state': 'start',
+        })
+
+    refs = [
+        LabelRef(LabelName(name), StateMachine('testing-machine'))
+        for name in ('a', 'gone', 'b', 'c')
+    ]
+
+    results = run_with_api(
+        [('GET', LABEL_PATH, handler)],
+        lambda api: api.get_labels_bulk(refs, max_in_flight=2),
+    )
+
+    assert results[0] == Label(refs[0], {'name': 'a'}, State('start'))
+    assert isinstance(results[1], DeletedLabel)
+    assert results[2] == Label(refs[2], {'name': 'b'}, State('start'))
+    assert results[3] == Label(refs[3], {'name': 'c'}, State('start'))
+
+
+def test_delete_labels():
+    results = run_with_api(
+        [('DELETE', LABEL_PATH, respond(status=204))],
+        lambda api: api.delete_labels([TEST_LABEL, TEST_LABEL]),
+    )
+
+    assert results == [None, None]
+
+
+def test_get_label_retries_transient_errors():
+    statuses = [503, 502]
+
+    async def handler(request):
+        if statuses:
+            return web.Response(status=statuses.pop(0))
+        return web.json_response({'metadata': {}, 'state': 'start'})
+
+    result = run_with_api(
+        [('GET', LABEL_PATH, handler)],
+        lambda api: api.get_label(TEST_LABEL),
+        retry_policy=RetryPolicy(backoff_base=0, budget=RetryBudget()),
+    )
+
+    assert result == Label(TEST_LABEL, {}, State('start'))
+    assert statuses == []
+
+
+def test_create_label_conflict_after_retry_is_success():
+    statuses = [503, 409]
+
+    async def create(request):
+        return web.Response(status=statuses.pop(0))
+
+    result = run_with_api(
+        [
+            ('POST', LABEL_PATH, create),
+            ('GET', LABEL_PATH, respond(body={'metadata': {}, 'state': 'a'})),
+        ],
+        lambda api: api.create_label(TEST_LABEL, {}),
+        retry_policy=RetryPolicy(backoff_base=0, budget=RetryBudget()),
+    )
+
+    assert result == Label(TEST_LABEL, {}, State('a'))
@@ -0,0 +1,223 @@
+import json
+
+import pytest
+
+from routemaster_sdk import LabelRef, LabelName, StateMachine
+from routemaster_sdk.backfill import (
+    Record,
+    ShardResult,
+    BackfillOptions,
+    backfill,
+    shard_of,
+    read_records,
+    detect_format,
+    read_checkpoint,
+)
+from routemaster_sdk.__main__ import main
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+TEST_MACHINE = StateMachine('testing-machine')
+
+
+def label(name):
+    return LabelRef(LabelName(name), TEST_MACHINE)
+
+
+@pytest.fixture()
+def fake():
+    with FakeRoutemaster(state_machines=('testing-machine',)) as fake:
+        yield fake
+
+
+def write_jsonl(path, records):
+    with open(str(path), 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    return str(path)
+
+
+def records(count, state_machine='testing-machine'):
+    return [
+        {
+            'state_machine': state_machine,
+            'label': 'label-{0}'.format(index),
+            'metadata': {'index': index},
+        }
+        for index in range(count)
+    ]
+
+
+def test_read_records(tmp_path):
+    jsonl = write_jsonl(tmp_path / 'records.jsonl', records(2))
+    with open(str(tmp_path / 'records.csv'), 'w') as f:
+        f.write('state_machine,label,metadata\n')
+        f.write('testing-machine,a,"{""x"": 1}"\n')
+        f.write('testing-machine,b,\n')
+
+    assert detect_format(jsonl) == 'jsonl'
+    assert list(read_records(jsonl, 'jsonl')) == [
+        (0, Record(label('label-0'), {'index': 0})),
+        (1, Record(label('label-1'), {'index': 1})),
+    ]
+    assert list(read_records(str(tmp_path / 'records.csv'), 'csv')) == [
+        (0, Record(label('a'), {'x': 1})),
+        (1, Record(label('b'), {})),
+    ]
+
+    with pytest.raises(ValueError):
+        detect_format('records.txt')
+
+
+def test_read_records_reports_unreadable_records(tmp_path):
+    path = tmp_path / 'records.jsonl'
+    path.write_text('\n'.join([
+        '{"state_machine": "testing-machine", "label": "a"}',
+        '{"state_machine": "testing-machine", "label": ',
+        '{"state_machine": "testing-machine"}',
+        '[1, 2]',
+        '{"state_machine": "testing-machine", "label": "b", "metadata": 1}',
+        '{"state_machine": "testing-machine", "label": "c"}',
+    ]) + '\n')
+
+    entries = list(read_records(str(path), 'jsonl'))
+
+    assert [position for position, _ in entries] == [0, 1, 2, 3, 4, 5]
+    assert entries[0][1] == Record(label('a'), {})
+    assert entries[5][1] == Record(label('c'), {})
+    assert all(isinstance(entry, ValueError) for _, entry in entries[1:5])
+
+
+def test_shards_are_stable_and_balanced():
+    shards = [shard_of(label('label-{0}'.format(i)), 4) for i in range(1000)]
+
+    assert shard_of(label('label-0'), 4) == shards[0]
+    assert all(shards.count(shard) > 200 for shard in range(4))
+
+
+def test_backfill_upserts_and_resumes(fake, tmp_path):
+    fake.seed('testing-machine', ['label-0'], {'old': True})
+    path = write_jsonl(tmp_path / 'records.jsonl', records(5))
+    checkpoints = str(tmp_path / 'checkpoints')
+
+    result, = backfill(fake.url, path, checkpoints, batch_size=2)
+
+    assert result == ShardResult(0, created=4, updated=1, skipped=0, failed=0)
+    assert fake._labels['testing-machine']['label-0'].metadata == {
+        'old': True,
+        'index': 0,
+    }
+
+    options = BackfillOptions(
+        fake.url, path, checkpoints, 'jsonl', 1, 1, 2, True, None,
+    )
+    assert read_checkpoint(options, 0) == 4
+
+    # Everything is done already.
+    result, = backfill(fake.url, path, checkpoints, batch_size=2)
+    assert result == ShardResult(0, 0, 0, 0, 0)
+
+    with pytest.raises(ValueError):
+        backfill(fake.url, path, checkpoints, workers=2)
+
+
+def test_backfill_records_failures(fake, tmp_path):
+    path = write_jsonl(
+        tmp_path / 'records.jsonl',
+        records(1) + records(1, state_machine='unknown'),
+    )
+    checkpoints = tmp_path / 'checkpoints'
+
+    result, = backfill(fake.url, path, str(checkpoints), upsert=False)
+
+    assert result.created == 1
+    assert result.failed == 1
+
+    failure, = [
+        json.loads(line)
+        for line in (checkpoints / 'shard-0.failed.jsonl').read_text().splitlines()
+    ]
+    assert failure['state_machine'] == 'unknown'
+    assert 'UnknownStateMachine' in failure['error']
+
+
+def test_backfill_skips_unreadable_records(fake, tmp_path):
+    path = tmp_path / 'records.jsonl'
+    path.write_text(''.join([
+        json.dumps(records(1)[0]) + '\n',
+        '{"label": "truncated\n',
+        json.dumps({'label': 'no-state-machine'}) + '\n',
+    ]))
+    checkpoints = tmp_path / 'checkpoints'
+
+    results = backfill(fake.url, str(path), str(checkpoints), workers=1, nodes=2)
+    results += backfill(
+        fake.url,
+        str(path),
+        str(checkpoints),
+        workers=1,
+        node=1,
+        nodes=2,
+    )
+
+    assert sum(result.created for result in results) == 1
+    assert sum(result.failed for result in results) == 2
+
+    failures = sorted(
+        json.loads(line)['position']
+        for shard in range(2)
+        for line in (
+            checkpoints / 'shard-{0}.failed.jsonl'.format(shard)
+        ).read_text().splitlines()
+    )
+    assert failures == [1, 2]
+
+    # Rerunning continues past them, rather than stopping at them again.
+    options = BackfillOptions(
+        fake.url, str(path), str(checkpoints), 'jsonl', 2, 1, 2, True, None,
+    )
+    assert max(read_checkpoint(options, shard) for shard in range(2)) == 2
+    result, = backfill(fake.url, str(path), str(checkpoints), nodes=2)
+    assert result == ShardResult(0, 0, 0, 0, 0)
+
+
+def test_backfill_across_processes_and_nodes(fake, tmp_path):
+    path = write_jsonl(tmp_path / 'records.jsonl', records(40))
+
+    first = backfill(
+        fake.url,
+        path,
+        str(tmp_path / 'node-0'),
+        workers=2,
+        nodes=2,
+        node=0,
+    )
+    second = backfill(
+        fake.url,
+        path,
+        str(tmp_path / 'node-1'),
+        workers=2,
+        nodes=2,
+        node=1,
+    )
+
+    assert [result.shard for result in first + second] == [0, 1, 2, 3]
+    assert sum(result.created for result in first + second) == 40
+    assert len(fake._labels['testing-machine']) == 40
+
+
+def test_command_line(fake, tmp_path, capsys):
+    path = write_jsonl(tmp_path / 'records.jsonl', records(3))
+
+    status = main([
+        'backfill',
+        fake.url,
+        path,
+        '--checkpoint-dir',
+        str(tmp_path / 'checkpoints'),
+        '--max-in-flight',
+        '2',
+    ])
+
+    assert status == 0
+    header, row = capsys.readouterr().out.splitlines()
+    assert row.split() == ['0', '3', '0', '0', '0']
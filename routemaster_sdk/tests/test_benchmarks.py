@@ -0,0 +1,68 @@
+import pytest
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    DeletedLabel,
+    StateMachine,
+    RoutemasterAPI,
+    LabelAlreadyExists,
+    UnknownStateMachine,
+)
+from routemaster_sdk.benchmarks.api import MODES, OPERATIONS, run, percentile
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+
+def test_fake_routemaster_implements_the_api():
+    label = LabelRef(LabelName('demo'), StateMachine('testing-machine'))
+
+    with FakeRoutemaster(state_machines=('testing-machine',)) as server:
+        api = RoutemasterAPI.from_url(server.url)
+
+        assert api.get_status()['status'] == 'ok'
+        assert api.get_state_machines() == ['testing-machine']
+
+        created = api.create_label(label, {'a': {'b': 1}})
+        assert created == Label(label, {'a': {'b': 1}}, State('start'))
+
+        with pytest.raises(LabelAlreadyExists):
+            api.create_label(label, {})
+
+        updated = api.update_label(label, {'a': {'c': 2}})
+        assert updated.metadata == {'a': {'b': 1, 'c': 2}}
+        assert api.get_label(label) == updated
+        assert api.get_labels(StateMachine('testing-machine')) == [label]
+
+        api.delete_label(label)
+        with pytest.raises(DeletedLabel):
+            api.get_label(label)
+        assert api.get_labels(StateMachine('testing-machine')) == []
+
+        with pytest.raises(UnknownStateMachine):
+            api.get_labels(StateMachine('other-machine'))
+
+        api.close()
+
+
+def test_percentile():
+    samples = [float(x) for x in range(1, 101)]
+
+    assert percentile(samples, 0.5) == 50
+    assert percentile(samples, 0.99) == 99
+    assert percentile(samples, 1) == 100
+    assert percentile([3.0], 0.99) == 3
+
+
+def test_benchmark_runs_every_operation_and_mode():
+    rows = run(requests=4, concurrency=2)
+
+    assert [(row['operation'], row['mode']) for row in rows] == [
+        (operation, mode)
+        for operation in OPERATIONS
+        for mode in MODES
+    ]
+    for row in rows:
+        assert row['throughput'] > 0
+        assert row['p99_ms'] >= row['p50_ms'] > 0
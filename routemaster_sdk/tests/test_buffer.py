@@ -0,0 +1,147 @@
+import time
+import threading
+
+import pytest
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    DeletedLabel,
+    StateMachine,
+)
+from routemaster_sdk.buffer import LabelUpdateBuffer, merge_metadata
+
+TEST_MACHINE = StateMachine('testing-machine')
+FIRST = LabelRef(LabelName('first'), TEST_MACHINE)
+SECOND = LabelRef(LabelName('second'), TEST_MACHINE)
+
+
+class FakeAPI:
+    def __init__(self):
+        self.batches = []
+        self.sent = threading.Event()
+
+    def update_labels(self, labels, max_in_flight):
+        batch = list(labels)
+        self.batches.append(batch)
+        self.sent.set()
+
+        return [
+            DeletedLabel(label) if label.name == 'deleted'
+            else Label(label, metadata, State('start'))
+            for label, metadata in batch
+        ]
+
+
+def test_merge_metadata_is_recursive():
+    existing = {'a': 1, 'nested': {'x': 1, 'y': 2}, 'replaced': {'z': 1}}
+    update = {'b': 2, 'nested': {'y': 3}, 'replaced': 4}
+
+    assert merge_metadata(existing, update) == {
+        'a': 1,
+        'b': 2,
+        'nested': {'x': 1, 'y': 3},
+        'replaced': 4,
+    }
+    assert existing['nested'] == {'x': 1, 'y': 2}
+
+
+def test_updates_to_a_label_are_merged():
+    api = FakeAPI()
+    buffer = LabelUpdateBuffer(api, window=60)
+
+    first = buffer.update_label(FIRST, {'a': 1, 'n': {'x': 1}})
+    second = buffer.update_label(FIRST, {'b': 2, 'n': {'y': 2}})
+    other = buffer.update_label(SECOND, {'c': 3})
+
+    assert buffer.pending() == 2
+    buffer.flush()
+
+    merged = {'a': 1, 'b': 2, 'n': {'x': 1, 'y': 2}}
+    assert api.batches == [[(FIRST, merged), (SECOND, {'c': 3})]]
+    assert first.result() == second.result() == Label(
+        FIRST,
+        merged,
+        State('start'),
+    )
+    assert other.result().metadata == {'c': 3}
+
+    buffer.close()
+
+
+def test_updates_replacing_objects_are_sent_separately():
+    api = FakeAPI()
+    buffer = LabelUpdateBuffer(api, window=60)
+    updates = [{'a': 5}, {'a': {'x': 1}}, {'b': 1}, {'a': {'z': 3}}, {'a': 6}]
+
+    futures = [buffer.update_label(FIRST, update) for update in updates]
+    other = buffer.update_label(SECOND, {'c': 3})
+    assert buffer.pending() == 2
+    buffer.flush()
+
+    assert api.batches == [
+        [(FIRST, {'a': 5}), (SECOND, {'c': 3})],
+        [(FIRST, {'a': {'x': 1, 'z': 3}, 'b': 1})],
+        [(FIRST, {'a': 6})],
+    ]
+    assert futures[0].result().metadata == {'a': 5}
+    assert futures[3].result().metadata == {'a': {'x': 1, 'z': 3}, 'b': 1}
+    assert other.result().metadata == {'c': 3}
+
+    # Routemaster ends up with what the updates applied one by one give.
+    existing = {'a': {'y': 2}}
+    expected = existing
+    for update in updates:
+        expected = merge_metadata(expected, update)
+    for (_, metadata), in [batch[:1] for batch in api.batches]:
+        existing = merge_metadata(existing, metadata)
+    assert existing == expected
+
+    buffer.close()
+
+
+def test_errors_are_set_on_futures():
+    buffer = LabelUpdateBuffer(FakeAPI(), window=60)
+
+    future = buffer.update_label(LabelRef(LabelName('deleted'), TEST_MACHINE), {})
+    buffer.flush()
+
+    with pytest.raises(DeletedLabel):
+        future.result()
+
+
+def test_flushes_after_window():
+    api = FakeAPI()
+
+    with LabelUpdateBuffer(api, window=0.01) as buffer:
+        future = buffer.update_label(FIRST, {'a': 1})
+        assert future.result(timeout=5).metadata == {'a': 1}
+
+
+def test_flushes_at_max_pending():
+    api = FakeAPI()
+
+    with LabelUpdateBuffer(api, window=60, max_pending=2) as buffer:
+        buffer.update_label(FIRST, {})
+        time.sleep(0.01)
+        assert not api.sent.is_set()
+
+        buffer.update_label(SECOND, {})
+        assert api.sent.wait(5)
+
+
+def test_close_flushes_and_rejects_new_updates():
+    api = FakeAPI()
+    buffer = LabelUpdateBuffer(api, window=60)
+
+    future = buffer.update_label(FIRST, {'a': 1})
+    buffer.close()
+
+    assert future.done()
+    with pytest.raises(RuntimeError):
+        buffer.update_label(FIRST, {})
+
+    buffer.close()
+    assert len(api.batches) == 1
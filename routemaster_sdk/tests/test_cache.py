@@ -0,0 +1,280 @@
+import json
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    CacheStats,
+    LabelCache,
+    DeletedLabel,
+    UnknownLabel,
+    StateMachine,
+    RoutemasterAPI,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+
+TEST_MACHINE = StateMachine('testing-machine')
+TEST_LABEL = LabelRef(LabelName('demo-label'), TEST_MACHINE)
+TEST_LABEL_URL = (
+    'http://localhost:2017/state-machines/testing-machine/labels/demo-label'
+)
+
+
+def make_label(name='demo-label', state='start', state_machine=TEST_MACHINE):
+    return Label(
+        LabelRef(LabelName(name), state_machine),
+        {'name': name},
+        State(state),
+    )
+
+
+def test_get_miss_then_hit():
+    cache = LabelCache()
+    label = make_label()
+
+    assert cache.get(label.ref) is None
+    cache.put(label)
+    assert cache.get(label.ref) is label
+
+    assert cache.stats() == CacheStats(
+        hits=1,
+        misses=1,
+        evictions=0,
+        revalidations=0,
+        size=1,
+    )
+
+
+def test_entries_expire(clock):
+    cache = LabelCache(ttl=10, clock=clock)
+    label = make_label()
+
+    cache.put(label)
+    clock.now = 9.9
+    assert cache.get(label.ref) is label
+    clock.now = 10
+    assert cache.get(label.ref) is None
+    assert len(cache) == 0
+
+
+def test_per_state_machine_ttl(clock):
+    other_machine = StateMachine('other-machine')
+    cache = LabelCache(
+        ttl=10,
+        state_machine_ttls={other_machine: 1, StateMachine('never'): 0},
+        clock=clock,
+    )
+
+    default = make_label('a')
+    short = make_label('b', state_machine=other_machine)
+    uncached = make_label('c', state_machine=StateMachine('never'))
+
+    cache.put(default)
+    cache.put(short)
+    cache.put(uncached)
+
+    clock.now = 5
+    assert cache.get(default.ref) is default
+    assert cache.get(short.ref) is None
+    assert cache.get(uncached.ref) is None
+
+
+def test_least_recently_used_is_evicted():
+    cache = LabelCache(max_size=2)
+    first, second, third = make_label('a'), make_label('b'), make_label('c')
+
+    cache.put(first)
+    cache.put(second)
+    cache.get(first.ref)
+    cache.put(third)
+
+    assert cache.get(second.ref) is None
+    assert cache.get(first.ref) is first
+    assert cache.get(third.ref) is third
+    assert cache.evictions == 1
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        LabelCache(max_size=0)
+
+
+@pytest.fixture()
+def cached_api():
+    return RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        cache=LabelCache(),
+    )
+
+
+def register_label(method, metadata, status=200):
+    httpretty.register_uri(
+        method,
+        TEST_LABEL_URL,
+        body=json.dumps({'metadata': metadata, 'state': 'start'}),
+        content_type='application/json',
+        status=status,
+    )
+
+
+def count_gets():
+    return sum(
+        1 for request in httpretty.latest_requests()
+        if request.method == 'GET'
+    )
+
+
+@httpretty.activate
+def test_get_label_is_read_through(cached_api):
+    register_label(httpretty.GET, {'n': 1})
+
+    first = cached_api.get_label(TEST_LABEL)
+    second = cached_api.get_label(TEST_LABEL)
+
+    assert first == second == Label(TEST_LABEL, {'n': 1}, State('start'))
+    assert count_gets() == 1
+    assert cached_api.cache.stats().hits == 1
+
+
+@httpretty.activate
+def test_update_label_refreshes_cache(cached_api):
+    register_label(httpretty.GET, {'n': 1})
+    register_label(httpretty.PATCH, {'n': 2})
+
+    cached_api.get_label(TEST_LABEL)
+    cached_api.update_label(TEST_LABEL, {'n': 2})
+
+    assert cached_api.get_label(TEST_LABEL).metadata == {'n': 2}
+    assert count_gets() == 1
+
+
+@httpretty.activate
+def test_create_label_populates_cache(cached_api):
+    register_label(httpretty.POST, {'n': 1}, status=201)
+
+    cached_api.create_label(TEST_LABEL, {'n': 1})
+
+    assert cached_api.get_label(TEST_LABEL).metadata == {'n': 1}
+    assert count_gets() == 0
+
+
+@httpretty.activate
+def test_delete_label_invalidates_cache(cached_api):
+    register_label(httpretty.GET, {'n': 1})
+    cached_api.get_label(TEST_LABEL)
+
+    httpretty.register_uri(httpretty.DELETE, TEST_LABEL_URL, status=204)
+    cached_api.delete_label(TEST_LABEL)
+
+    httpretty.register_uri(httpretty.GET, TEST_LABEL_URL, status=410)
+    with pytest.raises(DeletedLabel):
+        cached_api.get_label(TEST_LABEL)
+
+
+@httpretty.activate
+def test_unknown_label_drops_expired_entry_with_validators(clock):
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        cache=LabelCache(ttl=10, clock=clock),
+    )
+    api.cache.put(make_label(), validators={'If-None-Match': '"v1"'})
+    clock.now = 20
+
+    httpretty.register_uri(httpretty.GET, TEST_LABEL_URL, status=404)
+    for _ in range(2):
+        with pytest.raises(UnknownLabel):
+            api.get_label(TEST_LABEL)
+
+    # Only the first request was conditional.
+    first, second = httpretty.latest_requests()
+    assert first.headers['If-None-Match'] == '"v1"'
+    assert 'If-None-Match' not in second.headers
+    assert api.cache.validators(TEST_LABEL) == {}
+
+
+def test_expired_entries_with_validators_can_be_revalidated(clock):
+    cache = LabelCache(ttl=10, clock=clock)
+    label = make_label()
+
+    cache.put(label, validators={'If-None-Match': '"v1"'})
+    clock.now = 10
+
+    assert cache.get(label.ref) is None
+    assert cache.validators(label.ref) == {'If-None-Match': '"v1"'}
+    assert cache.revalidated(label.ref) is label
+    assert cache.get(label.ref) is label
+    assert cache.stats().revalidations == 1
+
+
+def test_revalidating_an_evicted_label():
+    cache = LabelCache()
+    assert cache.validators(TEST_LABEL) == {}
+    assert cache.revalidated(TEST_LABEL) is None
+
+
+@httpretty.activate
+def test_get_label_revalidates_with_etag(clock):
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        cache=LabelCache(ttl=10, clock=clock),
+    )
+
+    httpretty.register_uri(
+        httpretty.GET,
+        TEST_LABEL_URL,
+        responses=[
+            httpretty.Response(
+                body=json.dumps({'metadata': {'n': 1}, 'state': 'start'}),
+                content_type='application/json',
+                adding_headers={
+                    'ETag': '"v1"',
+                    'Last-Modified': 'Tue, 15 Nov 1994 12:45:26 GMT',
+                },
+            ),
+            httpretty.Response(body='', status=304),
+        ],
+    )
+
+    first = api.get_label(TEST_LABEL)
+    clock.now = 20
+    second = api.get_label(TEST_LABEL)
+
+    assert second is first
+    last_request = httpretty.last_request()
+    assert last_request.headers['If-None-Match'] == '"v1"'
+    assert last_request.headers['If-Modified-Since'] == (
+        'Tue, 15 Nov 1994 12:45:26 GMT'
+    )
+    assert api.cache.stats().revalidations == 1
+
+
+@httpretty.activate
+def test_get_state_machines_revalidates_with_etag(cached_api):
+    data = {'state-machines': [{'name': 'testing-machine'}]}
+
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines',
+        responses=[
+            httpretty.Response(
+                body=json.dumps(data),
+                content_type='application/json',
+                adding_headers={'ETag': '"v1"'},
+            ),
+            httpretty.Response(body='', status=304),
+        ],
+    )
+
+    first = cached_api.get_state_machines()
+    second = cached_api.get_state_machines()
+
+    assert first == second == [TEST_MACHINE]
+    assert httpretty.last_request().headers['If-None-Match'] == '"v1"'
@@ -0,0 +1,218 @@
+import asyncio
+
+import pytest
+import aiohttp
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    LabelRef,
+    LabelName,
+    CircuitOpen,
+    StateMachine,
+    UnknownLabel,
+    CircuitBreaker,
+    RoutemasterAPI,
+)
+from routemaster_sdk.circuit import OPEN, CLOSED, HALF_OPEN
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.async_api import AsyncRoutemasterAPI
+
+FAILING = StateMachine('failing-machine')
+HEALTHY = StateMachine('healthy-machine')
+
+
+def make_breaker(**kwargs):
+    kwargs.setdefault('minimum_calls', 4)
+    kwargs.setdefault('window', 4)
+    return CircuitBreaker(**kwargs)
+
+
+def fail(breaker, state_machine, times):
+    for _ in range(times):
+        breaker.before_request(state_machine)
+        breaker.record(state_machine, success=False)
+
+
+def test_opens_once_failure_rate_reached():
+    breaker = make_breaker(failure_threshold=0.5)
+
+    breaker.before_request(FAILING)
+    breaker.record(FAILING, success=True)
+    breaker.before_request(FAILING)
+    breaker.record(FAILING, success=True)
+    fail(breaker, FAILING, 1)
+    assert breaker.state(FAILING) == CLOSED
+
+    fail(breaker, FAILING, 1)
+    assert breaker.state(FAILING) == OPEN
+
+    with pytest.raises(CircuitOpen) as e:
+        breaker.before_request(FAILING)
+    assert e.value.state_machine == FAILING
+
+
+def test_circuits_are_per_state_machine():
+    breaker = make_breaker()
+
+    fail(breaker, FAILING, 4)
+
+    breaker.before_request(HEALTHY)
+    breaker.before_request(None)
+    assert breaker.states() == {FAILING: OPEN, HEALTHY: CLOSED, None: CLOSED}
+
+
+def test_half_open_probe_closes_circuit(clock):
+    changes = []
+    breaker = make_breaker(
+        reset_timeout=10,
+        clock=clock,
+        on_state_change=lambda *change: changes.append(change),
+    )
+
+    fail(breaker, FAILING, 4)
+    clock.now = 10
+
+    breaker.before_request(FAILING)
+    assert breaker.state(FAILING) == HALF_OPEN
+
+    with pytest.raises(CircuitOpen):
+        # Only one probe at once.
+        breaker.before_request(FAILING)
+
+    breaker.record(FAILING, success=True)
+    assert breaker.state(FAILING) == CLOSED
+
+    assert changes == [
+        (FAILING, CLOSED, OPEN),
+        (FAILING, OPEN, HALF_OPEN),
+        (FAILING, HALF_OPEN, CLOSED),
+    ]
+
+
+def test_failed_probe_reopens_circuit(clock):
+    breaker = make_breaker(reset_timeout=10, clock=clock)
+
+    fail(breaker, FAILING, 4)
+    clock.now = 10
+    fail(breaker, FAILING, 1)
+
+    assert breaker.state(FAILING) == OPEN
+    with pytest.raises(CircuitOpen) as e:
+        breaker.before_request(FAILING)
+    assert e.value.retry_after == 10
+
+
+def test_released_probe_can_be_retried(clock):
+    breaker = make_breaker(reset_timeout=10, clock=clock)
+
+    fail(breaker, FAILING, 4)
+    clock.now = 10
+
+    breaker.before_request(FAILING)
+    breaker.release(FAILING)
+    assert breaker.state(FAILING) == HALF_OPEN
+
+    # The probe was given back, so another request may probe.
+    breaker.before_request(FAILING)
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        CircuitBreaker(minimum_calls=30, window=20)
+    with pytest.raises(ValueError):
+        CircuitBreaker(failure_threshold=0)
+
+
+@httpretty.activate
+def test_api_fails_fast_once_open():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/failing-machine/labels/demo',
+        status=503,
+    )
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/healthy-machine/labels/demo',
+        status=404,
+    )
+
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        circuit_breaker=make_breaker(minimum_calls=2, window=2),
+    )
+    failing = LabelRef(LabelName('demo'), FAILING)
+
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            api.get_label(failing)
+
+    requests_made = len(httpretty.latest_requests())
+
+    with pytest.raises(CircuitOpen):
+        api.get_label(failing)
+
+    assert len(httpretty.latest_requests()) == requests_made
+
+    # Other state machines are unaffected.
+    with pytest.raises(UnknownLabel):
+        api.get_label(LabelRef(LabelName('demo'), HEALTHY))
+
+
+def test_api_counts_connection_errors_as_failures():
+    breaker = make_breaker(minimum_calls=1, window=1)
+    api = RoutemasterAPI(
+        api_url='http://127.0.0.1:1',
+        session=requests.Session(),
+        circuit_breaker=breaker,
+    )
+
+    with pytest.raises(requests.ConnectionError):
+        api.get_status()
+
+    with pytest.raises(CircuitOpen):
+        api.get_status()
+
+
+def test_async_cancelled_probe_is_released():
+    breaker = make_breaker(minimum_calls=1, window=1, reset_timeout=0.1)
+    failing = LabelRef(LabelName('demo'), FAILING)
+
+    async def test():
+        done = asyncio.Event()
+
+        async def hang(reader, writer):
+            await reader.read(1024)
+            await done.wait()
+            writer.close()
+
+        server = await asyncio.start_server(hang, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                api = AsyncRoutemasterAPI(
+                    'http://127.0.0.1:{0}'.format(port),
+                    session,
+                    circuit_breaker=breaker,
+                )
+
+                fail(breaker, FAILING, 1)
+                await asyncio.sleep(0.15)
+
+                for _ in range(2):
+                    # Neither probe is refused by the circuit.
+                    with pytest.raises(asyncio.TimeoutError):
+                        await asyncio.wait_for(api.get_label(failing), 0.1)
+                    assert breaker.state(FAILING) == HALF_OPEN
+        finally:
+            done.set()
+            server.close()
+            await server.wait_closed()
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(test())
+    finally:
+        loop.close()
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    StateMachine,
+    RoutemasterAPI,
+)
+from routemaster_sdk.codec import (
+    JSONCodec,
+    StdlibCodec,
+    fastest_codec,
+    available_codecs,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.benchmarks.codec import make_metadata
+
+CODECS = available_codecs()
+
+
+@pytest.mark.parametrize('codec', CODECS, ids=[c.name for c in CODECS])
+def test_round_trip(codec):
+    payload = {'metadata': make_metadata(50), 'state': 'ünïcode/state'}
+
+    encoded = codec.dumps(payload)
+
+    assert isinstance(encoded, bytes)
+    assert json.loads(encoded.decode('utf-8')) == payload
+    assert codec.loads(encoded) == payload
+
+
+def test_stdlib_codec_is_always_available():
+    assert isinstance(CODECS[-1], StdlibCodec)
+    assert isinstance(fastest_codec(), JSONCodec)
+
+
+def test_partial_codec_cannot_be_constructed():
+    class DumpsOnlyCodec(JSONCodec):
+        def dumps(self, value):
+            return b'null'
+
+    with pytest.raises(TypeError):
+        DumpsOnlyCodec()
+
+
+class RecordingCodec(StdlibCodec):
+    content_type = 'application/json; charset=utf-8'
+
+    def __init__(self):
+        self.calls = []
+
+    def dumps(self, value):
+        self.calls.append('dumps')
+        return super().dumps(value)
+
+    def loads(self, data):
+        self.calls.append('loads')
+        return super().loads(data)
+
+
+@httpretty.activate
+def test_api_uses_codec():
+    label_ref = LabelRef(LabelName('demo'), StateMachine('testing-machine'))
+
+    httpretty.register_uri(
+        httpretty.PATCH,
+        'http://localhost:2017/state-machines/testing-machine/labels/demo',
+        body=json.dumps({'metadata': {'a': 1}, 'state': 'start'}),
+        content_type='application/json',
+    )
+
+    codec = RecordingCodec()
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        codec=codec,
+    )
+
+    label = api.update_label(label_ref, {'a': 1})
+
+    assert label == Label(label_ref, {'a': 1}, State('start'))
+    assert codec.calls == ['dumps', 'loads']
+
+    last_request = httpretty.last_request()
+    assert last_request.headers['Content-Type'] == codec.content_type
+    assert last_request.body == b'{"metadata":{"a":1}}'
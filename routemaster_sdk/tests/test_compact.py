@@ -0,0 +1,169 @@
+import sys
+import json
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    StateMachine,
+    RoutemasterAPI,
+)
+from routemaster_sdk.codec import StdlibCodec
+from routemaster_sdk.cache import LabelCache
+from routemaster_sdk.compact import CompactLabel, intern_ref
+from routemaster_sdk.conftest import TEST_API_URL
+
+LABEL_REF = LabelRef(LabelName('demo'), StateMachine('testing-machine'))
+
+
+class CountingCodec(StdlibCodec):
+    def __init__(self):
+        self.loads_calls = 0
+        self.dumps_calls = 0
+
+    def loads(self, data):
+        self.loads_calls += 1
+        return super().loads(data)
+
+    def dumps(self, value):
+        self.dumps_calls += 1
+        return super().dumps(value)
+
+
+def make_label(metadata=None, state='start'):
+    return Label(LABEL_REF, metadata or {'a': {'b': 1}}, State(state))
+
+
+def test_compact_label_behaves_like_label():
+    label = make_label()
+    compact = CompactLabel.from_label(label, StdlibCodec())
+
+    assert compact.ref == label.ref
+    assert compact.state == label.state
+    assert compact.metadata == label.metadata
+    assert compact.raw_metadata == b'{"a":{"b":1}}'
+
+    ref, metadata, state = compact
+    assert (ref, metadata, state) == label
+    assert len(compact) == 3
+    assert compact[0] == label.ref
+    assert compact[-1] == label.state
+
+    assert compact == label
+    assert label == compact
+    assert compact == CompactLabel.from_label(label, StdlibCodec())
+    assert compact != make_label(state='end')
+    assert compact != make_label(metadata={'a': 2})
+    assert compact != 'start'
+
+    assert compact.to_label() == label
+    assert isinstance(compact.to_label(), Label)
+
+
+def test_compact_label_is_unhashable_like_label():
+    with pytest.raises(TypeError):
+        hash(CompactLabel.from_label(make_label(), StdlibCodec()))
+
+
+def test_metadata_is_only_decoded_when_read():
+    codec = CountingCodec()
+    compact = CompactLabel.from_label(make_label(), codec)
+
+    assert compact.state == 'start'
+    assert compact.ref.state_machine == 'testing-machine'
+    assert codec.loads_calls == 0
+
+    assert compact.metadata == {'a': {'b': 1}}
+    assert codec.loads_calls == 1
+
+
+def test_state_and_state_machine_names_are_shared():
+    codec = StdlibCodec()
+    first = CompactLabel.from_label(
+        Label(
+            LabelRef(LabelName('a'), StateMachine(''.join(['testing-', 'machine']))),
+            {},
+            State(''.join(['sta', 'rt'])),
+        ),
+        codec,
+    )
+    second = CompactLabel.from_label(
+        Label(
+            LabelRef(LabelName('b'), StateMachine(''.join(['testing', '-machine']))),
+            {},
+            State(''.join(['st', 'art'])),
+        ),
+        codec,
+    )
+
+    assert first.state is second.state
+    assert first.ref.state_machine is second.ref.state_machine
+    assert intern_ref(second.ref) == second.ref
+
+
+def test_compact_label_is_smaller_than_label():
+    metadata = {'key-{0}'.format(x): x for x in range(20)}
+    label = make_label(metadata=metadata)
+    compact = CompactLabel.from_label(label, StdlibCodec())
+
+    assert not hasattr(compact, '__dict__')
+
+    label_size = sys.getsizeof(label) + sys.getsizeof(label.metadata)
+    compact_size = sys.getsizeof(compact) + sys.getsizeof(compact.raw_metadata)
+    assert compact_size < label_size
+
+
+@httpretty.activate
+def test_api_returns_compact_labels():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels/demo',
+        body=json.dumps({'metadata': {'a': 1}, 'state': 'start'}),
+        content_type='application/json',
+    )
+
+    cache = LabelCache()
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        cache=cache,
+        compact_labels=True,
+    )
+
+    label = api.get_label(LABEL_REF)
+
+    assert isinstance(label, CompactLabel)
+    assert label == Label(LABEL_REF, {'a': 1}, State('start'))
+    assert api.get_label(LABEL_REF) is label
+
+
+@httpretty.activate
+def test_api_decodes_each_response_once():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels/demo',
+        body=json.dumps({'metadata': {'a': 1}, 'state': 'start'}),
+        content_type='application/json',
+    )
+
+    codec = CountingCodec()
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        codec=codec,
+        compact_labels=True,
+    )
+
+    label = api.get_label(LABEL_REF)
+
+    # Decoded once for the state, and the metadata encoded again to be held.
+    assert label.state == 'start'
+    assert (codec.loads_calls, codec.dumps_calls) == (1, 1)
+
+    assert label.metadata == {'a': 1}
+    assert (codec.loads_calls, codec.dumps_calls) == (2, 1)
@@ -0,0 +1,186 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+import requests
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    RateLimiter,
+    RetryBudget,
+    StateMachine,
+    RoutemasterAPI,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.hedging import HedgingPolicy, LatencyTracker
+from routemaster_sdk.tests.test_async_api import respond, run_with_api
+
+TEST_LABEL = LabelRef(LabelName('demo-label'), StateMachine('testing-machine'))
+LABEL_BODY = {'metadata': {'a': 1}, 'state': 'start'}
+
+
+class SlowFirstSession:
+    """Answers every request, but the first only after ``delay`` seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.requests = 0
+        self.released = threading.Event()
+        self._lock = threading.Lock()
+
+    def _respond(self, url, **kwargs):
+        with self._lock:
+            self.requests += 1
+            first = self.requests == 1
+
+        if first:
+            self.released.wait(self.delay)
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(LABEL_BODY).encode('utf-8')
+        return response
+
+    get = patch = post = delete = _respond
+
+    def close(self):
+        pass
+
+
+def make_api(session, **kwargs):
+    return RoutemasterAPI(api_url=TEST_API_URL, session=session, **kwargs)
+
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker(window=100)
+    assert tracker.percentile(0.5) is None
+
+    for latency in range(1, 101):
+        tracker.observe(latency / 1000)
+
+    assert len(tracker) == 100
+    assert tracker.percentile(0.5) == 0.05
+    assert tracker.percentile(0.99) == 0.099
+    assert tracker.percentile(1) == 0.1
+
+    # Only the window is kept.
+    for _ in range(100):
+        tracker.observe(1.0)
+    assert tracker.percentile(0.5) == 1.0
+
+
+def test_hedging_delay_follows_recent_latencies():
+    policy = HedgingPolicy(
+        percentile=0.9,
+        min_delay=0.01,
+        max_delay=0.5,
+        min_samples=10,
+    )
+    assert policy.delay('get_label') == 0.5
+
+    for _ in range(10):
+        policy.observe('get_label', 0.02)
+    assert policy.delay('get_label') == 0.02
+    assert policy.delay('get_labels') == 0.5
+
+    for _ in range(10):
+        policy.observe('get_status', 0.0001)
+    assert policy.delay('get_status') == 0.01
+
+    with pytest.raises(ValueError):
+        HedgingPolicy(percentile=1)
+
+
+def test_slow_reads_are_hedged():
+    session = SlowFirstSession(delay=5)
+    api = make_api(session, hedging=HedgingPolicy(max_delay=0.01))
+
+    start = time.perf_counter()
+    label = api.get_label(TEST_LABEL)
+    elapsed = time.perf_counter() - start
+    session.released.set()
+
+    assert label == Label(TEST_LABEL, {'a': 1}, State('start'))
+    assert session.requests == 2
+    assert elapsed < 1
+    api.close()
+
+
+def test_hedges_are_limited_by_the_budget():
+    session = SlowFirstSession(delay=0.05)
+    budget = RetryBudget(ratio=0, min_per_second=0, max_balance=0)
+    api = make_api(
+        session,
+        hedging=HedgingPolicy(max_delay=0.01, budget=budget),
+    )
+
+    api.get_label(TEST_LABEL)
+
+    assert session.requests == 1
+    api.close()
+
+
+def test_hedges_are_limited_by_the_rate_limiter():
+    session = SlowFirstSession(delay=0.05)
+    api = make_api(
+        session,
+        hedging=HedgingPolicy(max_delay=0.01),
+        rate_limiter=RateLimiter(rate=1, burst=1),
+    )
+
+    api.get_label(TEST_LABEL)
+
+    assert session.requests == 1
+
+
+def test_writes_are_not_hedged():
+    session = SlowFirstSession(delay=0.05)
+    api = make_api(session, hedging=HedgingPolicy(max_delay=0.01))
+
+    api.update_label(TEST_LABEL, {'a': 1})
+
+    assert session.requests == 1
+
+
+def test_async_slow_reads_are_hedged():
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request)
+        if len(requests_seen) == 1:
+            await asyncio.sleep(5)
+        return await respond(body=LABEL_BODY)(request)
+
+    start = time.perf_counter()
+    label = run_with_api(
+        [('GET', '/state-machines/testing-machine/labels/demo-label', handler)],
+        lambda api: api.get_label(TEST_LABEL),
+        hedging=HedgingPolicy(max_delay=0.01),
+    )
+
+    assert label == Label(TEST_LABEL, {'a': 1}, State('start'))
+    assert len(requests_seen) == 2
+    assert time.perf_counter() - start < 1
+
+
+def test_async_hedges_are_limited_by_the_rate_limiter():
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request)
+        await asyncio.sleep(0.05)
+        return await respond(body=LABEL_BODY)(request)
+
+    run_with_api(
+        [('GET', '/state-machines/testing-machine/labels/demo-label', handler)],
+        lambda api: api.get_label(TEST_LABEL),
+        hedging=HedgingPolicy(max_delay=0.01),
+        rate_limiter=RateLimiter(rate=1, burst=1),
+    )
+
+    assert len(requests_seen) == 1
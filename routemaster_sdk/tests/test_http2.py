@@ -0,0 +1,300 @@
+import ssl
+import json
+import shutil
+import socket
+import asyncio
+import threading
+import subprocess
+
+import pytest
+import aiohttp
+import requests
+
+from routemaster_sdk import (
+    LabelRef,
+    LabelName,
+    RetryPolicy,
+    StateMachine,
+    RoutemasterAPI,
+)
+from routemaster_sdk.api import _request_not_sent
+from routemaster_sdk.sessions import ThreadLocalSession, build_session
+from routemaster_sdk.async_api import AsyncRoutemasterAPI
+from routemaster_sdk.exceptions import UnknownStateMachine
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+httpx = pytest.importorskip('httpx')
+
+from routemaster_sdk.http2 import HTTP2Adapter, AsyncHTTP2Session  # noqa: E402
+
+h2 = pytest.importorskip('h2')
+
+import h2.config  # noqa: E402
+import h2.events  # noqa: E402
+import h2.connection  # noqa: E402
+
+TEST_MACHINE = StateMachine('testing-machine')
+TEST_LABEL = LabelRef(LabelName('demo-label'), TEST_MACHINE)
+UNUSED_URL = 'http://127.0.0.1:1'
+
+
+@pytest.fixture()
+def fake():
+    with FakeRoutemaster(state_machines=('testing-machine',)) as fake:
+        yield fake
+
+
+class H2Server:
+    """A TLS server which only speaks HTTP/2, answering every GET with JSON."""
+
+    def __init__(self, certfile, keyfile):
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.context.set_alpn_protocols(['h2'])
+
+        self.connections = 0
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen()
+        self.url = 'https://localhost:{0}'.format(self.socket.getsockname()[1])
+
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self.socket.close()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        try:
+            sock = self.context.wrap_socket(client, server_side=True)
+        except (ssl.SSLError, OSError):
+            client.close()
+            return
+
+        connection = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False),
+        )
+        connection.initiate_connection()
+        sock.sendall(connection.data_to_send())
+        paths = {}
+
+        with sock:
+            while True:
+                try:
+                    data = sock.recv(65535)
+                except OSError:
+                    return
+                if not data:
+                    return
+
+                for event in connection.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        paths[event.stream_id] = dict(event.headers)[b':path']
+                    elif isinstance(event, h2.events.StreamEnded):
+                        self._respond(connection, event.stream_id, paths.pop(
+                            event.stream_id,
+                        ))
+                sock.sendall(connection.data_to_send())
+
+    def _respond(self, connection, stream_id, path):
+        if b'/labels/' in path:
+            body = {'metadata': {'path': path.decode()}, 'state': 'start'}
+        else:
+            body = {'status': 'ok'}
+        data = json.dumps(body).encode()
+
+        connection.send_headers(stream_id, [
+            (':status', '200'),
+            ('content-type', 'application/json'),
+            ('content-length', str(len(data))),
+        ])
+        connection.send_data(stream_id, data, end_stream=True)
+
+
+@pytest.fixture()
+def h2_server(tmp_path):
+    if shutil.which('openssl') is None:
+        pytest.skip("openssl is needed to make a certificate")
+
+    certfile = str(tmp_path / 'cert.pem')
+    keyfile = str(tmp_path / 'key.pem')
+    subprocess.run(
+        [
+            'openssl', 'req', '-x509', '-nodes', '-days', '1',
+            '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+            '-keyout', keyfile, '-out', certfile,
+            '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    server = H2Server(certfile, keyfile)
+    server.verify = ssl.create_default_context(cafile=certfile)
+    yield server
+    server.close()
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def test_build_session_mounts_http2_adapter():
+    session = build_session(http2=True, pool_size=4)
+    adapter = session.get_adapter('https://example.com/')
+
+    assert isinstance(adapter, HTTP2Adapter)
+    assert session.get_adapter('http://localhost:2017/') is adapter
+
+    session = build_session(http2=True, thread_local=True)
+    assert isinstance(session, ThreadLocalSession)
+    assert isinstance(session.get_adapter('https://example.com/'), HTTP2Adapter)
+
+
+def test_api_over_http2_adapter(fake):
+    # Plain HTTP, so this falls back to HTTP/1.1.
+    api = RoutemasterAPI.from_url(fake.url, http2=True)
+
+    try:
+        assert api.get_status()['status'] == 'ok'
+
+        api.create_label(TEST_LABEL, {'foo': 'bar'})
+        assert api.get_label(TEST_LABEL).metadata == {'foo': 'bar'}
+
+        api.delete_label(TEST_LABEL)
+        assert api.get_labels(TEST_MACHINE) == []
+
+        with pytest.raises(UnknownStateMachine):
+            api.get_labels(StateMachine('unknown'))
+
+        assert api.get_state_machines() == [TEST_MACHINE]
+
+        with pytest.raises(requests.HTTPError) as excinfo:
+            api._session.post(fake.url + '/').raise_for_status()
+        assert excinfo.value.response.status_code == 405
+    finally:
+        api.close()
+
+
+def test_api_multiplexes_over_one_http2_connection(h2_server):
+    session = requests.Session()
+    session.mount('https://', HTTP2Adapter(verify=h2_server.verify))
+    api = RoutemasterAPI(h2_server.url, session)
+
+    try:
+        response = session.get(h2_server.url)
+        assert response.raw.version_string == 'HTTP/2'
+        assert response.raw.version == 20
+
+        labels = [
+            LabelRef(LabelName('label-{0}'.format(index)), TEST_MACHINE)
+            for index in range(20)
+        ]
+        results = api.get_labels_bulk(labels, max_in_flight=10)
+
+        assert [label.metadata['path'] for label in results] == [
+            '/state-machines/testing-machine/labels/label-{0}'.format(index)
+            for index in range(20)
+        ]
+        assert h2_server.connections == 1
+    finally:
+        api.close()
+
+
+def test_async_api_multiplexes_over_one_http2_connection(h2_server):
+    async def test():
+        async with AsyncHTTP2Session(verify=h2_server.verify) as session:
+            api = AsyncRoutemasterAPI(h2_server.url, session)
+
+            async with await session.request('GET', h2_server.url) as response:
+                assert response.version == aiohttp.HttpVersion(2, 0)
+                await response.read()
+
+            labels = await asyncio.gather(*(
+                api.get_label(
+                    LabelRef(LabelName('label-{0}'.format(index)), TEST_MACHINE),
+                )
+                for index in range(20)
+            ))
+            assert len(labels) == 20
+
+        assert h2_server.connections == 1
+
+    run(test())
+
+
+def test_adapter_raises_requests_errors():
+    session = requests.Session()
+    session.mount('http://', HTTP2Adapter())
+
+    with pytest.raises(requests.ConnectionError) as excinfo:
+        session.get(UNUSED_URL, timeout=(1, 1))
+    assert _request_not_sent(excinfo.value)
+
+    session.close()
+
+
+def test_refused_connections_are_retried(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('routemaster_sdk.api.time.sleep', sleeps.append)
+    api = RoutemasterAPI.from_url(
+        UNUSED_URL,
+        http2=True,
+        retry_policy=RetryPolicy(max_attempts=3),
+    )
+
+    # Not idempotent, so only retried as the request was never sent.
+    with pytest.raises(requests.ConnectionError):
+        api.update_label(TEST_LABEL, {'foo': 'bar'})
+    assert len(sleeps) == 2
+
+    api.close()
+
+
+def test_async_api_over_http2_session(fake):
+    async def test():
+        async with AsyncHTTP2Session() as session:
+            api = AsyncRoutemasterAPI(fake.url, session)
+
+            assert (await api.get_status())['status'] == 'ok'
+
+            await api.create_label(TEST_LABEL, {'foo': 'bar'})
+            label = await api.get_label(TEST_LABEL)
+            assert label.metadata == {'foo': 'bar'}
+
+            with pytest.raises(UnknownStateMachine):
+                await api.get_labels(StateMachine('unknown'))
+
+            async with await session.request('POST', fake.url) as response:
+                assert response.status == 405
+                with pytest.raises(aiohttp.ClientResponseError) as excinfo:
+                    response.raise_for_status()
+            assert excinfo.value.status == 405
+            assert excinfo.value.request_info.method == 'POST'
+
+    run(test())
+
+
+def test_async_session_raises_aiohttp_errors():
+    async def test():
+        async with AsyncHTTP2Session(timeout=1) as session:
+            with pytest.raises(aiohttp.ClientConnectorError) as excinfo:
+                await session.request('GET', UNUSED_URL)
+            assert excinfo.value.host == '127.0.0.1'
+            assert excinfo.value.port == 1
+            assert 'Cannot connect to host 127.0.0.1:1' in str(excinfo.value)
+
+    run(test())
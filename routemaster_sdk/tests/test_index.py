@@ -0,0 +1,175 @@
+import asyncio
+
+import pytest
+import aiohttp
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    LabelIndex,
+    StateMachine,
+    LabelSnapshot,
+    RoutemasterAPI,
+)
+from routemaster_sdk.snapshot import write_snapshot
+from routemaster_sdk.exceptions import UnknownLabel
+from routemaster_sdk.async_api import AsyncRoutemasterAPI
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+TEST_MACHINE = StateMachine('testing-machine')
+OTHER_MACHINE = StateMachine('other-machine')
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def ref(name, state_machine=TEST_MACHINE):
+    return LabelRef(LabelName(name), state_machine)
+
+
+def make_label(name, state, metadata=None, state_machine=TEST_MACHINE):
+    return Label(ref(name, state_machine), metadata or {}, State(state))
+
+
+def test_counts_and_lookups():
+    index = LabelIndex()
+    index.fill([
+        make_label('a', 'start'),
+        make_label('b', 'start'),
+        make_label('c', 'done'),
+        make_label('a', 'start', state_machine=OTHER_MACHINE),
+    ])
+
+    assert len(index) == 4
+    assert ref('a') in index
+    assert index.state_of(ref('c')) == 'done'
+    assert index.state_of(ref('z')) is None
+    assert index.count(TEST_MACHINE, State('start')) == 2
+    assert index.count(TEST_MACHINE, State('unknown')) == 0
+    assert index.counts(TEST_MACHINE) == {'start': 2, 'done': 1}
+    assert index.labels_in_state(TEST_MACHINE, State('start')) == {
+        ref('a'),
+        ref('b'),
+    }
+    assert index.state_machines() == [OTHER_MACHINE, TEST_MACHINE]
+
+    index.add(make_label('a', 'done'))
+    assert index.counts(TEST_MACHINE) == {'start': 1, 'done': 2}
+
+    assert index.remove(ref('b')) is True
+    assert index.remove(ref('b')) is False
+    assert index.counts(TEST_MACHINE) == {'done': 2}
+
+    index.clear(TEST_MACHINE)
+    assert index.counts(TEST_MACHINE) == {}
+    assert len(index) == 1
+
+    index.clear()
+    assert len(index) == 0
+
+
+def test_metadata_keys():
+    index = LabelIndex(metadata_keys=('region', 'tags'))
+    index.fill([
+        make_label('a', 'start', {'region': 'eu', 'tags': ['x']}),
+        make_label('b', 'done', {'region': 'eu'}),
+        make_label('c', 'done', {'region': 'us'}),
+        make_label('d', 'done', {'region': 'eu'}, state_machine=OTHER_MACHINE),
+    ])
+
+    assert index.labels_with('region', 'eu') == {
+        ref('a'),
+        ref('b'),
+        ref('d', OTHER_MACHINE),
+    }
+    assert index.labels_with('region', 'eu', TEST_MACHINE) == {ref('a'), ref('b')}
+    assert index.labels_with('region', 'eu', TEST_MACHINE, State('done')) == {
+        ref('b'),
+    }
+    assert index.labels_with('region', 'asia') == set()
+
+    index.add(make_label('b', 'done', {'region': 'us'}))
+    assert index.labels_with('region', 'us') == {ref('b'), ref('c')}
+
+    with pytest.raises(ValueError):
+        index.labels_with('owner', 'someone')
+    with pytest.raises(ValueError):
+        index.labels_with('region', 'eu', state=State('done'))
+
+
+def test_fill_from_snapshot(tmp_path):
+    path = str(tmp_path / 'labels.snapshot')
+    write_snapshot(path, TEST_MACHINE, iter([
+        make_label('a', 'start', {'region': 'eu'}),
+        make_label('b', 'done', {'region': 'us'}),
+    ]))
+    index = LabelIndex(metadata_keys=('region',))
+
+    with LabelSnapshot(path) as snapshot:
+        index.fill_from_snapshot(snapshot)
+
+    assert index.counts(TEST_MACHINE) == {'start': 1, 'done': 1}
+    assert index.labels_with('region', 'us') == {ref('b')}
+
+
+def test_kept_current_by_the_api():
+    index = LabelIndex()
+
+    with FakeRoutemaster(state_machines=('testing-machine',)) as server:
+        server.seed('testing-machine', ['a', 'b'], {})
+        api = RoutemasterAPI.from_url(server.url, index=index)
+
+        index.refresh(api, TEST_MACHINE)
+        assert index.counts(TEST_MACHINE) == {'start': 2}
+
+        api.create_label(ref('c'), {})
+        api.delete_label(ref('a'))
+        assert index.labels_in_state(TEST_MACHINE, State('start')) == {
+            ref('b'),
+            ref('c'),
+        }
+
+        index.add(make_label('gone', 'start'))
+        with pytest.raises(UnknownLabel):
+            api.get_label(ref('gone'))
+        assert ref('gone') not in index
+
+        # Changes made elsewhere are picked up by a refresh.
+        index.add(make_label('stale', 'start'))
+        index.refresh(api, TEST_MACHINE)
+        assert index.labels_in_state(TEST_MACHINE, State('start')) == {
+            ref('b'),
+            ref('c'),
+        }
+
+        api.close()
+
+
+def test_kept_current_by_the_async_api():
+    index = LabelIndex()
+
+    with FakeRoutemaster(state_machines=('testing-machine',)) as server:
+        async def test():
+            async with aiohttp.ClientSession() as session:
+                api = AsyncRoutemasterAPI(server.url, session, index=index)
+
+                await api.create_label(ref('a'), {})
+                await api.create_label(ref('b'), {})
+                await api.delete_label(ref('a'))
+
+                index.add(make_label('gone', 'start'))
+                with pytest.raises(UnknownLabel):
+                    await api.get_label(ref('gone'))
+
+        run(test())
+
+    assert index.counts(TEST_MACHINE) == {'start': 1}
+    assert ref('b') in index
+    assert ref('gone') not in index
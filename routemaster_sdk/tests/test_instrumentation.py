@@ -0,0 +1,249 @@
+import json
+import socket
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    LabelRef,
+    LabelName,
+    RetryBudget,
+    RetryPolicy,
+    StateMachine,
+    UnknownLabel,
+    RoutemasterAPI,
+)
+from routemaster_sdk.calls import Call
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.instrumentation import (
+    Histogram,
+    CallObserver,
+    StatsdObserver,
+    MetricsCollector,
+)
+from routemaster_sdk.tests.test_async_api import respond, run_with_api
+
+TEST_LABEL = LabelRef(LabelName('demo-label'), StateMachine('testing-machine'))
+TEST_LABEL_URL = (
+    'http://localhost:2017/state-machines/testing-machine/labels/demo-label'
+)
+LABEL_BODY = json.dumps({'metadata': {'a': 1}, 'state': 'start'})
+
+
+class RecordingObserver(CallObserver):
+    def __init__(self):
+        self.events = []
+
+    def call_started(self, call):
+        self.events.append(('started', call.operation))
+
+    def request_finished(self, call, status, elapsed):
+        assert elapsed >= 0
+        self.events.append(('request', status))
+
+    def call_finished(self, call, duration, error):
+        assert duration >= call.network_time
+        self.events.append(('finished', call, error))
+
+
+def make_api(**kwargs):
+    return RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        **kwargs
+    )
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1.0))
+
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.sum == pytest.approx(2.65)
+    assert histogram.cumulative_counts() == [
+        (0.1, 2),
+        (1.0, 3),
+        (float('inf'), 4),
+    ]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(0.99) == 1.0
+    assert Histogram().quantile(0.5) == 0
+
+
+@httpretty.activate
+def test_observer_is_told_of_calls():
+    httpretty.register_uri(
+        httpretty.PATCH,
+        TEST_LABEL_URL,
+        body=LABEL_BODY,
+        content_type='application/json',
+    )
+
+    observer = RecordingObserver()
+    make_api(observer=observer).update_label(TEST_LABEL, {'a': 1})
+
+    started, request, (_, call, error) = observer.events
+    assert started == ('started', 'update_label')
+    assert request == ('request', 200)
+    assert error is None
+
+    assert call.state_machine == 'testing-machine'
+    assert call.status == 200
+    assert call.bytes_sent == len(b'{"metadata":{"a":1}}')
+    assert call.bytes_received == len(LABEL_BODY)
+    assert call.network_time > 0
+    assert call.decode_time > 0
+    assert call.build_time > 0
+
+
+@httpretty.activate
+def test_observer_is_told_of_retries_and_errors():
+    httpretty.register_uri(
+        httpretty.GET,
+        TEST_LABEL_URL,
+        responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body='', status=404),
+        ],
+    )
+
+    observer = RecordingObserver()
+    api = make_api(
+        observer=observer,
+        retry_policy=RetryPolicy(backoff_base=0, budget=RetryBudget()),
+    )
+
+    with pytest.raises(UnknownLabel) as excinfo:
+        api.get_label(TEST_LABEL)
+
+    assert observer.events[:3] == [
+        ('started', 'get_label'),
+        ('request', 503),
+        ('request', 404),
+    ]
+    _, call, error = observer.events[3]
+    assert call.attempts == 2
+    assert call.status == 404
+    assert error is excinfo.value
+
+
+@httpretty.activate
+def test_metrics_collector():
+    httpretty.register_uri(
+        httpretty.GET,
+        TEST_LABEL_URL,
+        body=LABEL_BODY,
+        content_type='application/json',
+    )
+
+    collector = MetricsCollector()
+    api = make_api(observer=collector)
+
+    for _ in range(3):
+        api.get_label(TEST_LABEL)
+
+    duration = collector.histogram('duration', 'get_label', 'testing-machine')
+    assert duration.count == 3
+    assert collector.histogram('decode_time', 'get_label').count == 0
+    assert collector.outcomes('get_label', 'testing-machine') == {'200': 3}
+
+    text = collector.prometheus_text()
+    labels = 'operation="get_label",state_machine="testing-machine"'
+
+    assert '# TYPE routemaster_sdk_call_duration_seconds histogram' in text
+    assert (
+        'routemaster_sdk_call_network_seconds_bucket{{{0},le="+Inf"}} 3'.format(
+            labels,
+        )
+    ) in text
+    assert 'routemaster_sdk_call_decode_seconds_count{{{0}}} 3'.format(
+        labels,
+    ) in text
+    assert 'routemaster_sdk_calls_total{{{0},outcome="200"}} 3'.format(
+        labels,
+    ) in text
+    assert 'routemaster_sdk_bytes_received_total{{{0}}} {1}'.format(
+        labels,
+        3 * len(LABEL_BODY),
+    ) in text
+
+    collector.reset()
+    assert collector.outcomes('get_label', 'testing-machine') == {}
+
+
+def test_statsd_observer_sends_call_measurements():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(5)
+
+    observer = StatsdObserver(port=receiver.getsockname()[1], prefix='sdk')
+
+    call = Call('update_label', label=TEST_LABEL)
+    call.status = 200
+    call.bytes_sent = 12
+    call.network_time = 0.002
+    observer.call_finished(call, 0.003, None)
+
+    global_lines = observer.lines(Call('get_status'), 0)
+    assert global_lines[0] == 'sdk._global.get_status.duration:0.000|ms'
+
+    try:
+        packet = receiver.recv(4096).decode('utf-8')
+    finally:
+        receiver.close()
+        observer.close()
+
+    assert packet.splitlines() == [
+        'sdk.testing-machine.update_label.duration:3.000|ms',
+        'sdk.testing-machine.update_label.network:2.000|ms',
+        'sdk.testing-machine.update_label.decode:0.000|ms',
+        'sdk.testing-machine.update_label.build:0.000|ms',
+        'sdk.testing-machine.update_label.outcome.200:1|c',
+        'sdk.testing-machine.update_label.bytes_sent:12|c',
+        'sdk.testing-machine.update_label.bytes_received:0|c',
+    ]
+
+
+def test_async_api_observer():
+    observer = RecordingObserver()
+
+    run_with_api(
+        [(
+            'GET',
+            '/state-machines/testing-machine/labels/demo-label',
+            respond(body={'metadata': {'a': 1}, 'state': 'start'}),
+        )],
+        lambda api: api.get_label(TEST_LABEL),
+        observer=observer,
+    )
+
+    _, request, (_, call, error) = observer.events
+    assert request == ('request', 200)
+    assert error is None
+    assert call.bytes_received > 0
+    assert call.network_time > 0
+    assert call.decode_time > 0
+
+
+def test_async_api_observer_sees_errors():
+    observer = RecordingObserver()
+
+    with pytest.raises(UnknownLabel):
+        run_with_api(
+            [(
+                'GET',
+                '/state-machines/testing-machine/labels/demo-label',
+                respond(status=404),
+            )],
+            lambda api: api.get_label(TEST_LABEL),
+            observer=observer,
+        )
+
+    _, call, error = observer.events[-1]
+    assert call.status == 404
+    assert isinstance(error, UnknownLabel)
+
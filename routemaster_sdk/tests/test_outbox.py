@@ -0,0 +1,329 @@
+import time
+import threading
+
+import pytest
+import requests
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    CircuitOpen,
+    DeletedLabel,
+    StateMachine,
+    UnknownLabel,
+    RoutemasterAPI,
+    LabelAlreadyExists,
+    UnknownStateMachine,
+)
+from routemaster_sdk.codec import StdlibCodec
+from routemaster_sdk.outbox import MutationOutbox, is_transient
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+TEST_MACHINE = StateMachine('testing-machine')
+FIRST = LabelRef(LabelName('first'), TEST_MACHINE)
+SECOND = LabelRef(LabelName('second'), TEST_MACHINE)
+
+
+class FakeAPI:
+    """Records mutations, raising any errors queued for a label first."""
+
+    codec = StdlibCodec()
+
+    def __init__(self):
+        self.sent = []
+        self.errors = {}
+        self.attempts = 0
+        self.delivered = threading.Event()
+        self.attempted = threading.Event()
+
+    def _apply(self, operation, label, *args):
+        self.attempts += 1
+        self.attempted.set()
+        errors = self.errors.get(label)
+        if errors:
+            raise errors.pop(0)
+        self.sent.append((operation, label) + args)
+        self.delivered.set()
+        return Label(label, {}, State('start'))
+
+    def create_label(self, label, metadata):
+        return self._apply('create', label, metadata)
+
+    def update_label(self, label, metadata):
+        return self._apply('update', label, metadata)
+
+    def delete_label(self, label):
+        self._apply('delete', label)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+def test_is_transient():
+    assert is_transient(requests.ConnectionError())
+    assert is_transient(requests.Timeout())
+    assert is_transient(CircuitOpen(TEST_MACHINE, 1.0))
+    assert is_transient(http_error(503))
+    assert is_transient(http_error(429))
+    assert not is_transient(http_error(400))
+    assert not is_transient(DeletedLabel(FIRST))
+
+
+def test_mutations_survive_reopening_and_replay_in_order(tmp_path):
+    path = str(tmp_path / 'outbox.db')
+    api = FakeAPI()
+
+    with MutationOutbox(api, path, background=False) as outbox:
+        outbox.create_label(FIRST, {'a': 1})
+        outbox.update_label(FIRST, {'b': 2})
+        outbox.create_label(SECOND, {})
+        outbox.delete_label(FIRST)
+
+    with MutationOutbox(api, path, background=False) as outbox:
+        assert outbox.pending() == 4
+        assert outbox.drain()
+        assert outbox.pending() == 0
+
+    assert [m for m in api.sent if m[1] == FIRST] == [
+        ('create', FIRST, {'a': 1}),
+        ('update', FIRST, {'b': 2}),
+        ('delete', FIRST),
+    ]
+    assert ('create', SECOND, {}) in api.sent
+
+
+def test_transient_failures_hold_back_only_their_label(tmp_path):
+    api = FakeAPI()
+    api.errors[FIRST] = [requests.ConnectionError()]
+
+    with MutationOutbox(api, str(tmp_path / 'outbox.db'), background=False) as outbox:
+        outbox.update_label(FIRST, {'a': 1})
+        outbox.update_label(FIRST, {'a': 2})
+        outbox.update_label(SECOND, {'b': 1})
+
+        assert not outbox.drain()
+        assert api.sent == [('update', SECOND, {'b': 1})]
+        assert outbox.pending() == 2
+
+        assert outbox.drain()
+        assert api.sent[1:] == [
+            ('update', FIRST, {'a': 1}),
+            ('update', FIRST, {'a': 2}),
+        ]
+
+
+def test_replayed_mutations_already_applied_are_delivered(tmp_path):
+    api = FakeAPI()
+    api.errors[FIRST] = [LabelAlreadyExists(FIRST)]
+    api.errors[SECOND] = [DeletedLabel(SECOND)]
+    dropped = []
+
+    with MutationOutbox(
+        api,
+        str(tmp_path / 'outbox.db'),
+        on_error=lambda mutation, error: dropped.append((mutation, error)),
+        background=False,
+    ) as outbox:
+        outbox.create_label(FIRST, {})
+        outbox.delete_label(FIRST)
+        outbox.update_label(SECOND, {'a': 1})
+
+        assert outbox.drain()
+
+    (mutation, error), = dropped
+    assert mutation.operation == 'update'
+    assert mutation.label == SECOND
+    assert mutation.metadata == {'a': 1}
+    assert isinstance(error, UnknownLabel)
+
+
+def test_replayed_deletions_against_routemaster(tmp_path):
+    dropped = []
+    unknown = LabelRef(LabelName('first'), StateMachine('unknown-machine'))
+
+    with FakeRoutemaster(state_machines=('testing-machine',)) as server:
+        api = RoutemasterAPI.from_url(server.url)
+
+        with MutationOutbox(
+            api,
+            str(tmp_path / 'outbox.db'),
+            on_error=lambda mutation, error: dropped.append((mutation, error)),
+            background=False,
+        ) as outbox:
+            outbox.create_label(FIRST, {})
+            outbox.delete_label(FIRST)
+            # As if the process stopped before the deletion was dequeued.
+            outbox.delete_label(FIRST)
+            outbox.delete_label(unknown)
+
+            assert outbox.drain()
+
+        api.close()
+
+    (mutation, error), = dropped
+    assert mutation.label == unknown
+    assert isinstance(error, UnknownStateMachine)
+
+
+def test_failures_reported_by_routemaster_are_given_up(tmp_path):
+    api = FakeAPI()
+    api.errors[FIRST] = [http_error(503)] * 3
+    api.errors[SECOND] = [requests.ConnectionError()] * 3
+    dropped = []
+
+    with MutationOutbox(
+        api,
+        str(tmp_path / 'outbox.db'),
+        max_attempts=3,
+        on_error=lambda mutation, error: dropped.append((mutation, error)),
+        background=False,
+    ) as outbox:
+        outbox.update_label(FIRST, {'a': 1})
+        outbox.update_label(FIRST, {'a': 2})
+        outbox.update_label(SECOND, {'b': 1})
+
+        assert not outbox.drain()
+        assert not outbox.drain()
+        # The third 503 gives up on the mutation; connection errors don't.
+        assert not outbox.drain()
+        assert len(dropped) == 1
+        assert outbox.pending() == 2
+
+        assert outbox.drain()
+        assert len(api.sent) == 2
+        assert ('update', FIRST, {'a': 2}) in api.sent
+        assert ('update', SECOND, {'b': 1}) in api.sent
+
+    (mutation, error), = dropped
+    assert mutation.label == FIRST
+    assert mutation.metadata == {'a': 1}
+    assert mutation.attempts == 2
+    assert error.response.status_code == 503
+
+
+def test_connection_errors_do_not_use_up_attempts(tmp_path):
+    api = FakeAPI()
+    api.errors[FIRST] = [requests.ConnectionError()] * 12 + [http_error(503)]
+    dropped = []
+
+    with MutationOutbox(
+        api,
+        str(tmp_path / 'outbox.db'),
+        max_attempts=2,
+        on_error=lambda mutation, error: dropped.append((mutation, error)),
+        background=False,
+    ) as outbox:
+        outbox.update_label(FIRST, {'a': 1})
+
+        for _ in range(13):
+            assert not outbox.drain()
+        assert dropped == []
+
+        assert outbox.drain()
+
+    assert api.sent == [('update', FIRST, {'a': 1})]
+
+
+def test_queuing_does_not_cut_retries_short(tmp_path):
+    api = FakeAPI()
+    api.errors[FIRST] = [requests.ConnectionError()] * 100
+
+    outbox = MutationOutbox(
+        api,
+        str(tmp_path / 'outbox.db'),
+        retry_interval=30,
+        max_retry_interval=30,
+    )
+    outbox.update_label(FIRST, {'a': 0})
+    assert api.attempted.wait(5)
+
+    for index in range(50):
+        outbox.update_label(FIRST, {'a': index + 1})
+    time.sleep(0.2)
+
+    assert api.attempts == 1
+
+    # Closing does not wait for the retry.
+    start = time.monotonic()
+    outbox.close()
+    assert time.monotonic() - start < 5
+
+
+def wait_until_delivered(outbox, timeout=5):
+    deadline = time.monotonic() + timeout
+    while outbox.pending():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+class FlakyCodec(StdlibCodec):
+    def __init__(self, failures):
+        self.failures = failures
+
+    def loads(self, data):
+        if self.failures:
+            self.failures -= 1
+            raise ValueError("corrupt")
+        return super().loads(data)
+
+
+def test_background_delivery_survives_errors(tmp_path, caplog):
+    api = FakeAPI()
+    api.codec = FlakyCodec(failures=1)
+    api.errors[FIRST] = [DeletedLabel(FIRST)]
+
+    def on_error(mutation, error):
+        raise RuntimeError("callback failed")
+
+    with MutationOutbox(
+        api,
+        str(tmp_path / 'outbox.db'),
+        retry_interval=0.01,
+        on_error=on_error,
+    ) as outbox:
+        outbox.update_label(FIRST, {'a': 1})
+        outbox.update_label(SECOND, {'b': 1})
+        wait_until_delivered(outbox)
+
+        outbox.update_label(SECOND, {'b': 2})
+        wait_until_delivered(outbox)
+
+    assert api.sent == [
+        ('update', SECOND, {'b': 1}),
+        ('update', SECOND, {'b': 2}),
+    ]
+    assert [record.getMessage() for record in caplog.records] == [
+        "Failed to deliver queued mutations",
+        "on_error failed for mutation 1",
+    ]
+
+
+def test_background_delivery(tmp_path):
+    api = FakeAPI()
+
+    with MutationOutbox(api, str(tmp_path / 'outbox.db')) as outbox:
+        outbox.update_label(FIRST, {'a': 1})
+        assert api.delivered.wait(5)
+
+    assert api.sent == [('update', FIRST, {'a': 1})]
+
+    with pytest.raises(RuntimeError):
+        outbox.update_label(FIRST, {})
+
+
+def test_invalid_retry_intervals(tmp_path):
+    with pytest.raises(ValueError):
+        MutationOutbox(
+            FakeAPI(),
+            str(tmp_path / 'outbox.db'),
+            retry_interval=10,
+            max_retry_interval=1,
+        )
+
+    with pytest.raises(ValueError):
+        MutationOutbox(FakeAPI(), str(tmp_path / 'outbox.db'), max_attempts=0)
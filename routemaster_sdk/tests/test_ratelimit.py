@@ -0,0 +1,176 @@
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    LabelRef,
+    LabelName,
+    CircuitOpen,
+    StateMachine,
+    CircuitBreaker,
+    RoutemasterAPI,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.ratelimit import RateLimiter
+from routemaster_sdk.tests.test_async_api import respond, run_with_api
+
+BACKFILL = StateMachine('backfill')
+PRODUCTION = StateMachine('production')
+TEST_LABEL = LabelRef(LabelName('demo-label'), BACKFILL)
+
+
+def test_global_rate_with_bursts(clock):
+    limiter = RateLimiter(rate=10, burst=0.5, clock=clock)
+
+    assert [limiter.acquire(None) for _ in range(5)] == [0] * 5
+    assert limiter.acquire(None) == pytest.approx(0.1)
+    assert limiter.acquire(PRODUCTION) == pytest.approx(0.2)
+
+    clock.now = 10
+    assert limiter.acquire(None) == 0
+
+
+def test_try_acquire_takes_only_available_tokens(clock):
+    limiter = RateLimiter(rate=10, state_machine_rates={BACKFILL: 1}, clock=clock)
+
+    assert limiter.try_acquire(BACKFILL) is True
+    assert limiter.try_acquire(BACKFILL) is False
+    # The global bucket's token was not taken by the refused request.
+    assert limiter.acquire(None) == 0
+
+    limiter.record(PRODUCTION, 429, retry_after=2)
+    assert limiter.try_acquire(PRODUCTION) is False
+    assert limiter.acquire(BACKFILL) == pytest.approx(1)
+
+    clock.now = 10
+    assert limiter.try_acquire(BACKFILL) is True
+
+
+def test_state_machine_rates(clock):
+    limiter = RateLimiter(
+        state_machine_rates={BACKFILL: 1},
+        default_state_machine_rate=100,
+        clock=clock,
+    )
+
+    assert limiter.acquire(BACKFILL) == 0
+    assert limiter.acquire(BACKFILL) == pytest.approx(1)
+    assert limiter.acquire(PRODUCTION) == 0
+    assert limiter.acquire(None) == 0
+    assert limiter.current_rate(BACKFILL) == 1
+    assert limiter.current_rate() is None
+
+
+def test_adapts_to_too_many_requests(clock):
+    limiter = RateLimiter(
+        state_machine_rates={BACKFILL: 10},
+        recovery_time=10,
+        clock=clock,
+    )
+
+    limiter.record(BACKFILL, 200)
+    assert limiter.current_rate(BACKFILL) == 10
+
+    limiter.record(BACKFILL, 429, retry_after=2)
+    assert limiter.current_rate(BACKFILL) == 5
+    assert limiter.acquire(BACKFILL) == pytest.approx(2)
+    assert limiter.acquire(PRODUCTION) == 0
+
+    clock.now = 5
+    assert limiter.current_rate(BACKFILL) == 10
+
+    for _ in range(10):
+        limiter.record(BACKFILL, 429)
+    assert limiter.current_rate(BACKFILL) == 1
+
+
+def test_retry_after_pauses_unlimited_state_machines(clock):
+    limiter = RateLimiter(clock=clock)
+
+    limiter.record(PRODUCTION, 429, retry_after=3)
+
+    assert limiter.acquire(PRODUCTION) == 3
+    assert limiter.acquire(BACKFILL) == 0
+
+
+def test_invalid_rates():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+    with pytest.raises(ValueError):
+        RateLimiter(state_machine_rates={BACKFILL: -1})
+
+
+@httpretty.activate
+def test_api_waits_for_the_rate_limiter(monkeypatch, clock):
+    httpretty.register_uri(
+        httpretty.POST,
+        'http://localhost:2017/state-machines/backfill/labels/demo-label',
+        responses=[
+            httpretty.Response(body='', status=429, adding_headers={
+                'Retry-After': '7',
+            }),
+            httpretty.Response(
+                body='{"metadata": {}, "state": "start"}',
+                content_type='application/json',
+            ),
+        ],
+    )
+
+    sleeps = []
+    monkeypatch.setattr('routemaster_sdk.api.time.sleep', sleeps.append)
+
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        rate_limiter=RateLimiter(state_machine_rates={BACKFILL: 1}, clock=clock),
+    )
+
+    with pytest.raises(requests.HTTPError):
+        api.create_label(TEST_LABEL, {})
+    assert sleeps == []
+
+    api.create_label(TEST_LABEL, {})
+    assert sleeps == [pytest.approx(7)]
+
+
+def test_open_circuit_does_not_take_a_token(monkeypatch, clock):
+    sleeps = []
+    monkeypatch.setattr('routemaster_sdk.api.time.sleep', sleeps.append)
+
+    breaker = CircuitBreaker(minimum_calls=1, window=1)
+    breaker.before_request(BACKFILL)
+    breaker.record(BACKFILL, success=False)
+
+    limiter = RateLimiter(state_machine_rates={BACKFILL: 1}, clock=clock)
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        rate_limiter=limiter,
+        circuit_breaker=breaker,
+    )
+
+    for _ in range(3):
+        with pytest.raises(CircuitOpen):
+            api.create_label(TEST_LABEL, {})
+
+    assert sleeps == []
+    assert limiter.acquire(BACKFILL) == 0
+
+
+def test_async_api_waits_for_the_rate_limiter(clock):
+    limiter = RateLimiter(default_state_machine_rate=1000, clock=clock)
+
+    async def test(api):
+        try:
+            await api.get_labels(BACKFILL)
+        except Exception as e:
+            return e
+
+    error = run_with_api(
+        [('GET', '/state-machines/backfill/labels', respond(status=429))],
+        test,
+        rate_limiter=limiter,
+    )
+
+    assert error.status == 429
+    assert limiter.current_rate(BACKFILL) == 500
@@ -0,0 +1,231 @@
+import json
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    RetryBudget,
+    RetryPolicy,
+    StateMachine,
+    RoutemasterAPI,
+    LabelAlreadyExists,
+)
+from routemaster_sdk.retry import parse_retry_after
+from routemaster_sdk.conftest import TEST_API_URL
+
+TEST_LABEL = LabelRef(LabelName('demo-label'), StateMachine('testing-machine'))
+TEST_LABEL_URL = (
+    'http://localhost:2017/state-machines/testing-machine/labels/demo-label'
+)
+
+
+def make_policy(**kwargs):
+    kwargs.setdefault('backoff_base', 0)
+    kwargs.setdefault('budget', RetryBudget())
+    return RetryPolicy(**kwargs)
+
+
+@pytest.mark.parametrize('operation, status, expected', [
+    ('get_label', 503, True),
+    ('get_label', 502, True),
+    ('get_label', 500, False),
+    ('get_label', 404, False),
+    ('delete_label', 504, True),
+    ('create_label', 502, True),
+    ('update_label', 502, False),
+    ('update_label', 504, False),
+    ('update_label', 503, True),
+    ('update_label', 429, True),
+])
+def test_is_retryable_status(operation, status, expected):
+    assert make_policy().is_retryable(operation, status=status) is expected
+
+
+@pytest.mark.parametrize('operation, sent, expected', [
+    ('get_label', True, True),
+    ('create_label', True, True),
+    ('update_label', True, False),
+    ('update_label', False, True),
+])
+def test_is_retryable_connection_error(operation, sent, expected):
+    assert make_policy().is_retryable(operation, sent=sent) is expected
+
+
+def test_should_retry_respects_max_attempts():
+    policy = make_policy(max_attempts=2)
+
+    assert policy.should_retry('get_label', 1, status=503)
+    assert not policy.should_retry('get_label', 2, status=503)
+
+
+def test_backoff_is_exponential_with_full_jitter():
+    policy = RetryPolicy(backoff_base=0.5, backoff_max=3, rng=lambda: 1.0)
+
+    assert [policy.backoff(n) for n in (1, 2, 3, 4)] == [0.5, 1, 2, 3]
+    assert RetryPolicy(rng=lambda: 0.0).backoff(3) == 0
+
+
+def test_backoff_respects_retry_after():
+    policy = RetryPolicy(backoff_max=5, rng=lambda: 0.0)
+
+    assert policy.backoff(1, retry_after=2) == 2
+    assert policy.backoff(1, retry_after=60) == 5
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') is None
+
+
+def test_budget_limits_retries_to_a_ratio_of_requests(clock):
+    budget = RetryBudget(
+        ratio=0.5,
+        min_per_second=0,
+        max_balance=1,
+        clock=clock,
+    )
+
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_budget_refills_over_time(clock):
+    budget = RetryBudget(min_per_second=1, max_balance=2, clock=clock)
+
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    clock.now = 100
+    assert budget.withdraw()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_exhausted_budget_prevents_retry():
+    budget = RetryBudget(ratio=0, min_per_second=0, max_balance=0)
+    policy = make_policy(budget=budget)
+
+    assert not policy.should_retry('get_label', 1, status=503)
+
+
+def make_api(**kwargs):
+    return RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        retry_policy=make_policy(**kwargs),
+    )
+
+
+def label_response(status=200):
+    return httpretty.Response(
+        body=json.dumps({'metadata': {}, 'state': 'start'}),
+        content_type='application/json',
+        status=status,
+    )
+
+
+@httpretty.activate
+def test_get_label_retries_transient_errors():
+    httpretty.register_uri(
+        httpretty.GET,
+        TEST_LABEL_URL,
+        responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body='', status=502),
+            label_response(),
+        ],
+    )
+
+    label = make_api().get_label(TEST_LABEL)
+
+    assert label == Label(TEST_LABEL, {}, State('start'))
+
+
+@httpretty.activate
+def test_gives_up_after_max_attempts():
+    httpretty.register_uri(
+        httpretty.GET,
+        TEST_LABEL_URL,
+        responses=[
+            httpretty.Response(body='', status=503),
+            httpretty.Response(body='', status=503),
+            label_response(),
+        ],
+    )
+
+    with pytest.raises(requests.HTTPError):
+        make_api(max_attempts=2).get_label(TEST_LABEL)
+
+
+@httpretty.activate
+def test_update_label_is_not_retried_after_bad_gateway():
+    httpretty.register_uri(
+        httpretty.PATCH,
+        TEST_LABEL_URL,
+        responses=[
+            httpretty.Response(body='', status=502),
+            label_response(),
+        ],
+    )
+
+    with pytest.raises(requests.HTTPError):
+        make_api().update_label(TEST_LABEL, {})
+
+
+@httpretty.activate
+def test_create_label_conflict_after_retry_is_success():
+    httpretty.register_uri(
+        httpretty.POST,
+        TEST_LABEL_URL,
+        responses=[
+            httpretty.Response(body='', status=504),
+            httpretty.Response(body='', status=409),
+        ],
+    )
+    httpretty.register_uri(httpretty.GET, TEST_LABEL_URL, responses=[
+        label_response(),
+    ])
+
+    label = make_api().create_label(TEST_LABEL, {})
+
+    assert label == Label(TEST_LABEL, {}, State('start'))
+
+
+@httpretty.activate
+def test_create_label_conflict_without_retry_is_an_error():
+    httpretty.register_uri(httpretty.POST, TEST_LABEL_URL, status=409)
+
+    with pytest.raises(LabelAlreadyExists):
+        make_api().create_label(TEST_LABEL, {})
+
+
+def test_connection_refused_is_retried_for_updates():
+    attempts = []
+
+    class FailingSession(requests.Session):
+        def patch(self, url, **kwargs):
+            attempts.append(url)
+            return super().patch(url, **kwargs)
+
+    api = RoutemasterAPI(
+        api_url='http://127.0.0.1:1',
+        session=FailingSession(),
+        retry_policy=make_policy(max_attempts=3),
+    )
+
+    with pytest.raises(requests.ConnectionError):
+        api.update_label(TEST_LABEL, {})
+
+    assert len(attempts) == 3
@@ -0,0 +1,89 @@
+import pytest
+
+from routemaster_sdk import LabelRef, LabelName, StateMachine, RoutemasterAPI
+from routemaster_sdk.routes import Routes, quote_segment
+from routemaster_sdk.benchmarks.routes import run, urljoin_label_url
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+TEST_MACHINE = StateMachine('testing-machine')
+
+
+def label(name, state_machine=TEST_MACHINE):
+    return LabelRef(LabelName(name), state_machine)
+
+
+def test_quote_segment():
+    assert quote_segment('demo-label_1.0~') == 'demo-label_1.0~'
+    assert quote_segment('a/b?c#d%e f') == 'a%2Fb%3Fc%23d%25e%20f'
+    assert quote_segment('café') == 'caf%C3%A9'
+    assert quote_segment('.') == '%2E'
+    assert quote_segment('..') == '%2E%2E'
+    assert quote_segment('...') == '...'
+    assert quote_segment('.hidden') == '.hidden'
+
+
+@pytest.mark.parametrize('api_url', (
+    'http://localhost:2017',
+    'http://localhost:2017/',
+    'http://localhost:2017/api/',
+))
+def test_routes_match_urljoin_for_plain_names(api_url):
+    routes = Routes(api_url)
+    ref = label('demo-label')
+
+    assert routes.label(ref) == urljoin_label_url(api_url, ref)
+    assert routes.state_machine(TEST_MACHINE) + '/demo-label' == routes.label(ref)
+
+
+def test_routes_quote_names():
+    routes = Routes('http://localhost:2017')
+
+    assert routes.root == 'http://localhost:2017'
+    assert routes.state_machines == 'http://localhost:2017/state-machines'
+    assert routes.label(label('a/b#c', StateMachine('x?y'))) == (
+        'http://localhost:2017/state-machines/x%3Fy/labels/a%2Fb%23c'
+    )
+
+
+def test_routes_quote_dot_segments():
+    routes = Routes('http://localhost:2017')
+
+    assert routes.label(label('..', StateMachine('.'))) == (
+        'http://localhost:2017/state-machines/%2E/labels/%2E%2E'
+    )
+
+
+def test_state_machine_prefixes_are_bounded():
+    routes = Routes('http://localhost:2017', max_prefixes=2)
+
+    for index in range(5):
+        routes.state_machine(StateMachine('machine-{0}'.format(index)))
+
+    assert len(routes._prefixes) <= 2
+    assert routes.state_machine(StateMachine('machine-0')).endswith(
+        '/state-machines/machine-0/labels',
+    )
+
+
+def test_labels_with_reserved_characters_round_trip():
+    ref = label('orders/42?region=eu#1')
+
+    with FakeRoutemaster(state_machines=('testing-machine',)) as server:
+        api = RoutemasterAPI.from_url(server.url)
+
+        api.create_label(ref, {'a': 1})
+        assert api.get_label(ref).metadata == {'a': 1}
+        assert api.get_labels(TEST_MACHINE) == [ref]
+
+        for name in ('.', '..'):
+            api.create_label(label(name), {'name': name})
+            assert api.get_label(label(name)).metadata == {'name': name}
+
+        api.close()
+
+
+def test_benchmark_runs():
+    rows = run(number=10, repeat=1)
+
+    assert [row['name'] for row in rows] == ['plain', 'quoted']
+    assert all(row['routes_us'] > 0 for row in rows)
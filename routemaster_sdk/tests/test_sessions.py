@@ -0,0 +1,183 @@
+import os
+import socket
+import threading
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import RetryPolicy, RoutemasterAPI
+from routemaster_sdk.sessions import (
+    DEFAULT_MAX_RETRIES,
+    TunedHTTPAdapter,
+    ThreadLocalSession,
+    build_session,
+)
+
+
+def test_build_session_configures_pool():
+    session = build_session(pool_size=50, pool_block=True, max_retries=3)
+    adapter = session.get_adapter('http://localhost:2017/')
+
+    assert isinstance(adapter, TunedHTTPAdapter)
+    assert adapter._pool_maxsize == 50
+    assert adapter._pool_block is True
+    assert adapter.max_retries.total == 3
+    assert session.get_adapter('https://example.com/') is adapter
+
+
+def test_keepalive_socket_option():
+    adapter = build_session().get_adapter('http://localhost:2017/')
+    socket_options = adapter.poolmanager.connection_pool_kw['socket_options']
+
+    assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in socket_options
+
+
+def test_without_keepalive_connections_are_closed():
+    session = build_session(keepalive=False)
+    adapter = session.get_adapter('http://localhost:2017/')
+
+    assert 'socket_options' not in adapter.poolmanager.connection_pool_kw
+    assert session.headers['Connection'] == 'close'
+
+
+@httpretty.activate
+def test_connection_pool_stats():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/',
+        body='{"status": "ok"}',
+        content_type='application/json',
+    )
+
+    api = RoutemasterAPI.from_url('http://localhost:2017', pool_size=4)
+    assert api.connection_pool_stats() == []
+
+    api.get_status()
+    api.get_status()
+
+    stats, = api.connection_pool_stats()
+    assert stats.host == 'http://localhost:2017'
+    assert stats.max_size == 4
+    assert stats.in_use == 0
+    assert stats.requests_made == 2
+
+    api.close()
+
+
+@httpretty.activate
+def test_thread_local_session_shares_pools_between_threads():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/',
+        body='{"status": "ok"}',
+        content_type='application/json',
+    )
+
+    api = RoutemasterAPI.from_url(
+        'http://localhost:2017',
+        pool_size=4,
+        thread_local=True,
+    )
+    session = api._session
+    assert isinstance(session, ThreadLocalSession)
+
+    thread_sessions = []
+
+    def work():
+        api.get_status()
+        thread_sessions.append(session._thread_session())
+
+    threads = [threading.Thread(target=work) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, thread_sessions))) == 3
+    assert all(
+        thread_session.adapters['http://'] is session.adapters['http://']
+        for thread_session in thread_sessions
+    )
+
+    stats, = api.connection_pool_stats()
+    assert stats.requests_made == 3
+
+    api.close()
+
+
+def test_thread_local_session_copies_configuration():
+    session = build_session(keepalive=False, thread_local=True)
+    session.auth = ('user', 'password')
+
+    thread_session = session._thread_session()
+
+    assert thread_session.headers['Connection'] == 'close'
+    assert thread_session.auth == ('user', 'password')
+    assert session._thread_session() is thread_session
+
+
+def test_thread_local_session_replaces_adapters_after_fork(monkeypatch):
+    session = build_session(thread_local=True)
+    thread_session = session._thread_session()
+    adapter = session.get_adapter('http://localhost:2017/')
+
+    monkeypatch.setattr(os, 'getpid', lambda: -1)
+    forked_session = session._thread_session()
+
+    assert forked_session is not thread_session
+    assert session.get_adapter('http://localhost:2017/') is not adapter
+    assert forked_session.adapters['http://'] is not adapter
+
+
+def test_from_url_leaves_retries_to_the_retry_policy():
+    adapter = RoutemasterAPI.from_url('http://localhost:2017')._session.get_adapter(
+        'http://localhost:2017/',
+    )
+    assert adapter.max_retries.total == DEFAULT_MAX_RETRIES
+
+    api = RoutemasterAPI.from_url(
+        'http://localhost:2017',
+        retry_policy=RetryPolicy(),
+    )
+    adapter = api._session.get_adapter('http://localhost:2017/')
+    assert adapter.max_retries.total == 0
+
+    api = RoutemasterAPI.from_url(
+        'http://localhost:2017',
+        max_retries=1,
+        retry_policy=RetryPolicy(),
+    )
+    adapter = api._session.get_adapter('http://localhost:2017/')
+    assert adapter.max_retries.total == 1
+
+
+def test_retry_policy_attempts_are_not_multiplied():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(16)
+    connections = []
+
+    def serve():
+        while True:
+            try:
+                connection, _ = listener.accept()
+            except OSError:
+                return
+            connections.append(connection)
+            # Drop the connection without answering.
+            connection.close()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    api = RoutemasterAPI.from_url(
+        'http://127.0.0.1:{0}'.format(listener.getsockname()[1]),
+        retry_policy=RetryPolicy(max_attempts=2, backoff_base=0),
+    )
+    with pytest.raises(requests.ConnectionError):
+        api.get_status()
+
+    api.close()
+    listener.close()
+    assert len(connections) == 2
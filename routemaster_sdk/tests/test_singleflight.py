@@ -0,0 +1,191 @@
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+import requests
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    StateMachine,
+    UnknownLabel,
+    RoutemasterAPI,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.singleflight import SingleFlight, AsyncSingleFlight
+from routemaster_sdk.tests.test_async_api import respond, run_with_api
+
+TEST_MACHINE = StateMachine('testing-machine')
+TEST_LABEL = LabelRef(LabelName('demo-label'), TEST_MACHINE)
+LABEL_BODY = {'metadata': {'a': 1}, 'state': 'start'}
+
+
+class BlockingSession:
+    """Holds every request until released, then answers with ``status``."""
+
+    def __init__(self, status=200, body=LABEL_BODY):
+        self.status = status
+        self.body = body
+        self.requests = []
+        self.received = threading.Event()
+        self.released = threading.Event()
+
+    def get(self, url, **kwargs):
+        self.requests.append(url)
+        self.received.set()
+        self.released.wait(5)
+
+        response = requests.Response()
+        response.status_code = self.status
+        response._content = json.dumps(self.body).encode('utf-8')
+        return response
+
+    delete = patch = post = get
+
+
+def call_concurrently(func, count=10):
+    results = [None] * count
+    started = threading.Barrier(count + 1)
+
+    def run(index):
+        started.wait()
+        try:
+            results[index] = func()
+        except Exception as e:
+            results[index] = e
+
+    threads = [
+        threading.Thread(target=run, args=(index,))
+        for index in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    return threads, results
+
+
+def test_single_flight_runs_calls_afresh_once_finished():
+    flights = SingleFlight()
+
+    def func():
+        return flights.do('key', lambda: 'nested')
+
+    assert flights.do('key', lambda: 'value') == 'value'
+    assert flights.do('other', func) == 'nested'
+    assert flights.in_flight() == 0
+
+    with pytest.raises(KeyError):
+        flights.do('key', lambda: {}['missing'])
+    assert flights.in_flight() == 0
+
+
+def test_concurrent_get_label_calls_share_a_request():
+    session = BlockingSession()
+    api = RoutemasterAPI(TEST_API_URL, session, single_flight=True)
+
+    threads, results = call_concurrently(lambda: api.get_label(TEST_LABEL))
+    session.received.wait(5)
+    # Give the other callers time to join the request in flight.
+    time.sleep(0.1)
+    session.released.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(session.requests) == 1
+    assert results == [Label(TEST_LABEL, {'a': 1}, State('start'))] * 10
+    assert api._flights.in_flight() == 0
+
+
+def test_concurrent_get_label_calls_share_errors():
+    session = BlockingSession(status=404, body={})
+    api = RoutemasterAPI(TEST_API_URL, session, single_flight=True)
+
+    threads, results = call_concurrently(lambda: api.get_label(TEST_LABEL))
+    session.received.wait(5)
+    # Give the other callers time to join the request in flight.
+    time.sleep(0.1)
+    session.released.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(session.requests) == 1
+    assert all(isinstance(result, UnknownLabel) for result in results)
+
+
+def test_get_label_without_single_flight_sends_every_request():
+    session = BlockingSession()
+    session.released.set()
+    api = RoutemasterAPI(TEST_API_URL, session)
+
+    threads, results = call_concurrently(lambda: api.get_label(TEST_LABEL), 3)
+    for thread in threads:
+        thread.join()
+
+    assert len(session.requests) == 3
+
+
+def test_async_concurrent_reads_share_requests():
+    received = []
+
+    async def handler(request):
+        received.append(request.path)
+        await asyncio.sleep(0.05)
+        if request.path.endswith('/labels'):
+            body = {'labels': [{'name': 'demo-label'}]}
+        else:
+            body = LABEL_BODY
+        return await respond(body=body)(request)
+
+    async def test(api):
+        return await asyncio.gather(*(
+            [api.get_label(TEST_LABEL) for _ in range(5)]
+            + [api.get_labels(TEST_MACHINE) for _ in range(5)]
+        ))
+
+    results = run_with_api(
+        [
+            ('GET', '/state-machines/testing-machine/labels', handler),
+            ('GET', '/state-machines/testing-machine/labels/demo-label', handler),
+        ],
+        test,
+        single_flight=True,
+    )
+
+    assert sorted(received) == [
+        '/state-machines/testing-machine/labels',
+        '/state-machines/testing-machine/labels/demo-label',
+    ]
+    assert results[:5] == [Label(TEST_LABEL, {'a': 1}, State('start'))] * 5
+    assert results[5:] == [[TEST_LABEL]] * 5
+
+
+def test_async_single_flight_survives_cancelled_leader():
+    flights = AsyncSingleFlight()
+
+    async def go():
+        gate = asyncio.Event()
+
+        async def func():
+            await gate.wait()
+            return 'value'
+
+        leader = asyncio.ensure_future(flights.do('key', func))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do('key', func))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        gate.set()
+        return await follower
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(go()) == 'value'
+    finally:
+        loop.close()
+
+    assert flights.in_flight() == 0
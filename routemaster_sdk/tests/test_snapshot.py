@@ -0,0 +1,112 @@
+import pytest
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    StateMachine,
+    LabelSnapshot,
+    RoutemasterAPI,
+)
+from routemaster_sdk.compact import CompactLabel
+from routemaster_sdk.snapshot import ExportResult, write_snapshot
+from routemaster_sdk.exceptions import UnknownStateMachine
+from routemaster_sdk.benchmarks.server import FakeRoutemaster
+
+TEST_MACHINE = StateMachine('testing-machine')
+
+
+def make_label(name, state, metadata):
+    return Label(LabelRef(LabelName(name), TEST_MACHINE), metadata, State(state))
+
+
+@pytest.fixture()
+def snapshot_path(tmp_path):
+    path = str(tmp_path / 'labels.snapshot')
+    write_snapshot(path, TEST_MACHINE, iter([
+        make_label('c', 'done', {'n': 3}),
+        make_label('a', 'start', {'n': 1}),
+        make_label('é/x', 'done', {'n': 4}),
+        make_label('b', 'start', {'n': 2}),
+    ]))
+    return path
+
+
+def test_queries(snapshot_path):
+    with LabelSnapshot(snapshot_path) as snapshot:
+        assert len(snapshot) == 4
+        assert snapshot.state_machine == TEST_MACHINE
+        assert snapshot.states() == {'start': 2, 'done': 2}
+        assert snapshot.count(State('done')) == 2
+        assert snapshot.count(State('unknown')) == 0
+
+        assert [ref.name for ref in snapshot.labels_in_state(State('done'))] == [
+            'c',
+            'é/x',
+        ]
+        assert list(snapshot.labels_in_state(State('unknown'))) == []
+
+        assert snapshot.state_of(LabelName('b')) == 'start'
+        assert snapshot.state_of(LabelName('bb')) is None
+
+        label = snapshot.get(LabelName('é/x'))
+        assert isinstance(label, CompactLabel)
+        assert label == make_label('é/x', 'done', {'n': 4})
+        assert snapshot.get(LabelName('z')) is None
+
+        assert [label.metadata['n'] for label in snapshot] == [3, 1, 4, 2]
+
+
+def test_empty_snapshot(tmp_path):
+    path = str(tmp_path / 'empty.snapshot')
+    assert write_snapshot(path, TEST_MACHINE, iter([])) == 0
+
+    with LabelSnapshot(path) as snapshot:
+        assert len(snapshot) == 0
+        assert snapshot.states() == {}
+        assert snapshot.get(LabelName('a')) is None
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'other'
+    path.write_bytes(b'{"labels": []}' * 4)
+
+    with pytest.raises(ValueError):
+        LabelSnapshot(str(path))
+
+
+def test_failed_write_keeps_existing_file(snapshot_path):
+    def labels():
+        yield make_label('d', 'start', {})
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        write_snapshot(snapshot_path, TEST_MACHINE, labels())
+
+    with LabelSnapshot(snapshot_path) as snapshot:
+        assert len(snapshot) == 4
+
+
+def test_export_state_machine(tmp_path):
+    path = str(tmp_path / 'export.snapshot')
+
+    with FakeRoutemaster(state_machines=('testing-machine',)) as server:
+        server.seed(
+            'testing-machine',
+            ['label-{0}'.format(index) for index in range(25)],
+            {'source': 'seed'},
+        )
+        api = RoutemasterAPI.from_url(server.url, compact_labels=True)
+
+        result = api.export_state_machine(TEST_MACHINE, path, max_in_flight=4)
+        assert result == ExportResult(TEST_MACHINE, labels=25, skipped=0)
+
+        with pytest.raises(UnknownStateMachine):
+            api.export_state_machine(StateMachine('unknown'), path)
+
+        api.close()
+
+    with LabelSnapshot(path) as snapshot:
+        assert snapshot.states() == {'start': 25}
+        assert snapshot.get(LabelName('label-7')).metadata == {'source': 'seed'}
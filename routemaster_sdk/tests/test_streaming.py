@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from routemaster_sdk.streaming import iter_json_array
+
+
+def chunked(document, size):
+    data = document.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 4096])
+def test_yields_items_from_any_chunking(size):
+    document = json.dumps({
+        'before': {'labels': ['not', 'these']},
+        'labels': [{'name': 'ünïcode'}, {'name': 'b', 'n': 12345}, 7],
+        'after': 3.25,
+    })
+
+    items = list(iter_json_array(chunked(document, size), 'labels'))
+
+    assert items == [{'name': 'ünïcode'}, {'name': 'b', 'n': 12345}, 7]
+
+
+def test_empty_array():
+    assert list(iter_json_array([b'{"labels": [ ]}'], 'labels')) == []
+
+
+def test_missing_key():
+    assert list(iter_json_array([b'{"other": []}'], 'labels')) == []
+
+
+def test_empty_object():
+    assert list(iter_json_array([b' { } '], 'labels')) == []
+
+
+def test_items_are_yielded_before_the_body_ends():
+    def chunks():
+        yield b'{"labels": [{"name": "first"}, '
+        raise AssertionError("Read past the first item")
+
+    assert next(iter_json_array(chunks(), 'labels')) == {'name': 'first'}
+
+
+def test_truncated_document():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'{"labels": [{"name": "a"}, {"na'], 'labels'))
+
+
+def test_not_an_object():
+    with pytest.raises(ValueError):
+        list(iter_json_array([b'[]'], 'labels'))
@@ -0,0 +1,144 @@
+import json
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    LabelRef,
+    LabelName,
+    StateMachine,
+    UnknownLabel,
+    RoutemasterAPI,
+    MetricsCollector,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+from routemaster_sdk.instrumentation import CompositeObserver
+from routemaster_sdk.tests.test_async_api import respond, run_with_api
+
+sdk_trace = pytest.importorskip('opentelemetry.sdk.trace')
+in_memory = pytest.importorskip(
+    'opentelemetry.sdk.trace.export.in_memory_span_exporter',
+)
+export = pytest.importorskip('opentelemetry.sdk.trace.export')
+
+from routemaster_sdk.tracing import OpenTelemetryObserver  # noqa: E402
+
+TEST_LABEL = LabelRef(LabelName('demo-label'), StateMachine('testing-machine'))
+TEST_LABEL_URL = (
+    'http://localhost:2017/state-machines/testing-machine/labels/demo-label'
+)
+
+
+def traceparent_prefix(span):
+    return '00-{0:032x}-{1:016x}-'.format(
+        span.context.trace_id,
+        span.context.span_id,
+    )
+
+
+@pytest.fixture()
+def tracing():
+    exporter = in_memory.InMemorySpanExporter()
+    provider = sdk_trace.TracerProvider()
+    provider.add_span_processor(export.SimpleSpanProcessor(exporter))
+    return provider, exporter
+
+
+def make_api(observer):
+    return RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        observer=observer,
+    )
+
+
+@httpretty.activate
+def test_span_per_call_with_propagated_context(tracing):
+    provider, exporter = tracing
+
+    httpretty.register_uri(
+        httpretty.GET,
+        TEST_LABEL_URL,
+        body=json.dumps({'metadata': {}, 'state': 'start'}),
+        content_type='application/json',
+    )
+
+    api = make_api(OpenTelemetryObserver(tracer_provider=provider))
+    tracer = provider.get_tracer('tests')
+
+    with tracer.start_as_current_span('handling-request') as parent:
+        api.get_label(TEST_LABEL)
+
+    span, parent_span = exporter.get_finished_spans()
+    assert span.name == 'routemaster get_label'
+    assert span.parent.span_id == parent.get_span_context().span_id
+    assert span.attributes['routemaster.state_machine'] == 'testing-machine'
+    assert span.attributes['routemaster.label'] == 'demo-label'
+    assert span.attributes['http.response.status_code'] == 200
+    assert span.attributes['routemaster.attempts'] == 1
+    assert [event.name for event in span.events] == ['request']
+
+    traceparent = httpretty.last_request().headers['traceparent']
+    assert traceparent.startswith(traceparent_prefix(span))
+
+
+@httpretty.activate
+def test_failed_call_span(tracing):
+    provider, exporter = tracing
+
+    httpretty.register_uri(httpretty.GET, TEST_LABEL_URL, status=404)
+
+    collector = MetricsCollector()
+    api = make_api(CompositeObserver([
+        collector,
+        OpenTelemetryObserver(tracer_provider=provider),
+    ]))
+
+    with pytest.raises(UnknownLabel):
+        api.get_label(TEST_LABEL)
+
+    span, = exporter.get_finished_spans()
+    assert not span.status.is_ok
+    assert span.attributes['http.response.status_code'] == 404
+    assert span.events[-1].name == 'exception'
+    assert collector.outcomes('get_label', 'testing-machine') == {'404': 1}
+
+
+@httpretty.activate
+def test_bulk_calls_join_the_callers_trace(tracing):
+    provider, exporter = tracing
+
+    httpretty.register_uri(httpretty.DELETE, TEST_LABEL_URL, status=204)
+
+    api = make_api(OpenTelemetryObserver(tracer_provider=provider))
+    tracer = provider.get_tracer('tests')
+
+    with tracer.start_as_current_span('handling-request') as parent:
+        api.delete_labels([TEST_LABEL, TEST_LABEL])
+
+    trace_id = parent.get_span_context().trace_id
+    spans = exporter.get_finished_spans()
+
+    assert len(spans) == 3
+    assert all(span.context.trace_id == trace_id for span in spans)
+
+
+def test_async_api_tracing(tracing):
+    provider, exporter = tracing
+    received = []
+
+    async def handler(request):
+        received.append(request.headers.get('traceparent'))
+        return await respond(body={'metadata': {}, 'state': 'start'})(request)
+
+    run_with_api(
+        [('GET', '/state-machines/testing-machine/labels/demo-label', handler)],
+        lambda api: api.get_label(TEST_LABEL),
+        observer=OpenTelemetryObserver(tracer_provider=provider),
+    )
+
+    span, = exporter.get_finished_spans()
+    assert span.name == 'routemaster get_label'
+    traceparent, = received
+    assert traceparent.startswith(traceparent_prefix(span))
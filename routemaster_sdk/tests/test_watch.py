@@ -0,0 +1,230 @@
+import json
+import asyncio
+
+import pytest
+import requests
+import httpretty
+
+from routemaster_sdk import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    LabelCache,
+    CompactLabel,
+    DeletedLabel,
+    StateMachine,
+    UnknownLabel,
+    RoutemasterAPI,
+)
+from routemaster_sdk.codec import StdlibCodec
+from routemaster_sdk.watch import (
+    LabelChange,
+    LabelWatcher,
+    AsyncLabelWatcher,
+    fingerprint,
+)
+from routemaster_sdk.conftest import TEST_API_URL
+
+TEST_MACHINE = StateMachine('testing-machine')
+FIRST = LabelRef(LabelName('first'), TEST_MACHINE)
+SECOND = LabelRef(LabelName('second'), TEST_MACHINE)
+
+
+def label(ref, state='start', **metadata):
+    return Label(ref, metadata, State(state))
+
+
+class FakeAPI:
+    """Serves labels from a dict, which tests change between polls."""
+
+    def __init__(self, labels):
+        self.labels = labels
+        self.listings = 0
+
+    def get_labels(self, state_machine):
+        self.listings += 1
+        return [ref for ref in self.labels if ref.state_machine == state_machine]
+
+    def get_labels_bulk(self, labels, max_in_flight, revalidate):
+        assert revalidate
+        return [self.labels.get(ref, UnknownLabel(ref)) for ref in labels]
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint(label(FIRST, a=1, b=2)) == fingerprint(
+        Label(FIRST, {'b': 2, 'a': 1}, State('start')),
+    )
+    assert fingerprint(label(FIRST, a=1)) != fingerprint(label(FIRST, a=2))
+    assert fingerprint(label(FIRST, a=1)) != fingerprint(label(FIRST, 'end', a=1))
+
+    compact = CompactLabel.from_label(label(FIRST, a=1), StdlibCodec())
+    assert fingerprint(compact) == fingerprint(compact)
+
+
+def test_reports_only_changes():
+    api = FakeAPI({FIRST: label(FIRST, a=1), SECOND: label(SECOND, b=1)})
+    watcher = LabelWatcher(api, TEST_MACHINE)
+
+    assert watcher.poll() == [
+        LabelChange(FIRST, None, label(FIRST, a=1)),
+        LabelChange(SECOND, None, label(SECOND, b=1)),
+    ]
+    assert watcher.poll() == []
+
+    api.labels[FIRST] = label(FIRST, 'end', a=1)
+    api.labels[SECOND] = label(SECOND, b=2)
+    assert watcher.poll() == [
+        LabelChange(FIRST, State('start'), label(FIRST, 'end', a=1)),
+        LabelChange(SECOND, State('start'), label(SECOND, b=2)),
+    ]
+
+    api.labels[SECOND] = DeletedLabel(SECOND)
+    del api.labels[FIRST]
+    assert watcher.poll() == [
+        LabelChange(SECOND, State('start'), None),
+        LabelChange(FIRST, State('end'), None),
+    ]
+    assert watcher.poll() == []
+
+
+def test_watching_named_labels_does_not_list_the_state_machine():
+    api = FakeAPI({FIRST: label(FIRST), SECOND: label(SECOND)})
+    watcher = LabelWatcher(api, TEST_MACHINE, labels=['second'], initial=False)
+
+    assert watcher.poll() == []
+    api.labels[SECOND] = label(SECOND, 'end')
+    assert watcher.poll() == [
+        LabelChange(SECOND, State('start'), label(SECOND, 'end')),
+    ]
+    assert api.listings == 0
+
+
+def test_transient_errors_are_retried_without_reporting_changes():
+    api = FakeAPI({FIRST: label(FIRST)})
+    watcher = LabelWatcher(api, TEST_MACHINE)
+    watcher.poll()
+
+    error = requests.ConnectionError()
+    api.labels[FIRST] = error
+    assert watcher.poll() == []
+    assert watcher.errors == {FIRST: error}
+
+    api.labels[FIRST] = label(FIRST, 'end')
+    assert len(watcher.poll()) == 1
+    assert watcher.errors == {}
+
+
+def test_polling_interval_adapts_to_changes():
+    api = FakeAPI({FIRST: label(FIRST)})
+    sleeps = []
+
+    def sleep(interval):
+        sleeps.append(interval)
+        if len(sleeps) == 4:
+            api.labels[FIRST] = label(FIRST, 'end')
+
+    watcher = LabelWatcher(
+        api,
+        TEST_MACHINE,
+        interval=1,
+        max_interval=5,
+        sleep=sleep,
+    )
+    changes = watcher.watch()
+
+    assert next(changes).label == label(FIRST)
+    assert next(changes).label == label(FIRST, 'end')
+    assert sleeps == [1, 2, 4, 5]
+    assert watcher.next_interval == 1
+
+
+def test_invalid_intervals():
+    with pytest.raises(ValueError):
+        LabelWatcher(FakeAPI({}), TEST_MACHINE, interval=5, max_interval=1)
+
+
+class FakeAsyncAPI(FakeAPI):
+    async def get_labels(self, state_machine):
+        return super().get_labels(state_machine)
+
+    async def get_labels_bulk(self, labels, max_in_flight, revalidate):
+        return super().get_labels_bulk(labels, max_in_flight, revalidate)
+
+
+def test_async_watcher():
+    api = FakeAsyncAPI({FIRST: label(FIRST)})
+    watcher = AsyncLabelWatcher(api, TEST_MACHINE, interval=0.001)
+
+    async def go():
+        first = await watcher.poll()
+        await watcher.wait()
+        api.labels[FIRST] = label(FIRST, 'end')
+        return first, await watcher.poll()
+
+    loop = asyncio.new_event_loop()
+    try:
+        first, second = loop.run_until_complete(go())
+    finally:
+        loop.close()
+
+    assert first == [LabelChange(FIRST, None, label(FIRST))]
+    assert second == [LabelChange(FIRST, State('start'), label(FIRST, 'end'))]
+
+
+@httpretty.activate
+def test_watch_labels_revalidates_cached_labels():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels/first',
+        responses=[
+            httpretty.Response(
+                body=json.dumps({'metadata': {'a': 1}, 'state': 'start'}),
+                content_type='application/json',
+                adding_headers={'ETag': '"v1"'},
+            ),
+            httpretty.Response(body='', status=304),
+            httpretty.Response(
+                body=json.dumps({'metadata': {'a': 1}, 'state': 'end'}),
+                content_type='application/json',
+                adding_headers={'ETag': '"v2"'},
+            ),
+        ],
+    )
+
+    api = RoutemasterAPI(
+        api_url=TEST_API_URL,
+        session=requests.Session(),
+        cache=LabelCache(ttl=60),
+    )
+    watcher = LabelWatcher(api, TEST_MACHINE, labels=['first'])
+
+    assert len(watcher.poll()) == 1
+    assert watcher.poll() == []
+    assert httpretty.last_request().headers['If-None-Match'] == '"v1"'
+    assert api.cache.stats().revalidations == 1
+
+    change, = watcher.poll()
+    assert change.previous_state == 'start'
+    assert change.label.state == 'end'
+
+
+@httpretty.activate
+def test_watch_labels_api():
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels',
+        body=json.dumps({'labels': [{'name': 'first'}]}),
+        content_type='application/json',
+    )
+    httpretty.register_uri(
+        httpretty.GET,
+        'http://localhost:2017/state-machines/testing-machine/labels/first',
+        body=json.dumps({'metadata': {}, 'state': 'start'}),
+        content_type='application/json',
+    )
+
+    api = RoutemasterAPI(api_url=TEST_API_URL, session=requests.Session())
+
+    change = next(api.watch_labels(TEST_MACHINE))
+    assert change == LabelChange(FIRST, None, label(FIRST))
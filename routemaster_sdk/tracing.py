@@ -0,0 +1,122 @@
+"""Distributed tracing of calls made through the API wrappers."""
+
+import threading
+from typing import Any, Dict, Optional
+
+from routemaster_sdk.calls import Call
+from routemaster_sdk.instrumentation import CallObserver
+
+try:
+    from opentelemetry import trace, propagate
+except ImportError:  # pragma: no cover
+    trace = None  # type: ignore
+    propagate = None  # type: ignore
+
+
+class OpenTelemetryObserver(CallObserver):
+    """
+    Traces calls with OpenTelemetry, if installed.
+
+    Each call gets a client span named ``routemaster <operation>``, a child of
+    the span current when the call was made, with the state machine, label
+    and final HTTP status of the call as attributes, alongside its attempts,
+    byte counts and time spent on the network. Each request is recorded as an
+    event on the span. The configured propagators' headers (by default W3C
+    ``traceparent``) are added to the requests so that the trace continues
+    into routemaster.
+
+    Use as the ``observer`` of an API wrapper, combined with any others
+    through ``CompositeObserver``. Without it, tracing costs nothing.
+
+    Before Python 3.7, the spans of calls made by ``RoutemasterAPI``'s bulk
+    operations start new traces, as context cannot be passed to the threads
+    which make them.
+    """
+
+    def __init__(self, tracer_provider: Any = None) -> None:
+        if trace is None:
+            raise ImportError("opentelemetry-api is not installed")
+
+        self._tracer = trace.get_tracer(
+            'routemaster_sdk',
+            tracer_provider=tracer_provider,
+        )
+        self._spans = {}  # type: Dict[Call, Any]
+        self._lock = threading.Lock()
+
+    def call_started(self, call: Call) -> None:
+        """Start the span for a call."""
+        attributes = {'routemaster.operation': call.operation}
+        if call.state_machine is not None:
+            attributes['routemaster.state_machine'] = call.state_machine
+        if call.label is not None:
+            attributes['routemaster.label'] = call.label.name
+
+        span = self._tracer.start_span(
+            'routemaster {0}'.format(call.operation),
+            kind=trace.SpanKind.CLIENT,
+            attributes=attributes,
+        )
+
+        with self._lock:
+            self._spans[call] = span
+
+    def _span(self, call: Call) -> Optional[Any]:
+        with self._lock:
+            return self._spans.get(call)
+
+    def prepare_headers(self, call: Call, headers: Dict[str, str]) -> None:
+        """Add the trace context of a call's span to its requests."""
+        span = self._span(call)
+        if span is not None:
+            propagate.inject(headers, context=trace.set_span_in_context(span))
+
+    def request_finished(
+        self,
+        call: Call,
+        status: Optional[int],
+        elapsed: float,
+    ) -> None:
+        """Record a request as an event on its call's span."""
+        span = self._span(call)
+        if span is None:
+            return
+
+        attributes = {
+            'routemaster.attempt': call.attempts,
+            'routemaster.elapsed': elapsed,
+        }  # type: Dict[str, Any]
+        if status is not None:
+            attributes['http.response.status_code'] = status
+
+        span.add_event('request', attributes=attributes)
+
+    def call_finished(
+        self,
+        call: Call,
+        duration: float,
+        error: Optional[BaseException],
+    ) -> None:
+        """End the span for a call."""
+        with self._lock:
+            span = self._spans.pop(call, None)
+
+        if span is None:
+            return
+
+        if call.status is not None:
+            span.set_attribute('http.response.status_code', call.status)
+        span.set_attribute('routemaster.attempts', call.attempts)
+        span.set_attribute('routemaster.hedges', call.hedges)
+        span.set_attribute('http.request.body.size', call.bytes_sent)
+        span.set_attribute('http.response.body.size', call.bytes_received)
+        span.set_attribute('routemaster.network_time', call.network_time)
+
+        if error is not None:
+            span.record_exception(error)
+            span.set_status(trace.Status(
+                trace.StatusCode.ERROR,
+                type(error).__name__,
+            ))
+
+        span.end()
@@ -0,0 +1,261 @@
+"""Watching labels for changes, by polling efficiently."""
+
+import json
+import time
+import asyncio
+import hashlib
+from typing import (
+    Any,
+    Dict,
+    List,
+    Tuple,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    NamedTuple,
+)
+
+from routemaster_sdk.api import DEFAULT_MAX_IN_FLIGHT, RoutemasterAPI
+from routemaster_sdk.types import (
+    Label,
+    State,
+    LabelRef,
+    LabelName,
+    StateMachine,
+)
+from routemaster_sdk.compact import CompactLabel
+from routemaster_sdk.exceptions import DeletedLabel, UnknownLabel
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_MAX_INTERVAL = 30.0
+
+# The digest and state of each label as of the last poll.
+_Known = Dict[LabelRef, Tuple[bytes, State]]
+
+LabelChange = NamedTuple('LabelChange', [
+    ('ref', LabelRef),
+    # The state the label was in at the last poll, ``None`` if it is new.
+    ('previous_state', Optional[State]),
+    # The label as it is now, ``None`` if it has been deleted.
+    ('label', Optional[Label]),
+])
+
+
+def fingerprint(label: Label) -> bytes:
+    """A digest of a label's state and metadata, for spotting changes."""
+    if isinstance(label, CompactLabel):
+        # Avoid decoding; the API encodes the same metadata the same way.
+        encoded = label.raw_metadata
+    else:
+        encoded = json.dumps(
+            label.metadata,
+            sort_keys=True,
+            separators=(',', ':'),
+        ).encode('utf-8')
+
+    digest = hashlib.md5(encoded)
+    digest.update(label.state.encode('utf-8'))
+    return digest.digest()
+
+
+class _BaseLabelWatcher:
+    """Change detection and polling intervals shared by label watchers."""
+
+    def __init__(
+        self,
+        api: Any,
+        state_machine: StateMachine,
+        labels: Optional[Iterable[LabelName]],
+        interval: float,
+        max_interval: float,
+        max_in_flight: int,
+        initial: bool,
+    ) -> None:
+        if not 0 < interval <= max_interval:
+            raise ValueError("interval must be in (0, max_interval]")
+
+        self.api = api
+        self.state_machine = state_machine
+        self.labels = (
+            None if labels is None
+            else [LabelRef(name, state_machine) for name in labels]
+        )
+        self.interval = interval
+        self.max_interval = max_interval
+        self.max_in_flight = max_in_flight
+
+        # The interval to wait before the next poll.
+        self.next_interval = interval
+        # Errors fetching individual labels in the last poll, other than
+        # their being unknown or deleted. They are retried in the next poll.
+        self.errors = {}  # type: Dict[LabelRef, Exception]
+
+        self._initial = initial
+        self._polled = False
+        self._known = {}  # type: _Known
+
+    def _diff(
+        self,
+        refs: List[LabelRef],
+        results: List[Any],
+    ) -> List[LabelChange]:
+        """Record the results of a poll, returning the changes it found."""
+        changes = []  # type: List[LabelChange]
+        errors = {}  # type: Dict[LabelRef, Exception]
+        report = self._initial or self._polled
+        seen = set()
+
+        for ref, result in zip(refs, results):
+            seen.add(ref)
+            known = self._known.get(ref)
+
+            if isinstance(result, (UnknownLabel, DeletedLabel)):
+                if known is not None:
+                    del self._known[ref]
+                    changes.append(LabelChange(ref, known[1], None))
+                continue
+
+            if isinstance(result, Exception):
+                errors[ref] = result
+                continue
+
+            digest = fingerprint(result)
+            if known is not None and known[0] == digest:
+                continue
+
+            self._known[ref] = (digest, result.state)
+            if report:
+                changes.append(LabelChange(
+                    ref,
+                    known[1] if known is not None else None,
+                    result,
+                ))
+
+        for ref in [ref for ref in self._known if ref not in seen]:
+            state = self._known.pop(ref)[1]
+            changes.append(LabelChange(ref, state, None))
+
+        self.errors = errors
+        self._polled = True
+        self._adapt(changed=bool(changes))
+        return changes
+
+    def _adapt(self, changed: bool) -> None:
+        """Poll sooner after changes, and back off while there are none."""
+        if changed:
+            self.next_interval = self.interval
+        else:
+            self.next_interval = min(self.max_interval, self.next_interval * 2)
+
+
+class LabelWatcher(_BaseLabelWatcher):
+    """
+    Reports changes to the state or metadata of labels, by polling.
+
+    Watches either the given labels or, if none are given, every label in the
+    state machine (listing them on each poll to find new and removed ones).
+    Each ``poll`` fetches the labels concurrently, up to ``max_in_flight`` at
+    once, and returns a ``LabelChange`` for each label which is new, has
+    changed or has been deleted since the last poll. Labels are compared by a
+    digest of their state and metadata, so only the digests are kept between
+    polls. The first poll reports every label as new, unless ``initial`` is
+    false.
+
+    If the API wrapper has a ``LabelCache``, labels are fetched with
+    conditional requests wherever the API provided validators, so unchanged
+    labels are not downloaded again.
+
+    ``watch`` polls repeatedly, waiting ``next_interval`` seconds between
+    polls: ``interval`` after a poll which found changes, doubling after each
+    which did not, up to ``max_interval``.
+    """
+
+    def __init__(
+        self,
+        api: RoutemasterAPI,
+        state_machine: StateMachine,
+        labels: Optional[Iterable[LabelName]] = None,
+        interval: float = DEFAULT_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        initial: bool = True,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        super().__init__(
+            api,
+            state_machine,
+            labels,
+            interval,
+            max_interval,
+            max_in_flight,
+            initial,
+        )
+        self._sleep = sleep
+
+    def poll(self) -> List[LabelChange]:
+        """Fetch the watched labels, returning those which changed."""
+        refs = self.labels
+        if refs is None:
+            refs = self.api.get_labels(self.state_machine)
+
+        results = self.api.get_labels_bulk(
+            refs,
+            max_in_flight=self.max_in_flight,
+            revalidate=True,
+        )
+        return self._diff(refs, results)
+
+    def watch(self) -> Iterator[LabelChange]:
+        """Poll forever, yielding each change found."""
+        while True:
+            for change in self.poll():
+                yield change
+            self._sleep(self.next_interval)
+
+
+class AsyncLabelWatcher(_BaseLabelWatcher):
+    """
+    Reports changes to labels by polling, through ``AsyncRoutemasterAPI``.
+
+    Behaves as ``LabelWatcher``, but ``poll`` is a coroutine. Rather than a
+    ``watch`` generator, await ``poll`` and then ``wait`` in a loop.
+    """
+
+    def __init__(
+        self,
+        # An ``AsyncRoutemasterAPI``, not imported as aiohttp is optional.
+        api: Any,
+        state_machine: StateMachine,
+        labels: Optional[Iterable[LabelName]] = None,
+        interval: float = DEFAULT_INTERVAL,
+        max_interval: float = DEFAULT_MAX_INTERVAL,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        initial: bool = True,
+    ) -> None:
+        super().__init__(
+            api,
+            state_machine,
+            labels,
+            interval,
+            max_interval,
+            max_in_flight,
+            initial,
+        )
+
+    async def poll(self) -> List[LabelChange]:
+        """Fetch the watched labels, returning those which changed."""
+        refs = self.labels
+        if refs is None:
+            refs = await self.api.get_labels(self.state_machine)
+
+        results = await self.api.get_labels_bulk(
+            refs,
+            max_in_flight=self.max_in_flight,
+            revalidate=True,
+        )
+        return self._diff(refs, results)
+
+    async def wait(self) -> None:
+        """Wait until the next poll is due."""
+        await asyncio.sleep(self.next_interval)
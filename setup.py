@@ -41,6 +41,27 @@ setup(
         'requests',
     ),
 
+    extras_require={
+        'async': (
+            'aiohttp',
+        ),
+        'fast-json': (
+            'orjson',
+        ),
+        'http2': (
+            'httpx[http2]',
+        ),
+        'tracing': (
+            'opentelemetry-api',
+        ),
+    },
+
+    entry_points={
+        'console_scripts': (
+            'routemaster-sdk = routemaster_sdk.__main__:main',
+        ),
+    },
+
     setup_requires=(
         'pytest-runner',
     ),